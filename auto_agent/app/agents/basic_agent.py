@@ -6,15 +6,30 @@
 import threading
 from abc import ABC
 from typing import Dict, Any, Optional
-from deepagents import create_deep_agent
 from app.agents.tools.basic_tool import get_all_tools
-from app.agents.middleware.basic_middleware import BasicMiddleware
 from app.agents.skills.basic_skill import BasicSkill
-from app.agents.backends.basic_backend import create_backend_with_long_term_memory
 from app.utils.logger import global_logger as logger
 from app.utils.thread_pool import thread_pool_manager
 from app.utils.msg_utils import process_message
 from app.core.dependency_injector import get_dependency
+from app.llms.token_accounting import token_ledger
+
+
+def create_deep_agent(**kwargs):
+    """
+    创建深度代理
+
+    deepagents（连同 langchain 各模型包）导入耗时数秒，因此延迟到首次创建代理时再导入
+
+    参数:
+        **kwargs: 传递给 deepagents.create_deep_agent 的参数
+
+    返回:
+        深度代理实例
+    """
+    from deepagents import create_deep_agent as _create_deep_agent
+
+    return _create_deep_agent(**kwargs)
 
 
 class BasicAgent(ABC, threading.Thread):
@@ -99,7 +114,11 @@ class BasicAgent(ABC, threading.Thread):
         deep_agent_kwargs["subagents"] = subagents
 
         # 设置中间件
-        middleware = self.kwargs.get("middleware") or [BasicMiddleware()]
+        middleware = self.kwargs.get("middleware")
+        if not middleware:
+            from app.agents.middleware.basic_middleware import BasicMiddleware
+
+            middleware = [BasicMiddleware()]
         deep_agent_kwargs["middleware"] = middleware
 
         # 设置中断处理程序
@@ -113,6 +132,8 @@ class BasicAgent(ABC, threading.Thread):
         # 如果启用，添加长期记忆支持
         long_term_memory = self.kwargs.get("long_term_memory")
         if long_term_memory:
+            from app.agents.backends.basic_backend import create_backend_with_long_term_memory
+
             backend, store, checkpointer = create_backend_with_long_term_memory()
             deep_agent_kwargs["backend"] = backend
             deep_agent_kwargs["store"] = store
@@ -193,20 +214,24 @@ class BasicAgent(ABC, threading.Thread):
         if "user_input" in self.kwargs:
             user_input = self.kwargs["user_input"]
             prompt = self.kwargs.get("prompt")
-            try:
-                if self.agent:
-                    # 使用 stream 方法而不是 invoke 以避免同步调用问题
-                    for chunk in self.agent.stream(
-                        {"user_input": user_input, "prompt": prompt}
-                    ):
-                        # 处理每个到达的块
-                        pass
-                    # 记录成功消息
-                    logger.info(f"代理 {self.name} 执行成功完成")
-                else:
-                    logger.error(f"代理 {self.name} 没有底层代理实例")
-            except Exception as e:
-                logger.error(f"代理 {self.name} 执行失败: {e}")
+            # 本次运行的 LLM 调用记入令牌账本，按代理和运行归集
+            run_id = str(self.task_id or f"{self.name}-{self.get_thread_id()}")
+            with token_ledger.scope(agent=self.name, run=run_id):
+                try:
+                    if self.agent:
+                        # 使用 stream 方法而不是 invoke 以避免同步调用问题
+                        for chunk in self.agent.stream(
+                            {"user_input": user_input, "prompt": prompt}
+                        ):
+                            # 处理每个到达的块
+                            pass
+                        # 记录成功消息
+                        logger.info(f"代理 {self.name} 执行成功完成")
+                    else:
+                        logger.error(f"代理 {self.name} 没有底层代理实例")
+                except Exception as e:
+                    logger.error(f"代理 {self.name} 执行失败: {e}")
+            logger.info(token_ledger.format_report(run_id))
         else:
             logger.warning(f"代理 {self.name} 启动但未提供 user_input")
 
@@ -259,7 +284,8 @@ class BasicAgent(ABC, threading.Thread):
             print(f"\nYou: {default_user_input}")
             
             if self.validate_input(default_user_input):
-                process_message(self.agent, default_user_input)
+                with token_ledger.scope(agent=self.name):
+                    process_message(self.agent, default_user_input)
             else:
                 print("Auto-Agent: 无效输入，请重试。")
         
@@ -281,7 +307,8 @@ class BasicAgent(ABC, threading.Thread):
                     continue
                 
                 # 处理消息
-                process_message(self.agent, user_input)
+                with token_ledger.scope(agent=self.name):
+                    process_message(self.agent, user_input)
                 
             except KeyboardInterrupt:
                 print("\n\nAuto-Agent: Chat interrupted.")
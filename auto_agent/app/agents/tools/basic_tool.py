@@ -4,13 +4,18 @@ Abstract base class for all tools
 """
 
 import os
-import subprocess
+import shutil
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Literal, Optional
+from typing import Any, Callable, Dict, Literal, Optional
 
 import requests
 from langchain_core.tools import tool
+from app.config import config
 from app.core.tool_registry import register_tool
+from app.utils.io_executor import io_executor
+from app.utils.line_index import line_index_cache
+from app.utils.python_worker_pool import python_worker_pool
+from app.utils.subprocess_engine import subprocess_engine
 
 
 class BasicTool(ABC):
@@ -104,76 +109,230 @@ class BasicTool(ABC):
             }
 
 
+# Blocking file operations, run on the shared I/O executor by the tools below.
+# Text is read and written in chunks so that decoding a large file on a worker
+# thread releases the GIL regularly instead of stalling the event loop thread.
+IO_CHUNK_CHARS = 64 * 1024
+
+
+def _read_chunks(f) -> str:
+    return "".join(iter(lambda: f.read(IO_CHUNK_CHARS), ""))
+
+
+def _write_chunks(f, content: str):
+    for start in range(0, len(content), IO_CHUNK_CHARS):
+        f.write(content[start:start + IO_CHUNK_CHARS])
+
+
+def _list_dir(directory: str) -> str:
+    files = os.listdir(directory)
+    return f"Files in {directory}: {', '.join(files)}"
+
+
+def _read_text(file_path: str) -> str:
+    with open(file_path, "r", encoding="utf-8") as f:
+        return _read_chunks(f)
+
+
+def _slice_lines(data: bytes, first: int, count: Optional[int], tail: bool):
+    """Line range of an in-memory file, returned like LineIndexCache.line_range"""
+    parts = data.split(b"\n")
+    lines = [part + b"\n" for part in parts[:-1]] + ([parts[-1]] if parts[-1] else [])
+    total = len(lines)
+    if tail:
+        first = max(0, total - (count or 0))
+    first = min(first, total)
+    end = total if count is None else min(total, first + count)
+    return b"".join(lines[first:end]), first, end, total
+
+
+def _read_range(file_path: str, offset: int, limit: Optional[int], unit: str, mode: str) -> str:
+    if unit not in ("line", "byte"):
+        raise ValueError(f"unit must be 'line' or 'byte', got {unit!r}")
+    if mode not in ("range", "head", "tail"):
+        raise ValueError(f"mode must be 'range', 'head' or 'tail', got {mode!r}")
+    if offset < 0:
+        raise ValueError("offset must be >= 0")
+    if limit is not None and limit < 1:
+        raise ValueError("limit must be >= 1")
+
+    read_config = config.get("tools.read_file", {}) or {}
+    max_bytes = int(read_config.get("max_bytes", 262144))
+    if mode == "head":
+        offset = 0
+    if mode != "range" and limit is None:
+        limit = int(read_config.get("default_lines", 200)) if unit == "line" else max_bytes
+    size = os.path.getsize(file_path)
+
+    if unit == "byte":
+        count = min(limit or max_bytes, max_bytes)
+        start = max(0, size - count) if mode == "tail" else min(offset, size)
+        end = min(size, start + count)
+        with open(file_path, "rb") as f:
+            f.seek(start)
+            content = f.read(end - start).decode("utf-8", errors="replace")
+        if (start, end) == (0, size):
+            return content
+        if end == start:
+            return f"[offset {start} is past the end: {size} bytes]"
+        footer = f"[bytes {start}-{end - 1} of {size}"
+        if mode == "range" and end < size and (limit is None or limit > max_bytes):
+            footer += f"; output capped at {max_bytes} bytes, continue with offset={end}"
+        return f"{content}\n{footer}]"
+
+    if size < int(read_config.get("mmap_threshold", 1048576)):
+        with open(file_path, "rb") as f:
+            raw, first, end, total = _slice_lines(f.read(), offset, limit, mode == "tail")
+    else:
+        raw, first, end, total = line_index_cache.line_range(file_path, offset, limit, mode == "tail", max_bytes)
+    capped = len(raw) > max_bytes
+    if capped:
+        # Cut at the last whole line that fits, or mid-line if even the first line is too long
+        cut = raw.rfind(b"\n", 0, max_bytes) + 1 or max_bytes
+        end = first + raw.count(b"\n", 0, cut)
+        raw = raw[:cut]
+    content = raw.decode("utf-8", errors="replace").replace("\r\n", "\n")
+    if (first, end) == (0, total) and not capped:
+        return content
+    if end == first and not capped:
+        return f"[offset {offset} is past the end: {total} lines]"
+    # total is unknown when the start of a large, not yet indexed file was read
+    footer = f"[lines {first + 1}-{max(end, first + 1)}" + (f" of {total}" if total is not None else ", more follow")
+    if capped:
+        footer += f"; output capped at {max_bytes} bytes, continue with offset={max(end, first + 1)}"
+    if not content.endswith("\n"):
+        content += "\n"
+    return f"{content}{footer}]"
+
+
+def _write_text(file_path: str, content: str, overwrite: bool) -> str:
+    if os.path.exists(file_path) and not overwrite:
+        return f"File {file_path} already exists. Use overwrite=True to overwrite."
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, "w", encoding="utf-8") as f:
+        _write_chunks(f, content)
+    return f"Successfully wrote to {file_path}"
+
+
+def _replace_text(file_path: str, old_content: str, new_content: str) -> str:
+    with open(file_path, "r", encoding="utf-8") as f:
+        content = _read_chunks(f)
+    with open(file_path, "w", encoding="utf-8") as f:
+        _write_chunks(f, content.replace(old_content, new_content))
+    return f"Successfully edited {file_path}"
+
+
+def _replace_line(file_path: str, line_number: int, new_content: str) -> str:
+    with open(file_path, "r", encoding="utf-8") as f:
+        lines = f.readlines()
+
+    if 1 <= line_number <= len(lines):
+        lines[line_number - 1] = new_content + "\n"
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.writelines(lines)
+        return f"Successfully edited line {line_number} in {file_path}"
+    else:
+        return f"Line number {line_number} is out of range. File has {len(lines)} lines."
+
+
+def _remove_file(file_path: str) -> str:
+    if os.path.exists(file_path):
+        os.remove(file_path)
+        return f"Successfully deleted {file_path}"
+    else:
+        return f"File {file_path} does not exist"
+
+
+def _remove_tree(directory: str) -> str:
+    if os.path.exists(directory):
+        shutil.rmtree(directory)
+        return f"Successfully deleted directory {directory}"
+    else:
+        return f"Directory {directory} does not exist"
+
+
 # File operation tools
-@register_tool(name="list_files", description="List files in a directory")
+@register_tool(name="list_files", description="List files in a directory", read_only=True, path_arg="directory")
 async def list_files(directory: str = ".") -> str:
     """List files in a directory"""
     try:
-        files = os.listdir(directory)
-        return f"Files in {directory}: {', '.join(files)}"
+        return await io_executor.run(_list_dir, directory)
     except Exception as e:
         return f"Error listing files: {str(e)}"
 
 
-@register_tool(name="read_file", description="Read content of a file")
-async def read_file(file_path: str) -> str:
-    """Read content of a file"""
+@register_tool(
+    name="read_file",
+    description=(
+        "Read content of a file. For large files read a window: offset/limit count lines "
+        "(unit='line', offset is 0-based) or bytes (unit='byte'), and mode='head' or 'tail' "
+        "reads the start or end of the file"
+    ),
+    read_only=True,
+    path_arg="file_path",
+)
+async def read_file(
+    file_path: str,
+    offset: int = 0,
+    limit: Optional[int] = None,
+    unit: Literal["line", "byte"] = "line",
+    mode: Literal["range", "head", "tail"] = "range",
+) -> str:
+    """
+    Read content of a file, or a range of it
+
+    Output is capped at tools.read_file.max_bytes; partial reads end with a
+    "[lines X-Y of N]" or "[bytes X-Y of N]" note. Line ranges of files above
+    tools.read_file.mmap_threshold go through a cached line-offset index, so
+    jumping to any line of a large log only scans the file once; reads from
+    the first line of a file not indexed yet skip the scan and report the
+    line count only if they reach the end.
+
+    Args:
+        file_path: File path
+        offset: First line (0-based) or byte to read; ignored by head and tail
+        limit: Number of lines or bytes (head/tail default to tools.read_file.default_lines lines)
+        unit: "line" or "byte"
+        mode: "range", "head" or "tail"
+
+    Returns:
+        File content, or an error message
+    """
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        return content
+        return await io_executor.run(_read_range, file_path, offset, limit, unit, mode)
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
 
-@register_tool(name="write_file", description="Write content to a file")
+@register_tool(name="write_file", description="Write content to a file", read_only=False, path_arg="file_path")
 async def write_file(file_path: str, content: str, overwrite: bool = False) -> str:
     """Write content to a file"""
     try:
-        if os.path.exists(file_path) and not overwrite:
-            return f"File {file_path} already exists. Use overwrite=True to overwrite."
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(content)
-        return f"Successfully wrote to {file_path}"
+        return await io_executor.run(_write_text, file_path, content, overwrite)
     except Exception as e:
         return f"Error writing file: {str(e)}"
 
 
-@register_tool(name="edit_file", description="Edit content of a file")
+@register_tool(name="edit_file", description="Edit content of a file", read_only=False, path_arg="file_path")
 async def edit_file(file_path: str, old_content: str, new_content: str) -> str:
     """Edit content of a file"""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            content = f.read()
-        new_content = content.replace(old_content, new_content)
-        with open(file_path, "w", encoding="utf-8") as f:
-            f.write(new_content)
-        return f"Successfully edited {file_path}"
+        return await io_executor.run(_replace_text, file_path, old_content, new_content)
     except Exception as e:
         return f"Error editing file: {str(e)}"
 
 
-@register_tool(name="edit_file_line", description="Edit specific line in a file")
+@register_tool(name="edit_file_line", description="Edit specific line in a file", read_only=False, path_arg="file_path")
 async def edit_file_line(file_path: str, line_number: int, new_content: str) -> str:
     """Edit specific line in a file"""
     try:
-        with open(file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
-
-        if 1 <= line_number <= len(lines):
-            lines[line_number - 1] = new_content + "\n"
-            with open(file_path, "w", encoding="utf-8") as f:
-                f.writelines(lines)
-            return f"Successfully edited line {line_number} in {file_path}"
-        else:
-            return f"Line number {line_number} is out of range. File has {len(lines)} lines."
+        return await io_executor.run(_replace_line, file_path, line_number, new_content)
     except Exception as e:
         return f"Error editing file line: {str(e)}"
 
 
 # Web search tool
-@register_tool(name="web_search", description="Search the web for information")
+@register_tool(name="web_search", description="Search the web for information", read_only=True, max_concurrency=4)
 async def web_search(query: str, max_results: int = 5) -> str:
     """Search the web for information"""
     try:
@@ -193,9 +352,32 @@ async def web_search(query: str, max_results: int = 5) -> str:
         return f"Error searching web: {str(e)}"
 
 
+def _output_streamer(tool_name: str) -> Optional[Callable[[str, str], None]]:
+    """
+    Get a callback that streams subprocess output to the agent
+
+    Output is sent as LangGraph custom stream events
+    ({"tool", "stream", "data"}), visible to callers streaming with
+    stream_mode="custom".
+
+    Args:
+        tool_name: Name of the running tool
+
+    Returns:
+        Callback, or None when not running inside a LangGraph run
+    """
+    try:
+        from langgraph.config import get_stream_writer
+
+        writer = get_stream_writer()
+    except Exception:
+        return None
+    return lambda stream, text: writer({"tool": tool_name, "stream": stream, "data": text})
+
+
 # Command execution tool
-@register_tool(name="execute_command", description="Execute a shell command")
-async def execute_command(command: str, cwd: str = ".") -> str:
+@register_tool(name="execute_command", description="Execute a shell command", read_only=False)
+async def execute_command(command: str, cwd: str = ".", timeout: Optional[int] = None) -> str:
     """Execute a shell command"""
     # Command whitelist for security
     ALLOWED_COMMANDS = {
@@ -224,59 +406,43 @@ async def execute_command(command: str, cwd: str = ".") -> str:
         if not cwd.startswith(current_dir):
             return "Error: Working directory must be within the current directory tree"
         
-        result = subprocess.run(
-            command, 
-            shell=True, 
-            capture_output=True, 
-            text=True, 
-            cwd=cwd
+        result = await subprocess_engine.run(
+            command, cwd=cwd, timeout=timeout, on_output=_output_streamer("execute_command")
         )
-        output = result.stdout
-        error = result.stderr
-        return f"Exit code: {result.returncode}\nOutput: {output}\nError: {error}"
+        return result.format()
     except Exception as e:
         return f"Error executing command: {str(e)}"
 
 
 # Python script execution tool
-@register_tool(name="execute_python", description="Execute a Python script")
+@register_tool(name="execute_python", description="Execute a Python script", read_only=False)
 async def execute_python(script: str, timeout: int = 30) -> str:
     """Execute a Python script"""
     try:
-        result = subprocess.run(
-            ["python3", "-c", script], capture_output=True, text=True, timeout=timeout
-        )
-        output = result.stdout
-        error = result.stderr
-        return f"Exit code: {result.returncode}\nOutput: {output}\nError: {error}"
+        on_output = _output_streamer("execute_python")
+        if python_worker_pool.enabled:
+            result = await python_worker_pool.arun(script, timeout=timeout, on_output=on_output)
+        else:
+            result = await subprocess_engine.run(["python3", "-c", script], timeout=timeout, on_output=on_output)
+        return result.format()
     except Exception as e:
         return f"Error executing Python script: {str(e)}"
 
 
-@register_tool(name="delete_file", description="Delete a file")
+@register_tool(name="delete_file", description="Delete a file", read_only=False, path_arg="file_path")
 async def delete_file(file_path: str) -> str:
     """Delete a file"""
     try:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-            return f"Successfully deleted {file_path}"
-        else:
-            return f"File {file_path} does not exist"
+        return await io_executor.run(_remove_file, file_path)
     except Exception as e:
         return f"Error deleting file: {str(e)}"
 
 
-@register_tool(name="delete_directory", description="Delete a directory")
+@register_tool(name="delete_directory", description="Delete a directory", read_only=False, path_arg="directory")
 async def delete_directory(directory: str) -> str:
     """Delete a directory"""
     try:
-        if os.path.exists(directory):
-            import shutil
-
-            shutil.rmtree(directory)
-            return f"Successfully deleted directory {directory}"
-        else:
-            return f"Directory {directory} does not exist"
+        return await io_executor.run(_remove_tree, directory)
     except Exception as e:
         return f"Error deleting directory: {str(e)}"
 
@@ -3,6 +3,8 @@ LLM Service
 Service for handling LLM-related business logic
 """
 
+import asyncio
+import inspect
 from abc import ABC, abstractmethod
 from typing import Optional, Dict, Any, AsyncGenerator
 from app.llms.initializer import initialize_llm_provider
@@ -124,6 +126,9 @@ class LLMServiceImpl(LLMService):
         """
         Generate text using LLM
 
+        Uses the provider's native async API (agenerate/ainvoke) when available,
+        so many concurrent calls share one event loop.
+
         Args:
             model: LLM provider instance
             prompt: Prompt text
@@ -133,12 +138,18 @@ class LLMServiceImpl(LLMService):
             Generated text or None if failed
         """
         try:
-            if hasattr(model, "generate"):
-                result = await model.generate(prompt, **kwargs)
-                return result
+            if hasattr(model, "agenerate"):
+                return await model.agenerate(prompt, **kwargs)
+            elif hasattr(model, "ainvoke"):
+                result = await model.ainvoke(prompt, **kwargs)
+                return getattr(result, "content", result)
+            elif hasattr(model, "generate"):
+                result = model.generate(prompt, **kwargs)
+                return await result if inspect.isawaitable(result) else result
             elif hasattr(model, "invoke"):
-                result = await model.invoke(prompt, **kwargs)
-                return result
+                # Synchronous-only model: run it in a worker thread so the event loop is not blocked
+                result = await asyncio.to_thread(model.invoke, prompt, **kwargs)
+                return getattr(result, "content", result)
             else:
                 logger.error("Model does not have generate or invoke method")
                 return None
@@ -159,11 +170,13 @@ class LLMServiceImpl(LLMService):
             Generated text chunks
         """
         try:
-            if hasattr(model, "stream"):
-                async for chunk in model.stream(prompt, **kwargs):
-                    yield chunk
+            if hasattr(model, "astream"):
+                async for chunk in model.astream(prompt, **kwargs):
+                    text = getattr(chunk, "content", chunk)
+                    if text:
+                        yield text
             else:
-                logger.error("Model does not have stream method")
+                logger.error("Model does not have astream method")
                 # Fallback to generate if stream not available
                 result = await self.generate(model, prompt, **kwargs)
                 if result:
@@ -187,6 +200,7 @@ class LLMServiceImpl(LLMService):
                 "has_generate": hasattr(model, "generate"),
                 "has_stream": hasattr(model, "stream"),
                 "has_invoke": hasattr(model, "invoke"),
+                "has_async": hasattr(model, "agenerate") or hasattr(model, "ainvoke"),
             }
             
             # Add model-specific information if available
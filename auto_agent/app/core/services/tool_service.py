@@ -3,8 +3,15 @@ Tool Service
 Service for handling tool-related business logic
 """
 
+import asyncio
+import inspect
+import os
+import threading
+import weakref
 from abc import ABC, abstractmethod
-from typing import Optional, Dict, Any, List, Callable
+from contextlib import nullcontext
+from typing import Optional, Dict, Any, List, Callable, Tuple
+from app.config import config
 from app.core.tool_registry import tool_registry, register_tool
 from app.agents.tools.basic_tool import get_all_tools
 from app.utils.logger import global_logger as logger
@@ -95,12 +102,36 @@ class ToolService(ABC):
         """
         pass
 
+    @abstractmethod
+    async def execute_tools_batch(
+        self, tool_calls: List[Dict[str, Any]], max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute independent tool calls concurrently
+
+        Args:
+            tool_calls: Tool calls as {"name", "args", "id"} dictionaries
+            max_concurrency: Maximum calls running at once
+
+        Returns:
+            One result dictionary per call, in call order
+        """
+        pass
+
 
 class ToolServiceImpl(ToolService):
     """
     Implementation of tool service
     """
 
+    def __init__(self):
+        """Initialize the tool service"""
+        # Semaphores enforcing each tool's registered max_concurrency across batches, per event loop
+        self._tool_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[int, asyncio.Semaphore]]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._slots_lock = threading.Lock()
+
     def register_tool(self, name: str, func: Callable, description: str, **kwargs) -> bool:
         """
         Register a tool
@@ -214,6 +245,9 @@ class ToolServiceImpl(ToolService):
             if not tool:
                 return f"Error: Tool '{tool_name}' not found"
             
+            # Call the registered coroutine; the LangChain wrapper is not directly callable
+            tool = tool_registry.get_tool_function(tool_name) or tool
+
             # Validate tool is callable
             if not callable(tool):
                 return f"Error: Tool '{tool_name}' is not callable"
@@ -228,5 +262,140 @@ class ToolServiceImpl(ToolService):
             return f"Error executing tool {tool_name}: {str(e)}"
 
 
+    @staticmethod
+    def _split_args(tool_call: Dict[str, Any]) -> Tuple[list, Dict[str, Any]]:
+        """Get positional and keyword arguments of a tool call"""
+        args = tool_call.get("args") or {}
+        if isinstance(args, dict):
+            return [], dict(args)
+        return list(args), dict(tool_call.get("kwargs") or {})
+
+    def _call_scope(self, tool_call: Dict[str, Any]) -> Tuple[Optional[str], bool]:
+        """
+        Get the path a tool call touches and whether it mutates
+
+        Tools declare read_only and path_arg when registered; tools without
+        read_only=True are treated as mutating.
+
+        Args:
+            tool_call: Tool call dictionary
+
+        Returns:
+            Tuple of (absolute path or None, mutating)
+        """
+        name = tool_call.get("name")
+        info = tool_registry.get_tool_info(name) or {}
+        mutating = not info.get("read_only", False)
+        func = tool_registry.get_tool_function(name)
+        path_arg = info.get("path_arg")
+        if not path_arg or func is None:
+            return None, mutating
+        args, kwargs = self._split_args(tool_call)
+        try:
+            bound = inspect.signature(func).bind_partial(*args, **kwargs)
+        except TypeError:
+            return None, mutating
+        bound.apply_defaults()
+        path = bound.arguments.get(path_arg)
+        return (os.path.abspath(path) if isinstance(path, str) and path else None), mutating
+
+    def _tool_slot(self, name: str) -> Optional[asyncio.Semaphore]:
+        """
+        Get the running loop's semaphore for a tool registered with max_concurrency
+
+        Args:
+            name: Tool name
+
+        Returns:
+            Semaphore shared by every batch on the loop, or None if the tool has no limit
+        """
+        info = tool_registry.get_tool_info(name) or {}
+        limit = int(info.get("max_concurrency") or 0)
+        if limit <= 0:
+            return None
+        with self._slots_lock:
+            slots = self._tool_slots.setdefault(asyncio.get_running_loop(), {})
+            if name not in slots or slots[name][0] != limit:
+                slots[name] = (limit, asyncio.Semaphore(limit))
+            return slots[name][1]
+
+    @staticmethod
+    def _paths_overlap(first: str, second: str) -> bool:
+        """Check whether two paths are the same or one contains the other"""
+        return first == second or first.startswith(second + os.sep) or second.startswith(first + os.sep)
+
+    async def execute_tools_batch(
+        self, tool_calls: List[Dict[str, Any]], max_concurrency: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Execute independent tool calls concurrently
+
+        Calls run in parallel up to max_concurrency, and each tool up to the
+        max_concurrency it was registered with (shared with other batches).
+        Calls on overlapping paths keep their order when either one mutates,
+        so writes to a path are serialized (and ordered against reads of it)
+        while reads run in parallel. A mutating call whose path is unknown,
+        such as execute_command, is a barrier: it waits for every earlier call
+        and every later call waits for it. A failing call does not affect the
+        others.
+
+        Args:
+            tool_calls: Tool calls as {"name", "args", "id"} dictionaries; args is
+                a dict of keyword arguments or a list of positional arguments
+            max_concurrency: Maximum calls running at once (defaults to tools.batch.max_concurrency)
+
+        Returns:
+            One {"id", "name", "success", "error", "result"} dictionary per call, in call order
+        """
+        limit = max_concurrency or int(config.get("tools.batch.max_concurrency", 8))
+        batch_slots = asyncio.Semaphore(limit)
+        scopes = [self._call_scope(tool_call) for tool_call in tool_calls]
+        finished = [asyncio.Event() for _ in tool_calls]
+
+        def is_barrier(index: int) -> bool:
+            path, mutating = scopes[index]
+            return path is None and mutating
+
+        def depends_on(index: int) -> List[int]:
+            if is_barrier(index):
+                return list(range(index))
+            path, mutating = scopes[index]
+            return [
+                earlier for earlier in range(index)
+                if is_barrier(earlier)
+                or (
+                    path is not None
+                    and scopes[earlier][0] is not None
+                    and (mutating or scopes[earlier][1])
+                    and self._paths_overlap(path, scopes[earlier][0])
+                )
+            ]
+
+        async def run(index: int, tool_call: Dict[str, Any]) -> Dict[str, Any]:
+            name = tool_call.get("name")
+            outcome = {"id": tool_call.get("id"), "name": name, "success": False, "error": None, "result": None}
+            try:
+                for earlier in depends_on(index):
+                    await finished[earlier].wait()
+                func = tool_registry.get_tool_function(name) if isinstance(name, str) else None
+                if func is None:
+                    outcome["error"] = f"Tool '{name}' not found"
+                    return outcome
+                tool_slot = self._tool_slot(name)
+                args, kwargs = self._split_args(tool_call)
+                # Wait for the tool's own slot first so calls queued on a capped tool do not hold batch slots
+                async with tool_slot if tool_slot is not None else nullcontext(), batch_slots:
+                    outcome["result"] = await func(*args, **kwargs)
+                outcome["success"] = True
+            except Exception as e:
+                logger.error(f"Error executing tool {name} in batch: {e}")
+                outcome["error"] = str(e)
+            finally:
+                finished[index].set()
+            return outcome
+
+        return list(await asyncio.gather(*(run(i, tool_call) for i, tool_call in enumerate(tool_calls))))
+
+
 # Global tool service instance
 tool_service = ToolServiceImpl()
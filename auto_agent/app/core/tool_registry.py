@@ -18,6 +18,7 @@ class ToolRegistry:
         Initialize tool registry
         """
         self._tools: Dict[str, Callable] = {}
+        self._functions: Dict[str, Callable] = {}
         self._tool_info: Dict[str, Dict[str, Any]] = {}
 
     def register_tool(self, name: str, func: Callable, description: str, **kwargs):
@@ -28,7 +29,9 @@ class ToolRegistry:
             name: Tool name
             func: Tool function
             description: Tool description
-            **kwargs: Additional tool information
+            **kwargs: Additional tool information, e.g. read_only (bool), path_arg
+                (name of the argument holding the path the tool reads or writes)
+                and max_concurrency (calls run at once in a batch)
         """
         # Create tool wrapper with langchain tool decorator
         @tool
@@ -47,6 +50,7 @@ class ToolRegistry:
 
         # Register tool
         self._tools[name] = tool_wrapper
+        self._functions[name] = func
         self._tool_info[name] = {
             "description": description,
             **kwargs
@@ -66,6 +70,18 @@ class ToolRegistry:
         """
         return self._tools.get(name)
 
+    def get_tool_function(self, name: str) -> Optional[Callable]:
+        """
+        Get the async function a tool was registered with
+
+        Args:
+            name: Tool name
+
+        Returns:
+            Tool function or None if not found
+        """
+        return self._functions.get(name)
+
     def get_all_tools(self) -> List[Callable]:
         """
         Get all registered tools
@@ -108,6 +124,7 @@ class ToolRegistry:
         """
         if name in self._tools:
             del self._tools[name]
+            del self._functions[name]
             del self._tool_info[name]
             logger.info(f"Unregistered tool: {name}")
             return True
@@ -118,6 +135,7 @@ class ToolRegistry:
         Clear all registered tools
         """
         self._tools.clear()
+        self._functions.clear()
         self._tool_info.clear()
         logger.info("Cleared all registered tools")
 
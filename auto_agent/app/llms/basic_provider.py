@@ -3,13 +3,80 @@ Basic LLM Provider
 Abstract base class for all LLM providers
 """
 
+import asyncio
 from abc import ABC, abstractmethod
-from typing import Any, Dict, Iterator, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.prompt_values import PromptValue
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from ..config import config
+from ..utils.logger import global_logger as logger
+from .batch_client import BatchAPIClient, BatchResult
+from .http_pool import http_client_pool
+from .rate_limiter import RateLimiter, estimate_tokens, parse_retry_after
+from .response_cache import ResponseCache, get_response_cache, make_cache_key
+from .token_accounting import CallUsage, context_window, fit_messages, get_token_counter, token_ledger
+
+
+# Generation parameters copied into offline batch request bodies
+BATCH_BODY_PARAMS = ("temperature", "top_p", "max_tokens", "stop", "presence_penalty", "frequency_penalty")
+
+
+class ProviderBoundModel(Runnable):
+    """
+    Tool-bound chat model whose calls go through its provider's call path
+
+    Agent frameworks call the model returned by bind_tools directly, so it
+    wraps the bound chat model and sends every call through the provider's
+    _invoke_llm / _stream_llm hooks and their async variants.
+    """
+
+    def __init__(self, provider: "BasicProvider", bound: Any):
+        """
+        Initialize the wrapper
+
+        Args:
+            provider: Provider whose limits and hooks apply
+            bound: Chat model returned by the underlying model's bind_tools
+        """
+        self.provider = provider
+        self.bound = bound
+
+    @staticmethod
+    def _call_args(input: Any, config: Optional[RunnableConfig], kwargs: Dict[str, Any]) -> tuple:
+        """Convert a Runnable call into (messages, kwargs) for the provider hooks"""
+        if isinstance(input, PromptValue):
+            input = input.to_messages()
+        if config is not None:
+            kwargs = {**kwargs, "config": config}
+        return input, kwargs
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        messages, kwargs = self._call_args(input, config, kwargs)
+        return self.provider._invoke_llm(messages, self.bound, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        messages, kwargs = self._call_args(input, config, kwargs)
+        return await self.provider._ainvoke_llm(messages, self.bound, **kwargs)
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Iterator[Any]:
+        messages, kwargs = self._call_args(input, config, kwargs)
+        yield from self.provider._stream_llm(messages, self.bound, **kwargs)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Any]:
+        messages, kwargs = self._call_args(input, config, kwargs)
+        async for chunk in self.provider._astream_llm(messages, self.bound, **kwargs):
+            yield chunk
 
 
 class BasicProvider(ABC):
     """Abstract base class for LLM providers"""
 
+    # Whether the provider exposes an OpenAI-compatible offline batch endpoint
+    supports_batch_api = False
+
     def __init__(
         self,
         model_name: str,
@@ -36,6 +103,15 @@ class BasicProvider(ABC):
         self.stream_mode = stream_mode
         self.thinking_mode = thinking_mode
         self.kwargs = kwargs
+        # Shared RPM/TPM limiter, attached by ProviderFactory when limits are configured
+        self.rate_limiter: Optional[RateLimiter] = None
+        # Exact-match response cache, None when llm.response_cache is disabled
+        self.response_cache: Optional[ResponseCache] = get_response_cache()
+        # Prompt-prefix cache usage reported by the API
+        self.prompt_cache_stats = {"responses": 0, "input_tokens": 0, "cache_read_tokens": 0, "cache_creation_tokens": 0}
+        # Token usage of this provider's calls (also recorded in the global token ledger)
+        self.token_usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "cached_tokens": 0, "trimmed_calls": 0}
+        self.token_counter = get_token_counter(model_name)
         self.llm = self._create_llm()
         # Add profile attribute for compatibility with deepagents library
         self.profile = {
@@ -66,10 +142,16 @@ class BasicProvider(ABC):
         Returns:
             Generated response
         """
-        messages, invoke_kwargs = self._prepare_messages(
-            user_input, system_prompt, **kwargs
-        )
-        response = self.llm.invoke(messages, **invoke_kwargs)
+        use_cache = kwargs.pop("use_cache", True)
+        messages, invoke_kwargs = self._build_messages(user_input, system_prompt, **kwargs)
+        cache_key = self._cache_key(messages, invoke_kwargs, use_cache)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return "".join(cached)
+        response = self._invoke_llm(messages, **invoke_kwargs)
+        if cache_key and isinstance(response.content, str):
+            self.response_cache.put(cache_key, [response.content], self.model_name)
         return response.content
 
     def _stream(self, user_input: str, system_prompt: str, **kwargs) -> Iterator[str]:
@@ -84,12 +166,481 @@ class BasicProvider(ABC):
         Returns:
             Iterator yielding response chunks
         """
-        messages, stream_kwargs = self._prepare_messages(
-            user_input, system_prompt, **kwargs
-        )
-        for chunk in self.llm.stream(messages, **stream_kwargs):
+        use_cache = kwargs.pop("use_cache", True)
+        messages, stream_kwargs = self._build_messages(user_input, system_prompt, **kwargs)
+        cache_key = self._cache_key(messages, stream_kwargs, use_cache)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                yield from cached
+                return
+        chunks = []
+        for chunk in self._stream_llm(messages, **stream_kwargs):
+            if chunk.content:
+                chunks.append(chunk.content)
+                yield chunk.content
+        if cache_key and all(isinstance(c, str) for c in chunks):
+            self.response_cache.put(cache_key, chunks, self.model_name)
+
+    async def _agenerate(self, user_input: str, system_prompt: str, **kwargs) -> str:
+        """
+        Generate a response asynchronously
+
+        Args:
+            user_input: User input text
+            system_prompt: System prompt text
+            **kwargs: Additional parameters
+
+        Returns:
+            Generated response
+        """
+        use_cache = kwargs.pop("use_cache", True)
+        messages, invoke_kwargs = self._build_messages(user_input, system_prompt, **kwargs)
+        cache_key = self._cache_key(messages, invoke_kwargs, use_cache)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                return "".join(cached)
+        response = await self._ainvoke_llm(messages, **invoke_kwargs)
+        if cache_key and isinstance(response.content, str):
+            self.response_cache.put(cache_key, [response.content], self.model_name)
+        return response.content
+
+    async def _astream(self, user_input: str, system_prompt: str, **kwargs) -> AsyncIterator[str]:
+        """
+        Stream a response asynchronously
+
+        Args:
+            user_input: User input text
+            system_prompt: System prompt text
+            **kwargs: Additional parameters
+
+        Returns:
+            Async iterator yielding response chunks
+        """
+        use_cache = kwargs.pop("use_cache", True)
+        messages, stream_kwargs = self._build_messages(user_input, system_prompt, **kwargs)
+        cache_key = self._cache_key(messages, stream_kwargs, use_cache)
+        if cache_key:
+            cached = self.response_cache.get(cache_key)
+            if cached is not None:
+                for chunk in cached:
+                    yield chunk
+                return
+        chunks = []
+        async for chunk in self._astream_llm(messages, **stream_kwargs):
             if chunk.content:
+                chunks.append(chunk.content)
                 yield chunk.content
+        if cache_key and all(isinstance(c, str) for c in chunks):
+            self.response_cache.put(cache_key, chunks, self.model_name)
+
+    def _build_messages(self, user_input: str, system_prompt: str, **kwargs) -> tuple:
+        """
+        Prepare messages, omitting the system message when no system prompt is given
+
+        Shared by the sync, async and batch paths so the same request always
+        produces the same payload and response cache key.
+
+        Args:
+            user_input: User input text
+            system_prompt: System prompt text (may be empty)
+            **kwargs: Additional parameters
+
+        Returns:
+            Tuple of (messages, invoke_kwargs)
+        """
+        if system_prompt:
+            return self._prepare_messages(user_input, system_prompt, **kwargs)
+        return [{"role": "user", "content": user_input}], kwargs
+
+    def _cache_key(self, messages: Any, kwargs: Dict[str, Any], use_cache: bool = True) -> Optional[str]:
+        """
+        Get the response cache key of a request
+
+        The key covers the endpoint and thinking mode as well as the model,
+        messages and generation parameters.
+
+        Args:
+            messages: Prepared messages
+            kwargs: Call parameters
+            use_cache: False to bypass the cache for this call
+
+        Returns:
+            Cache key, or None if the request must not be served from the cache
+        """
+        if not use_cache or self.response_cache is None:
+            return None
+        params = {
+            k: v for k, v in {**self.kwargs, **kwargs}.items()
+            if k not in ("http_client", "http_async_client")
+        }
+        if config.get("llm.response_cache.deterministic_only", False) and params.get("temperature") != 0:
+            return None
+        return make_cache_key(
+            self.model_name, messages, dict(params, api_base=self.api_base, thinking_mode=self.thinking_mode)
+        )
+
+    @staticmethod
+    def _estimate_prompt_tokens(messages: Any) -> int:
+        """
+        Estimate the prompt tokens of a request
+
+        Args:
+            messages: Messages or prompt text
+
+        Returns:
+            Estimated token count
+        """
+        if isinstance(messages, str):
+            text = messages
+        else:
+            text = "".join(
+                str(m.get("content", "") if isinstance(m, dict) else getattr(m, "content", m))
+                for m in messages
+            )
+        return estimate_tokens(text)
+
+    def _estimate_request_tokens(self, messages: Any, kwargs: Dict[str, Any]) -> int:
+        """
+        Estimate the tokens a request will consume: prompt plus the completion budget
+
+        Args:
+            messages: Messages or prompt text
+            kwargs: Call parameters
+
+        Returns:
+            Estimated token count
+        """
+        max_tokens = kwargs.get("max_tokens") or self.kwargs.get("max_tokens") or 0
+        return self._estimate_prompt_tokens(messages) + int(max_tokens)
+
+    @staticmethod
+    def _usage_tokens(response: Any) -> Optional[int]:
+        """Get the total tokens reported by a LangChain response, if any"""
+        usage = getattr(response, "usage_metadata", None)
+        return usage.get("total_tokens") if usage else None
+
+    def _prompt_cache_enabled(self, prefix: Any) -> bool:
+        """Check whether a static prefix is long enough to be worth marking as cacheable"""
+        cache_config = config.get("llm.prompt_cache", {}) or {}
+        if not cache_config.get("enabled", False) or not prefix:
+            return False
+        return self._estimate_prompt_tokens(prefix) >= int(cache_config.get("min_tokens", 1024))
+
+    def _apply_prompt_cache(self, messages: Any, kwargs: Dict[str, Any]) -> tuple:
+        """
+        Prepare a request for the provider's prompt-prefix cache
+
+        The default leaves the request unchanged; providers override this to add
+        cache breakpoints or reorder messages so the static prefix comes first.
+
+        Args:
+            messages: Messages to send
+            kwargs: Call parameters
+
+        Returns:
+            Tuple of (messages, kwargs)
+        """
+        return messages, kwargs
+
+    @staticmethod
+    def _static_prefix_first(messages: Any) -> Any:
+        """
+        Move the system messages of the leading prompt to the front
+
+        Only messages before the first assistant or tool message are reordered;
+        system messages injected later in the conversation keep their position.
+
+        Args:
+            messages: Messages to send
+
+        Returns:
+            Reordered messages (prompt text is returned unchanged)
+        """
+        if isinstance(messages, str):
+            return messages
+
+        def role(message: Any) -> Optional[str]:
+            if isinstance(message, dict):
+                return message.get("role")
+            return getattr(message, "type", None)
+
+        messages = list(messages)
+        end = next((i for i, m in enumerate(messages) if role(m) in ("assistant", "ai", "tool")), len(messages))
+        prefix = messages[:end]
+        return (
+            [m for m in prefix if role(m) == "system"]
+            + [m for m in prefix if role(m) != "system"]
+            + messages[end:]
+        )
+
+    def _record_prompt_cache(self, usage: Dict[str, int]):
+        """
+        Accumulate prompt-cache usage reported for a call
+
+        Args:
+            usage: Usage extracted by usage_from_response
+        """
+        self.prompt_cache_stats["responses"] += 1
+        self.prompt_cache_stats["input_tokens"] += usage["input_tokens"]
+        self.prompt_cache_stats["cache_read_tokens"] += usage["cache_read"]
+        self.prompt_cache_stats["cache_creation_tokens"] += usage["cache_creation"]
+
+    def get_prompt_cache_stats(self) -> Dict[str, Any]:
+        """
+        Get prompt-prefix cache usage
+
+        Returns:
+            Token counters and the share of input tokens read from the cache
+        """
+        stats = dict(self.prompt_cache_stats)
+        stats["cache_hit_rate"] = (
+            round(stats["cache_read_tokens"] / stats["input_tokens"], 3) if stats["input_tokens"] else 0.0
+        )
+        return stats
+
+    def _fit_context(self, messages: Any, kwargs: Dict[str, Any]) -> tuple:
+        """
+        Fit a request into the model's context window per llm.token_accounting.context_policy
+
+        The prompt budget is the context window minus the completion budget
+        (max_tokens); a system prompt passed as a kwarg counts against it.
+
+        Args:
+            messages: Messages to send
+            kwargs: Call parameters
+
+        Returns:
+            Tuple of (messages, trimmed)
+        """
+        accounting = config.get("llm.token_accounting", {}) or {}
+        max_tokens = kwargs.get("max_tokens") or self.kwargs.get("max_tokens") or 0
+        system = kwargs.get("system")
+        return fit_messages(
+            messages,
+            self.token_counter,
+            context_window(self.model_name) - int(max_tokens),
+            policy=accounting.get("context_policy", "trim"),
+            fixed_tokens=self.token_counter.count_text(system) if isinstance(system, str) else 0,
+            summary_max_tokens=int(accounting.get("summary_max_tokens", 512)),
+        )
+
+    def _begin_call(self, messages: Any, kwargs: Dict[str, Any]) -> tuple:
+        """
+        Prepare a request: fit the context window, apply prompt caching and estimate its prompt tokens
+
+        Args:
+            messages: Messages to send
+            kwargs: Call parameters
+
+        Returns:
+            Tuple of (messages, kwargs, call usage)
+        """
+        messages, trimmed = self._fit_context(messages, kwargs)
+        estimated = self.token_counter.count_messages(messages)
+        system = kwargs.get("system")
+        if isinstance(system, str):
+            estimated += self.token_counter.count_text(system)
+        messages, kwargs = self._apply_prompt_cache(messages, kwargs)
+        return messages, kwargs, CallUsage(estimated, trimmed)
+
+    def _end_call(self, call: CallUsage, response: Any = None):
+        """
+        Record the usage of a finished call
+
+        Args:
+            call: Usage collected for the call
+            response: Final response (streams observe their chunks as they arrive)
+        """
+        if response is not None:
+            call.observe(response, self.token_counter)
+        if call.usage:
+            self._record_prompt_cache(call.usage)
+            self.token_counter.calibrate(call.estimated_prompt_tokens, call.usage["input_tokens"])
+        record = token_ledger.record(self.model_name, call)
+        for key in self.token_usage:
+            self.token_usage[key] += record[key]
+
+    def _retry_policy(self) -> tuple:
+        """Get (retry_count, retry_delay) for rate-limited requests from api config"""
+        api_config = config.get_api_config()
+        return int(api_config.get("retry_count", 3)), float(api_config.get("retry_delay", 2))
+
+    def _on_rate_limited(self, error: Exception, attempt: int) -> bool:
+        """
+        Back off after a rate-limit error
+
+        Args:
+            error: Exception raised by the chat model
+            attempt: Zero-based attempt number
+
+        Returns:
+            True if the request should be retried
+        """
+        retry_count, retry_delay = self._retry_policy()
+        delay = parse_retry_after(error, retry_delay)
+        if delay is None or attempt >= retry_count:
+            return False
+        logger.warning(f"{self.model_name} rate limited, retrying in {delay:.1f}s ({attempt + 1}/{retry_count})")
+        self.rate_limiter.penalize(delay)
+        return True
+
+    def _invoke_llm(self, messages: Any, llm: Any = None, **kwargs) -> Any:
+        """
+        Invoke the chat model within the provider's rate limits
+
+        Args:
+            messages: Messages to send
+            llm: Chat model to call (defaults to self.llm; bind_tools passes the tool-bound model)
+            **kwargs: Additional parameters
+
+        Returns:
+            Chat model response
+        """
+        llm = self.llm if llm is None else llm
+        messages, kwargs, call = self._begin_call(messages, kwargs)
+        if not self.rate_limiter:
+            response = llm.invoke(messages, **kwargs)
+            self._end_call(call, response)
+            return response
+        attempt = 0
+        while True:
+            with self.rate_limiter.limit(self._estimate_request_tokens(messages, kwargs)) as slot:
+                try:
+                    response = llm.invoke(messages, **kwargs)
+                except Exception as e:
+                    if not self._on_rate_limited(e, attempt):
+                        raise
+                    attempt += 1
+                    continue
+                slot.tokens = self._usage_tokens(response)
+                self._end_call(call, response)
+                return response
+
+    def _stream_llm(self, messages: Any, llm: Any = None, **kwargs) -> Iterator[Any]:
+        """
+        Stream from the chat model within the provider's rate limits
+
+        A rate-limit error is retried only if no chunk has been yielded yet.
+
+        Args:
+            messages: Messages to send
+            llm: Chat model to call (defaults to self.llm; bind_tools passes the tool-bound model)
+            **kwargs: Additional parameters
+
+        Returns:
+            Iterator yielding chat model chunks
+        """
+        llm = self.llm if llm is None else llm
+        messages, kwargs, call = self._begin_call(messages, kwargs)
+        if not self.rate_limiter:
+            for chunk in llm.stream(messages, **kwargs):
+                call.observe(chunk, self.token_counter)
+                yield chunk
+            self._end_call(call)
+            return
+        attempt = 0
+        while True:
+            started = False
+            with self.rate_limiter.limit(self._estimate_request_tokens(messages, kwargs)):
+                try:
+                    for chunk in llm.stream(messages, **kwargs):
+                        started = True
+                        call.observe(chunk, self.token_counter)
+                        yield chunk
+                    self._end_call(call)
+                    return
+                except Exception as e:
+                    if started or not self._on_rate_limited(e, attempt):
+                        raise
+                    attempt += 1
+
+    async def _ainvoke_llm(self, messages: Any, llm: Any = None, **kwargs) -> Any:
+        """
+        Invoke the chat model asynchronously within the provider's rate limits
+
+        Args:
+            messages: Messages to send
+            llm: Chat model to call (defaults to self.llm; bind_tools passes the tool-bound model)
+            **kwargs: Additional parameters
+
+        Returns:
+            Chat model response
+        """
+        llm = self.llm if llm is None else llm
+        messages, kwargs, call = self._begin_call(messages, kwargs)
+        if not self.rate_limiter:
+            response = await llm.ainvoke(messages, **kwargs)
+            self._end_call(call, response)
+            return response
+        attempt = 0
+        while True:
+            async with self.rate_limiter.alimit(self._estimate_request_tokens(messages, kwargs)) as slot:
+                try:
+                    response = await llm.ainvoke(messages, **kwargs)
+                except Exception as e:
+                    if not self._on_rate_limited(e, attempt):
+                        raise
+                    attempt += 1
+                    continue
+                slot.tokens = self._usage_tokens(response)
+                self._end_call(call, response)
+                return response
+
+    async def _astream_llm(self, messages: Any, llm: Any = None, **kwargs) -> AsyncIterator[Any]:
+        """
+        Stream from the chat model asynchronously within the provider's rate limits
+
+        Args:
+            messages: Messages to send
+            llm: Chat model to call (defaults to self.llm; bind_tools passes the tool-bound model)
+            **kwargs: Additional parameters
+
+        Returns:
+            Async iterator yielding chat model chunks
+        """
+        llm = self.llm if llm is None else llm
+        messages, kwargs, call = self._begin_call(messages, kwargs)
+        if not self.rate_limiter:
+            async for chunk in llm.astream(messages, **kwargs):
+                call.observe(chunk, self.token_counter)
+                yield chunk
+            self._end_call(call)
+            return
+        attempt = 0
+        while True:
+            started = False
+            async with self.rate_limiter.alimit(self._estimate_request_tokens(messages, kwargs)):
+                try:
+                    async for chunk in llm.astream(messages, **kwargs):
+                        started = True
+                        call.observe(chunk, self.token_counter)
+                        yield chunk
+                    self._end_call(call)
+                    return
+                except Exception as e:
+                    if started or not self._on_rate_limited(e, attempt):
+                        raise
+                    attempt += 1
+
+    def _http_client_kwargs(self, base_url: Optional[str]) -> Dict[str, Any]:
+        """
+        Get shared keep-alive HTTP clients for OpenAI-compatible chat models
+
+        Args:
+            base_url: Effective API base URL of the chat model
+
+        Returns:
+            http_client / http_async_client kwargs, or an empty dict when the
+            caller already supplied its own clients
+        """
+        if "http_client" in self.kwargs or "http_async_client" in self.kwargs:
+            return {}
+        return {
+            "http_client": http_client_pool.get_client(base_url),
+            "http_async_client": http_client_pool.get_async_client(base_url),
+        }
 
     @abstractmethod
     def _get_chat_model(self) -> Any:
@@ -136,6 +687,137 @@ class BasicProvider(ABC):
         else:
             return self._generate(user_input, system_prompt, **kwargs)
 
+    async def agenerate(self, user_input: str, system_prompt: str = "", **kwargs) -> str:
+        """
+        Generate a complete response without blocking the event loop
+
+        Args:
+            user_input: User input text
+            system_prompt: System prompt text
+            **kwargs: Additional parameters
+
+        Returns:
+            Response text
+        """
+        return await self._agenerate(user_input, system_prompt, **kwargs)
+
+    async def achat(self, user_input: str, system_prompt: str = "", **kwargs) -> AsyncIterator[str]:
+        """
+        Chat with the LLM asynchronously, yielding text chunks
+
+        In non-stream mode the complete response is yielded as a single chunk.
+
+        Args:
+            user_input: User input text
+            system_prompt: System prompt text
+            **kwargs: Additional parameters
+
+        Returns:
+            Async iterator yielding response text
+        """
+        if self.stream_mode:
+            async for chunk in self._astream(user_input, system_prompt, **kwargs):
+                yield chunk
+        else:
+            yield await self._agenerate(user_input, system_prompt, **kwargs)
+
+    @staticmethod
+    def _batch_item(request: Any) -> tuple:
+        """Split a batch request (prompt text or dict) into (user_input, system_prompt, kwargs)"""
+        if isinstance(request, str):
+            return request, "", {}
+        request = dict(request)
+        user_input = request.pop("user_input", None) or request.pop("prompt", "")
+        system_prompt = request.pop("system_prompt", "")
+        return user_input, system_prompt, request
+
+    def batch_chat(
+        self,
+        requests: List[Any],
+        max_concurrency: Optional[int] = None,
+        mode: str = "online",
+        poll_interval: Optional[float] = None,
+    ) -> List[BatchResult]:
+        """
+        Run many independent chat requests
+
+        In "online" mode requests run concurrently on a thread pool, sharing the
+        provider's keep-alive connections and rate limiter. In "batch" mode they
+        are submitted to the provider's offline batch endpoint and polled until
+        done; providers without one fall back to online mode.
+
+        Args:
+            requests: Prompt strings, or dicts with user_input, optional system_prompt and call parameters
+            max_concurrency: Maximum concurrent requests in online mode (defaults to api.batch_max_concurrency)
+            mode: "online" or "batch"
+            poll_interval: Seconds between batch status checks (defaults to api.batch_poll_interval)
+
+        Returns:
+            One BatchResult per request in request order; a failed request
+            carries its error instead of raising
+        """
+        if mode == "batch":
+            if self.supports_batch_api:
+                return self._submit_batch(requests, poll_interval)
+            logger.warning(f"{self.model_name} has no batch endpoint, running requests online")
+        max_concurrency = max_concurrency or config.get_api_config().get("batch_max_concurrency", 8)
+
+        def run(index: int, request: Any) -> BatchResult:
+            user_input, system_prompt, kwargs = self._batch_item(request)
+            try:
+                return BatchResult(index, content=self._generate(user_input, system_prompt, **kwargs))
+            except Exception as e:
+                return BatchResult(index, error=f"{type(e).__name__}: {e}")
+
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            return list(executor.map(run, range(len(requests)), requests))
+
+    async def abatch_chat(
+        self,
+        requests: List[Any],
+        max_concurrency: Optional[int] = None,
+        mode: str = "online",
+        poll_interval: Optional[float] = None,
+    ) -> List[BatchResult]:
+        """
+        Run many independent chat requests without blocking the event loop
+
+        Args:
+            requests: Prompt strings, or dicts with user_input, optional system_prompt and call parameters
+            max_concurrency: Maximum concurrent requests in online mode (defaults to api.batch_max_concurrency)
+            mode: "online" or "batch"
+            poll_interval: Seconds between batch status checks (defaults to api.batch_poll_interval)
+
+        Returns:
+            One BatchResult per request in request order
+        """
+        if mode == "batch":
+            if self.supports_batch_api:
+                return await asyncio.to_thread(self._submit_batch, requests, poll_interval)
+            logger.warning(f"{self.model_name} has no batch endpoint, running requests online")
+        semaphore = asyncio.Semaphore(max_concurrency or config.get_api_config().get("batch_max_concurrency", 8))
+
+        async def run(index: int, request: Any) -> BatchResult:
+            user_input, system_prompt, kwargs = self._batch_item(request)
+            async with semaphore:
+                try:
+                    return BatchResult(index, content=await self._agenerate(user_input, system_prompt, **kwargs))
+                except Exception as e:
+                    return BatchResult(index, error=f"{type(e).__name__}: {e}")
+
+        return list(await asyncio.gather(*(run(i, request) for i, request in enumerate(requests))))
+
+    def _submit_batch(self, requests: List[Any], poll_interval: Optional[float] = None) -> List[BatchResult]:
+        """Run requests through the provider's offline batch endpoint"""
+        bodies = []
+        for request in requests:
+            user_input, system_prompt, kwargs = self._batch_item(request)
+            messages, _ = self._build_messages(user_input, system_prompt)
+            params = {k: v for k, v in {**self.kwargs, **kwargs}.items() if k in BATCH_BODY_PARAMS}
+            bodies.append({"model": self.model_name, "messages": messages, **params})
+        api_base = getattr(self.llm, "openai_api_base", None) or self.api_base
+        return BatchAPIClient(api_base, self.api_key, poll_interval=poll_interval).run(bodies)
+
     def get_model_info(self) -> Dict[str, Any]:
         """
         Get model information
@@ -149,6 +831,11 @@ class BasicProvider(ABC):
             "stream_mode": self.stream_mode,
             "thinking_mode": self.thinking_mode,
             "kwargs": self.kwargs,
+            "rate_limit": self.rate_limiter.get_stats() if self.rate_limiter else None,
+            "response_cache": self.response_cache.get_stats() if self.response_cache else None,
+            "prompt_cache": self.get_prompt_cache_stats(),
+            "token_usage": dict(self.token_usage),
+            "context_window": context_window(self.model_name),
         }
 
     def _llm_type(self) -> str:
@@ -172,7 +859,7 @@ class BasicProvider(ABC):
             Response
         """
         if hasattr(self.llm, "invoke"):
-            return self.llm.invoke(messages, **kwargs)
+            return self._invoke_llm(messages, **kwargs)
         # Fallback implementation
         from langchain_core.messages import HumanMessage, SystemMessage
         
@@ -208,7 +895,7 @@ class BasicProvider(ABC):
             Streaming response
         """
         if hasattr(self.llm, "stream"):
-            return self.llm.stream(messages, **kwargs)
+            return self._stream_llm(messages, **kwargs)
         # Fallback implementation
         from langchain_core.messages import HumanMessage, SystemMessage
         
@@ -226,6 +913,44 @@ class BasicProvider(ABC):
         self.stream_mode = True
         return self.chat(user_input, system_prompt, **kwargs)
 
+    async def ainvoke(self, messages, **kwargs):
+        """
+        Async invoke method for compatibility with deepagents library
+
+        Delegates to the chat model's native ainvoke, so concurrent calls share
+        one event loop instead of one thread each.
+
+        Args:
+            messages: Messages to send
+            **kwargs: Additional parameters
+
+        Returns:
+            Response
+        """
+        if hasattr(self.llm, "ainvoke"):
+            return await self._ainvoke_llm(messages, **kwargs)
+        # Fallback implementation
+        return await asyncio.to_thread(self.invoke, messages, **kwargs)
+
+    async def astream(self, messages, **kwargs):
+        """
+        Async stream method for compatibility with deepagents library
+
+        Args:
+            messages: Messages to send
+            **kwargs: Additional parameters
+
+        Yields:
+            Response chunks
+        """
+        if hasattr(self.llm, "astream"):
+            async for chunk in self._astream_llm(messages, **kwargs):
+                yield chunk
+            return
+        # Fallback implementation
+        for chunk in await asyncio.to_thread(list, self.stream(messages, **kwargs)):
+            yield chunk
+
     def bind_tools(self, tools, **kwargs):
         """
         Bind tools to the model for compatibility with deepagents library
@@ -235,9 +960,9 @@ class BasicProvider(ABC):
             **kwargs: Additional parameters
 
         Returns:
-            Model with bound tools
+            Model with bound tools whose calls keep the provider's rate limits
         """
         if hasattr(self.llm, "bind_tools"):
-            return self.llm.bind_tools(tools, **kwargs)
+            return ProviderBoundModel(self, self.llm.bind_tools(tools, **kwargs))
         # Fallback implementation
         return self
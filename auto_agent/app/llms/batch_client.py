@@ -0,0 +1,178 @@
+"""
+Batch Client
+Results of bulk chat requests and a submit-and-poll client for OpenAI-style batch endpoints
+"""
+
+import json
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from ..config import config
+from ..utils.logger import global_logger as logger
+from .http_pool import http_client_pool
+
+
+class BatchResult:
+    """Outcome of one request in a batch: either content or an error message"""
+
+    def __init__(self, index: int, content: Optional[str] = None, error: Optional[str] = None):
+        self.index = index
+        self.content = content
+        self.error = error
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"index": self.index, "content": self.content, "error": self.error}
+
+    def __repr__(self) -> str:
+        return f"BatchResult(index={self.index}, ok={self.ok})"
+
+
+class BatchAPIClient:
+    """
+    Client for OpenAI-compatible offline batch endpoints
+
+    Requests are uploaded as a JSONL file, a batch job is created for it and
+    polled until it reaches a terminal state, then the output and error files
+    are downloaded and matched back to the requests by custom_id.
+    """
+
+    TERMINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+    def __init__(
+        self,
+        api_base: str,
+        api_key: str,
+        poll_interval: Optional[float] = None,
+        timeout: Optional[float] = None,
+        client: Optional[httpx.Client] = None,
+    ):
+        """
+        Initialize the client
+
+        Args:
+            api_base: API base URL, e.g. "https://api.openai.com/v1"
+            api_key: API key
+            poll_interval: Seconds between status checks (defaults to api.batch_poll_interval)
+            timeout: Seconds to wait for the job before giving up (defaults to api.batch_timeout)
+            client: HTTP client (defaults to the shared client of the endpoint)
+        """
+        api_config = config.get_api_config()
+        self.api_base = api_base.rstrip("/")
+        self.api_key = api_key
+        self.poll_interval = poll_interval or api_config.get("batch_poll_interval", 30)
+        self.timeout = timeout or api_config.get("batch_timeout", 86400)
+        self.client = client or http_client_pool.get_client(api_base)
+
+    def _headers(self) -> Dict[str, str]:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def submit(self, bodies: List[Dict[str, Any]], endpoint: str = "/v1/chat/completions") -> str:
+        """
+        Upload requests and create a batch job
+
+        Args:
+            bodies: Chat completion request bodies, in order
+            endpoint: Endpoint the batch runs against
+
+        Returns:
+            Batch job ID
+        """
+        lines = [
+            json.dumps({"custom_id": f"request-{i}", "method": "POST", "url": endpoint, "body": body}, ensure_ascii=False)
+            for i, body in enumerate(bodies)
+        ]
+        upload = self.client.post(
+            f"{self.api_base}/files",
+            headers=self._headers(),
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", "\n".join(lines).encode("utf-8"), "application/jsonl")},
+        )
+        upload.raise_for_status()
+        created = self.client.post(
+            f"{self.api_base}/batches",
+            headers=self._headers(),
+            json={"input_file_id": upload.json()["id"], "endpoint": endpoint, "completion_window": "24h"},
+        )
+        created.raise_for_status()
+        batch_id = created.json()["id"]
+        logger.info(f"Submitted batch {batch_id} with {len(bodies)} requests")
+        return batch_id
+
+    def wait(self, batch_id: str) -> Dict[str, Any]:
+        """
+        Poll a batch job until it reaches a terminal state
+
+        Args:
+            batch_id: Batch job ID
+
+        Returns:
+            Final batch object
+
+        Raises:
+            TimeoutError: If the job is still running after the timeout
+        """
+        deadline = time.time() + self.timeout
+        while True:
+            response = self.client.get(f"{self.api_base}/batches/{batch_id}", headers=self._headers())
+            response.raise_for_status()
+            batch = response.json()
+            if batch.get("status") in self.TERMINAL_STATES:
+                return batch
+            if time.time() >= deadline:
+                raise TimeoutError(f"Batch {batch_id} still {batch.get('status')} after {self.timeout}s")
+            time.sleep(self.poll_interval)
+
+    def _download(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        """Download a JSONL result file"""
+        if not file_id:
+            return []
+        response = self.client.get(f"{self.api_base}/files/{file_id}/content", headers=self._headers())
+        response.raise_for_status()
+        return [json.loads(line) for line in response.text.splitlines() if line.strip()]
+
+    def results(self, batch: Dict[str, Any], count: int) -> List[BatchResult]:
+        """
+        Collect per-request results of a finished batch job
+
+        Args:
+            batch: Final batch object
+            count: Number of submitted requests
+
+        Returns:
+            Results in submission order
+        """
+        results = [
+            BatchResult(i, error=f"batch {batch.get('status')} without a result for this request")
+            for i in range(count)
+        ]
+        for record in self._download(batch.get("output_file_id")) + self._download(batch.get("error_file_id")):
+            index = int(str(record.get("custom_id", "")).rsplit("-", 1)[-1])
+            if not 0 <= index < count:
+                continue
+            response = record.get("response") or {}
+            body = response.get("body") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                error = record.get("error") or body.get("error") or f"HTTP {response.get('status_code')}"
+                results[index] = BatchResult(index, error=str(error.get("message", error) if isinstance(error, dict) else error))
+            else:
+                results[index] = BatchResult(index, content=body["choices"][0]["message"]["content"])
+        return results
+
+    def run(self, bodies: List[Dict[str, Any]]) -> List[BatchResult]:
+        """
+        Submit requests, wait for the batch job and return its results
+
+        Args:
+            bodies: Chat completion request bodies, in order
+
+        Returns:
+            Results in submission order
+        """
+        batch = self.wait(self.submit(bodies))
+        return self.results(batch, len(bodies))
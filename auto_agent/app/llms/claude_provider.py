@@ -3,13 +3,17 @@ Claude Provider
 Implementation for Anthropic Claude models
 """
 
-from typing import Any, Iterator
+from typing import Any, Dict, Iterator
 
 from langchain_anthropic import ChatAnthropic
 
 from .basic_provider import BasicProvider
 
 
+# Anthropic prompt-cache breakpoint
+CACHE_CONTROL = {"type": "ephemeral"}
+
+
 class ClaudeProvider(BasicProvider):
     """Claude LLM provider"""
 
@@ -27,3 +31,37 @@ class ClaudeProvider(BasicProvider):
         messages = [{"role": "user", "content": user_input}]
         kwargs["system"] = system_prompt
         return messages, kwargs
+
+    def _apply_prompt_cache(self, messages: Any, kwargs: Dict[str, Any]) -> tuple:
+        """
+        Mark the static system prompt as an Anthropic cache breakpoint
+
+        Handles both the ``system`` kwarg set by _prepare_messages and leading
+        system messages passed to invoke/stream; prompts shorter than
+        llm.prompt_cache.min_tokens are left as plain text.
+        """
+        system = kwargs.get("system")
+        if isinstance(system, str):
+            if self._prompt_cache_enabled(system):
+                kwargs = dict(kwargs, system=[{"type": "text", "text": system, "cache_control": CACHE_CONTROL}])
+            return messages, kwargs
+        if isinstance(messages, str):
+            return messages, kwargs
+
+        messages = self._static_prefix_first(messages)
+        system_count = 0
+        for message in messages:
+            role = message.get("role") if isinstance(message, dict) else getattr(message, "type", None)
+            if role != "system":
+                break
+            system_count += 1
+        if not system_count:
+            return messages, kwargs
+        last = messages[system_count - 1]
+        content = last.get("content") if isinstance(last, dict) else last.content
+        if isinstance(content, str) and self._prompt_cache_enabled(content):
+            block = [{"type": "text", "text": content, "cache_control": CACHE_CONTROL}]
+            messages[system_count - 1] = (
+                dict(last, content=block) if isinstance(last, dict) else last.model_copy(update={"content": block})
+            )
+        return messages, kwargs
@@ -3,10 +3,11 @@ DeepSeek Provider
 Implementation for DeepSeek models
 """
 
-from typing import Any, Iterator
+from typing import Any, Dict, Iterator
 
 from langchain_openai import ChatOpenAI
 
+from ..config import config
 from .basic_provider import BasicProvider
 
 
@@ -16,11 +17,21 @@ class DeepSeekProvider(BasicProvider):
     def _get_chat_model(self) -> Any:
         """Get DeepSeek chat model instance"""
         # Add streaming parameter
+        base_url = self.api_base or "https://api.deepseek.com/v1"
         chat_kwargs = {
             "model": self.model_name,
             "api_key": self.api_key,
-            "base_url": self.api_base or "https://api.deepseek.com/v1",
+            "base_url": base_url,
             "streaming": self.stream_mode,
+            # Report usage (including prompt_cache_hit_tokens) on streamed responses too
+            "stream_usage": True,
+            **self._http_client_kwargs(base_url),
             **self.kwargs
         }
         return ChatOpenAI(**chat_kwargs)
+
+    def _apply_prompt_cache(self, messages: Any, kwargs: Dict[str, Any]) -> tuple:
+        """Put system messages first so DeepSeek's automatic context cache sees a stable prefix"""
+        if not config.get("llm.prompt_cache.enabled", False):
+            return messages, kwargs
+        return self._static_prefix_first(messages), kwargs
@@ -15,9 +15,11 @@ class DoubaoProvider(BasicProvider):
 
     def _get_chat_model(self) -> Any:
         """Get Doubao chat model instance"""
+        base_url = self.api_base or "https://ark.cn-beijing.volces.com/api/v3"
         return ChatOpenAI(
             model=self.model_name,
             api_key=self.api_key,
-            base_url=self.api_base or "https://ark.cn-beijing.volces.com/api/v3",
+            base_url=base_url,
+            **self._http_client_kwargs(base_url),
             **self.kwargs
         )
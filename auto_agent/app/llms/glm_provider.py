@@ -15,9 +15,11 @@ class GLMProvider(BasicProvider):
 
     def _get_chat_model(self) -> Any:
         """Get GLM chat model instance"""
+        base_url = self.api_base or "https://open.bigmodel.cn/api/messages"
         return ChatOpenAI(
             model=self.model_name,
             api_key=self.api_key,
-            base_url=self.api_base or "https://open.bigmodel.cn/api/messages",
+            base_url=base_url,
+            **self._http_client_kwargs(base_url),
             **self.kwargs
         )
@@ -13,11 +13,15 @@ from .basic_provider import BasicProvider
 class GPTProvider(BasicProvider):
     """GPT LLM provider"""
 
+    supports_batch_api = True
+
     def _get_chat_model(self) -> Any:
         """Get GPT chat model instance"""
+        base_url = self.api_base or "https://api.openai.com/v1"
         return ChatOpenAI(
             model=self.model_name,
             api_key=self.api_key,
-            base_url=self.api_base or "https://api.openai.com/v1",
+            base_url=base_url,
+            **self._http_client_kwargs(base_url),
             **self.kwargs
         )
@@ -0,0 +1,208 @@
+"""
+HTTP Connection Pool
+Shared keep-alive HTTP clients for LLM providers
+"""
+
+import asyncio
+import threading
+import weakref
+from typing import Any, Dict, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from ..config import config
+
+
+class LoopBoundAsyncClient(httpx.AsyncClient):
+    """
+    Async client handle that sends each request through the running loop's client
+
+    httpx async connections belong to the event loop that opened them, so one
+    AsyncClient cannot serve several asyncio.run() calls or thread-per-loop
+    callers. Chat models keep this handle for their lifetime; requests go to
+    the pool's client for (endpoint, running loop).
+    """
+
+    def __init__(self, pool: "HTTPClientPool", key: str, **kwargs):
+        """
+        Initialize the handle
+
+        Args:
+            pool: Pool owning the per-loop clients
+            key: Endpoint key
+            **kwargs: httpx.AsyncClient options (used for request building only)
+        """
+        super().__init__(**kwargs)
+        self._pool = pool
+        self._key = key
+
+    async def send(self, request: httpx.Request, **kwargs) -> httpx.Response:
+        return await self._pool.get_loop_client(self._key).send(request, **kwargs)
+
+    async def aclose(self):
+        """Close the running loop's client for this endpoint"""
+        await self._pool.aclose_loop_client(self._key)
+
+
+class HTTPClientPool:
+    """
+    Process-wide keep-alive HTTP clients, one pair (sync + async) per endpoint
+
+    Providers that talk to the same host reuse the same connections instead of
+    opening a new TLS session per provider instance. Idle connections are closed
+    by httpx after ``keepalive_expiry`` seconds. Async connections are pooled
+    per event loop; clients of closed loops are dropped.
+    """
+
+    def __init__(
+        self,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None,
+        keepalive_expiry: Optional[float] = None,
+        timeout: Optional[float] = None,
+    ):
+        """
+        Initialize the pool
+
+        Args:
+            max_connections: Maximum open connections per endpoint (defaults to api.pool_max_connections)
+            max_keepalive_connections: Maximum idle keep-alive connections per endpoint (defaults to api.pool_max_keepalive)
+            keepalive_expiry: Seconds an idle connection is kept open (defaults to api.pool_keepalive_expiry)
+            timeout: Request timeout in seconds (defaults to api.timeout)
+        """
+        api_config = config.get_api_config()
+        self.max_connections = max_connections or api_config.get("pool_max_connections", 20)
+        self.max_keepalive_connections = max_keepalive_connections or api_config.get("pool_max_keepalive", 10)
+        self.keepalive_expiry = keepalive_expiry or api_config.get("pool_keepalive_expiry", 60)
+        self.timeout = timeout or api_config.get("timeout", 60)
+        self._clients: Dict[str, httpx.Client] = {}
+        self._async_clients: Dict[str, LoopBoundAsyncClient] = {}
+        self._loop_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def endpoint_key(api_base: Optional[str]) -> str:
+        """
+        Get the pool key for an API base URL
+
+        Args:
+            api_base: API base URL
+
+        Returns:
+            "scheme://host[:port]" of the endpoint
+        """
+        parts = urlsplit(api_base or "")
+        return f"{parts.scheme}://{parts.netloc}".lower()
+
+    def _limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+    def get_client(self, api_base: Optional[str]) -> httpx.Client:
+        """
+        Get the shared synchronous client for an endpoint
+
+        Args:
+            api_base: API base URL
+
+        Returns:
+            httpx client
+        """
+        key = self.endpoint_key(api_base)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.Client(limits=self._limits(), timeout=self.timeout)
+                self._clients[key] = client
+            return client
+
+    def get_async_client(self, api_base: Optional[str]) -> httpx.AsyncClient:
+        """
+        Get the shared asynchronous client for an endpoint
+
+        Args:
+            api_base: API base URL
+
+        Returns:
+            httpx async client usable from any event loop (see LoopBoundAsyncClient)
+        """
+        key = self.endpoint_key(api_base)
+        with self._lock:
+            client = self._async_clients.get(key)
+            if client is None:
+                client = LoopBoundAsyncClient(self, key, timeout=self.timeout)
+                self._async_clients[key] = client
+            return client
+
+    def get_loop_client(self, key: str) -> httpx.AsyncClient:
+        """
+        Get the running event loop's client for an endpoint
+
+        Args:
+            key: Endpoint key
+
+        Returns:
+            httpx async client owned by the running loop
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            # Pooled connections keep their loop alive, so closed loops are purged explicitly
+            for stale in [other for other in list(self._loop_clients) if other.is_closed()]:
+                del self._loop_clients[stale]
+            clients = self._loop_clients.setdefault(loop, {})
+            client = clients.get(key)
+            if client is None or client.is_closed:
+                client = httpx.AsyncClient(limits=self._limits(), timeout=self.timeout)
+                clients[key] = client
+            return client
+
+    async def aclose_loop_client(self, key: str):
+        """
+        Close the running event loop's client for an endpoint
+
+        Args:
+            key: Endpoint key
+        """
+        with self._lock:
+            client = self._loop_clients.get(asyncio.get_running_loop(), {}).pop(key, None)
+        if client is not None:
+            await client.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics
+
+        Returns:
+            Endpoint list and pool limits
+        """
+        with self._lock:
+            return {
+                "endpoints": sorted(set(self._clients) | set(self._async_clients)),
+                "max_connections": self.max_connections,
+                "max_keepalive_connections": self.max_keepalive_connections,
+                "keepalive_expiry": self.keepalive_expiry,
+            }
+
+    def close_all(self):
+        """
+        Close all synchronous clients and forget asynchronous ones
+
+        Async clients are dropped rather than awaited so this can be called from
+        synchronous shutdown code; their connections close on garbage collection.
+        """
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+            self._async_clients.clear()
+            self._loop_clients.clear()
+
+
+# Global HTTP client pool instance
+http_client_pool = HTTPClientPool()
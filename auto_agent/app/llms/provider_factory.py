@@ -3,18 +3,24 @@ Provider Factory
 Factory class for creating LLM providers
 """
 
-from typing import Any, Dict, Optional
+import hashlib
+import importlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from importlib.metadata import entry_points
+from typing import Any, Dict, Optional, Union
 
+from app.config import config
 from app.llms.basic_provider import BasicProvider
-from app.llms.claude_provider import ClaudeProvider
-from app.llms.deepseek_provider import DeepSeekProvider
-from app.llms.doubao_provider import DoubaoProvider
-from app.llms.glm_provider import GLMProvider
-from app.llms.gpt_provider import GPTProvider
-from app.llms.kimi_provider import KimiProvider
-from app.llms.minipro_provider import MiniProProvider
-from app.llms.ollama_provider import OllamaProvider
-from app.llms.qwen_provider import QwenProvider
+from app.llms.rate_limiter import get_rate_limiter
+from app.utils.logger import global_logger as logger
+
+# Entry-point group for third-party providers, e.g. in a plugin's pyproject.toml:
+#   [project.entry-points."auto_agent.llm_providers"]
+#   mistral = "my_plugin.mistral_provider:MistralProvider"
+PLUGIN_ENTRY_POINT_GROUP = "auto_agent.llm_providers"
 
 
 class ProviderFactory:
@@ -22,27 +28,139 @@ class ProviderFactory:
     Factory class for creating LLM providers
     """
 
-    # Mapping of provider names to their respective classes
-    PROVIDERS = {
-        "basic": BasicProvider,
-        "gpt": GPTProvider,
-        "claude": ClaudeProvider,
-        "deepseek": DeepSeekProvider,
-        "doubao": DoubaoProvider,
-        "glm": GLMProvider,
-        "kimi": KimiProvider,
-        "minipro": MiniProProvider,
-        "ollama": OllamaProvider,
-        "qwen": QwenProvider,
+    # Mapping of provider names to "module:Class" import paths (or classes).
+    # Provider modules pull in their LangChain integration packages, so they are
+    # only imported when a provider of that kind is first created.
+    PROVIDERS: Dict[str, Union[str, type]] = {
+        "basic": "app.llms.basic_provider:BasicProvider",
+        "gpt": "app.llms.gpt_provider:GPTProvider",
+        "claude": "app.llms.claude_provider:ClaudeProvider",
+        "deepseek": "app.llms.deepseek_provider:DeepSeekProvider",
+        "doubao": "app.llms.doubao_provider:DoubaoProvider",
+        "glm": "app.llms.glm_provider:GLMProvider",
+        "kimi": "app.llms.kimi_provider:KimiProvider",
+        "minipro": "app.llms.minipro_provider:MiniProProvider",
+        "ollama": "app.llms.ollama_provider:OllamaProvider",
+        "qwen": "app.llms.qwen_provider:QwenProvider",
+        "router": "app.llms.routing_provider:RoutingProvider",
     }
 
+    # Provider classes already imported, keyed by provider name
+    _classes: Dict[str, type] = {}
+    _plugins_loaded = False
+
+    # Registry of created providers keyed by (provider, model, api_base, api_key, params)
+    _instances: "OrderedDict[tuple, BasicProvider]" = OrderedDict()
+    _last_used: Dict[tuple, float] = {}
+    # Re-entrant: building a RoutingProvider creates its backends through the factory
+    _lock = threading.RLock()
+
+    @classmethod
+    def _load_plugins(cls):
+        """Add providers registered by installed packages under the plugin entry-point group"""
+        if cls._plugins_loaded:
+            return
+        cls._plugins_loaded = True
+        for entry_point in entry_points(group=PLUGIN_ENTRY_POINT_GROUP):
+            name = entry_point.name.lower()
+            if name in cls.PROVIDERS:
+                logger.warning(f"Provider plugin {entry_point.value} ignored: {name} is already registered")
+                continue
+            cls.PROVIDERS[name] = entry_point.value
+
+    @classmethod
+    def register_provider(cls, provider_name: str, provider: Union[str, type]):
+        """
+        Register or replace a provider
+
+        Args:
+            provider_name: Provider name, as used in model names (e.g. "mistral")
+            provider: Provider class or "module:Class" import path
+        """
+        name = provider_name.lower()
+        with cls._lock:
+            cls.PROVIDERS[name] = provider
+            cls._classes.pop(name, None)
+
     @classmethod
-    def create_provider(cls, provider_name: str, **kwargs) -> Optional[BasicProvider]:
+    def get_provider_class(cls, provider_name: str) -> Optional[type]:
+        """
+        Get a provider class, importing its module on first use
+
+        Args:
+            provider_name: Normalized provider name
+
+        Returns:
+            Provider class, or None if the provider is unknown or fails to import
+        """
+        cls._load_plugins()
+        target = cls.PROVIDERS.get(provider_name)
+        if target is None or isinstance(target, type):
+            return target
+        provider_class = cls._classes.get(provider_name)
+        if provider_class is None:
+            module_name, _, class_name = target.partition(":")
+            try:
+                provider_class = getattr(importlib.import_module(module_name), class_name)
+            except (ImportError, AttributeError) as e:
+                logger.error(f"Failed to load provider {provider_name} from {target}: {e}")
+                return None
+            cls._classes[provider_name] = provider_class
+        return provider_class
+
+    @staticmethod
+    def _instance_key(provider_name: str, kwargs: Dict[str, Any]) -> tuple:
+        """
+        Build the registry key for a provider configuration
+
+        Args:
+            provider_name: Normalized provider name
+            kwargs: Provider parameters
+
+        Returns:
+            Hashable key; the API key is hashed and remaining parameters are serialized
+        """
+        params = {k: v for k, v in kwargs.items() if k not in ("model_name", "api_base", "api_key")}
+        api_key = kwargs.get("api_key") or ""
+        return (
+            provider_name,
+            kwargs.get("model_name"),
+            kwargs.get("api_base"),
+            hashlib.sha256(str(api_key).encode("utf-8")).hexdigest(),
+            json.dumps(params, sort_keys=True, default=repr),
+        )
+
+    @classmethod
+    def _evict(cls, now: float):
+        """Evict idle providers and trim the registry to its size limit (caller holds the lock)"""
+        api_config = config.get_api_config()
+        idle_timeout = api_config.get("provider_idle_timeout", 1800)
+        max_size = api_config.get("provider_cache_size", 32)
+        for key in [k for k, used in cls._last_used.items() if now - used > idle_timeout]:
+            cls._instances.pop(key, None)
+            cls._last_used.pop(key, None)
+        while len(cls._instances) > max_size:
+            key, _ = cls._instances.popitem(last=False)
+            cls._last_used.pop(key, None)
+
+    @staticmethod
+    def _build(provider_class: type, provider_name: str, kwargs: Dict[str, Any]) -> BasicProvider:
+        """Instantiate a provider and attach the rate limiter shared by its provider and API key"""
+        provider = provider_class(**kwargs)
+        provider.rate_limiter = get_rate_limiter(provider_name, kwargs.get("api_key"))
+        return provider
+
+    @classmethod
+    def create_provider(cls, provider_name: str, use_cache: bool = True, **kwargs) -> Optional[BasicProvider]:
         """
         Create a provider instance based on the provider name
 
+        Providers with the same configuration are created once and shared, so
+        agents reuse one chat model and its keep-alive connections.
+
         Args:
             provider_name: Name of the provider to create
+            use_cache: Whether to return a shared instance for an identical configuration
             **kwargs: Additional parameters for the provider
 
         Returns:
@@ -55,10 +173,46 @@ class ProviderFactory:
         if "-" in normalized_name:
             normalized_name = normalized_name.split("-")[0]
 
-        provider_class = cls.PROVIDERS.get(normalized_name)
-        if provider_class:
-            return provider_class(**kwargs)
-        return None
+        provider_class = cls.get_provider_class(normalized_name)
+        if not provider_class:
+            return None
+        if not use_cache:
+            return cls._build(provider_class, normalized_name, kwargs)
+
+        key = cls._instance_key(normalized_name, kwargs)
+        now = time.time()
+        with cls._lock:
+            cls._evict(now)
+            provider = cls._instances.get(key)
+            if provider is None:
+                provider = cls._build(provider_class, normalized_name, kwargs)
+                cls._instances[key] = provider
+            cls._instances.move_to_end(key)
+            cls._last_used[key] = now
+            return provider
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        Drop all shared provider instances
+        """
+        with cls._lock:
+            cls._instances.clear()
+            cls._last_used.clear()
+
+    @classmethod
+    def get_cache_stats(cls) -> Dict[str, Any]:
+        """
+        Get provider registry statistics
+
+        Returns:
+            Number of cached providers and their model names
+        """
+        with cls._lock:
+            return {
+                "size": len(cls._instances),
+                "models": [key[1] for key in cls._instances],
+            }
 
     @classmethod
     def get_available_providers(cls) -> list:
@@ -68,6 +222,7 @@ class ProviderFactory:
         Returns:
             List of available provider names
         """
+        cls._load_plugins()
         return list(cls.PROVIDERS.keys())
 
     @classmethod
@@ -81,4 +236,5 @@ class ProviderFactory:
         Returns:
             True if the provider is available, False otherwise
         """
+        cls._load_plugins()
         return provider_name.lower() in cls.PROVIDERS
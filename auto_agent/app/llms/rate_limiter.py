@@ -0,0 +1,333 @@
+"""
+Rate Limiter
+Token-bucket RPM/TPM limits and concurrency governor per provider and API key
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+
+from ..config import config
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Roughly estimate the token count of a text
+
+    CJK characters count as about one token each, other characters as about
+    four per token.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        Estimated token count
+    """
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿" or "぀" <= ch <= "ヿ" or "가" <= ch <= "힯")
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+def parse_retry_after(error: Exception, default: float) -> Optional[float]:
+    """
+    Detect a rate-limit error and extract how long to back off
+
+    Args:
+        error: Exception raised by the chat model
+        default: Delay to use when the error carries no Retry-After hint
+
+    Returns:
+        Seconds to wait, or None if the error is not a rate-limit error
+    """
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    if status != 429 and type(error).__name__ != "RateLimitError":
+        return None
+
+    headers = getattr(response, "headers", None) or {}
+    retry_after = getattr(error, "retry_after", None) or headers.get("retry-after")
+    if retry_after is None:
+        retry_after_ms = headers.get("retry-after-ms")
+        return float(retry_after_ms) / 1000 if retry_after_ms else default
+    try:
+        return max(0.0, float(retry_after))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(str(retry_after)).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class RateSlot:
+    """A granted request slot; set ``tokens`` to the actual usage once known"""
+
+    def __init__(self, estimated_tokens: int):
+        self.estimated_tokens = estimated_tokens
+        self.tokens: Optional[int] = None
+
+
+class RateLimiter:
+    """
+    Requests-per-minute / tokens-per-minute token buckets plus a concurrency cap
+
+    One limiter is shared by all threads and asyncio tasks using the same
+    provider and API key. Waiters are served first-come first-served: a request
+    only proceeds when it is at the head of the queue, so large requests are
+    not starved by a stream of small ones.
+    """
+
+    def __init__(self, rpm: int = 0, tpm: int = 0, max_concurrency: int = 0, name: str = ""):
+        """
+        Initialize the limiter
+
+        Args:
+            rpm: Requests per minute (0 for unlimited)
+            tpm: Tokens per minute, prompt plus completion (0 for unlimited)
+            max_concurrency: Maximum in-flight requests (0 for unlimited)
+            name: Name used in statistics
+        """
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_concurrency = max_concurrency
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._in_flight = 0
+        self._queue: deque = deque()
+        self._cond = threading.Condition()
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.throttled = 0
+        self.total_wait = 0.0
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        if self.rpm:
+            self._requests = min(float(self.rpm), self._requests + elapsed * self.rpm / 60.0)
+        if self.tpm:
+            self._tokens = min(float(self.tpm), self._tokens + elapsed * self.tpm / 60.0)
+
+    def _try_acquire(self, ticket: object, tokens: int) -> float:
+        """
+        Try to grant a slot to the ticket (caller holds the lock)
+
+        Returns:
+            0 if granted, otherwise seconds to wait before trying again
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if self._queue[0] is not ticket:
+            return 0.05
+        if self._blocked_until > now:
+            return self._blocked_until - now
+        if self.max_concurrency and self._in_flight >= self.max_concurrency:
+            return 0.05
+        wait = 0.0
+        if self.rpm and self._requests < 1:
+            wait = max(wait, (1 - self._requests) * 60.0 / self.rpm)
+        # A request larger than the whole budget waits for a full bucket rather than forever
+        needed = min(tokens, self.tpm)
+        if self.tpm and self._tokens < needed:
+            wait = max(wait, (needed - self._tokens) * 60.0 / self.tpm)
+        if wait > 0:
+            return wait
+        if self.rpm:
+            self._requests -= 1
+        if self.tpm:
+            self._tokens -= tokens
+        self._in_flight += 1
+        self._queue.popleft()
+        self.total_requests += 1
+        self.total_tokens += tokens
+        self._cond.notify_all()
+        return 0.0
+
+    def acquire(self, tokens: int = 0) -> RateSlot:
+        """
+        Block the calling thread until a slot is granted
+
+        Args:
+            tokens: Estimated tokens of the request
+
+        Returns:
+            Granted slot, to be passed to release()
+        """
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    wait = self._try_acquire(ticket, tokens)
+                    if wait == 0:
+                        break
+                    self._cond.wait(timeout=wait)
+            except BaseException:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+        self._record_wait(started)
+        return RateSlot(tokens)
+
+    async def acquire_async(self, tokens: int = 0) -> RateSlot:
+        """
+        Wait without blocking the event loop until a slot is granted
+
+        Args:
+            tokens: Estimated tokens of the request
+
+        Returns:
+            Granted slot, to be passed to release()
+        """
+        ticket = object()
+        started = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._try_acquire(ticket, tokens)
+                if wait == 0:
+                    break
+                await asyncio.sleep(min(wait, 0.05))
+        except BaseException:
+            with self._cond:
+                if ticket in self._queue:
+                    self._queue.remove(ticket)
+                self._cond.notify_all()
+            raise
+        self._record_wait(started)
+        return RateSlot(tokens)
+
+    def _record_wait(self, started: float):
+        waited = time.monotonic() - started
+        if waited > 0.01:
+            self.throttled += 1
+            self.total_wait += waited
+
+    def release(self, slot: RateSlot):
+        """
+        Release a slot and reconcile the token budget with the actual usage
+
+        Args:
+            slot: Slot returned by acquire()/acquire_async()
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if slot.tokens is not None:
+                delta = slot.tokens - slot.estimated_tokens
+                self.total_tokens += delta
+                if self.tpm:
+                    self._tokens -= delta
+            self._cond.notify_all()
+
+    def penalize(self, seconds: float):
+        """
+        Pause all requests, e.g. after the API answered 429 with Retry-After
+
+        Args:
+            seconds: Seconds to pause
+        """
+        with self._cond:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    @contextmanager
+    def limit(self, tokens: int = 0) -> Iterator[RateSlot]:
+        """
+        Context manager holding a slot for the duration of a synchronous call
+
+        Args:
+            tokens: Estimated tokens of the request
+
+        Yields:
+            Granted slot
+        """
+        slot = self.acquire(tokens)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    @asynccontextmanager
+    async def alimit(self, tokens: int = 0) -> AsyncIterator[RateSlot]:
+        """
+        Async context manager holding a slot for the duration of an async call
+
+        Args:
+            tokens: Estimated tokens of the request
+
+        Yields:
+            Granted slot
+        """
+        slot = await self.acquire_async(tokens)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get limiter statistics
+
+        Returns:
+            Limits, current usage and throttling counters
+        """
+        with self._cond:
+            self._refill(time.monotonic())
+            return {
+                "name": self.name,
+                "rpm": self.rpm,
+                "tpm": self.tpm,
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self._in_flight,
+                "queued": len(self._queue),
+                "available_requests": round(self._requests, 2) if self.rpm else None,
+                "available_tokens": round(self._tokens) if self.tpm else None,
+                "total_requests": self.total_requests,
+                "total_tokens": self.total_tokens,
+                "throttled": self.throttled,
+                "total_wait": round(self.total_wait, 3),
+            }
+
+
+_limiters: Dict[tuple, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(provider_name: str, api_key: Optional[str] = None) -> Optional[RateLimiter]:
+    """
+    Get the shared rate limiter for a provider and API key
+
+    Limits come from ``api.rate_limits.<provider>`` in config.yaml, falling back
+    to ``api.rate_limits.default``. Every key of a provider gets its own budget.
+
+    Args:
+        provider_name: Normalized provider name (e.g. "deepseek")
+        api_key: API key the requests are billed to
+
+    Returns:
+        Rate limiter, or None if no limits are configured
+    """
+    rate_limits = config.get_api_config().get("rate_limits") or {}
+    limits = rate_limits.get(provider_name) or rate_limits.get("default") or {}
+    rpm = int(limits.get("rpm") or 0)
+    tpm = int(limits.get("tpm") or 0)
+    max_concurrency = int(limits.get("max_concurrency") or 0)
+    if not (rpm or tpm or max_concurrency):
+        return None
+
+    key = (provider_name, hashlib.sha256(str(api_key or "").encode("utf-8")).hexdigest())
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = RateLimiter(rpm=rpm, tpm=tpm, max_concurrency=max_concurrency, name=provider_name)
+            _limiters[key] = limiter
+        return limiter
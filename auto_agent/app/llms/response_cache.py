@@ -0,0 +1,235 @@
+"""
+Response Cache
+Exact-match LLM response cache with an in-memory LRU tier and a SQLite tier
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from ..config import config
+from ..utils.logger import global_logger as logger
+
+
+def normalize_messages(messages: Any) -> List[Dict[str, str]]:
+    """
+    Normalize messages for hashing
+
+    Dict messages and LangChain message objects map to the same form, line
+    endings are unified and surrounding whitespace is stripped.
+
+    Args:
+        messages: Messages or prompt text
+
+    Returns:
+        List of {"role", "content"} dictionaries
+    """
+    if isinstance(messages, str):
+        messages = [{"role": "user", "content": messages}]
+    normalized = []
+    for message in messages:
+        if isinstance(message, dict):
+            role, content = message.get("role", ""), message.get("content", "")
+        else:
+            role, content = getattr(message, "type", type(message).__name__), getattr(message, "content", message)
+        if not isinstance(content, str):
+            content = json.dumps(content, sort_keys=True, ensure_ascii=False, default=str)
+        normalized.append({"role": str(role), "content": content.replace("\r\n", "\n").strip()})
+    return normalized
+
+
+def make_cache_key(model: str, messages: Any, params: Dict[str, Any]) -> str:
+    """
+    Build the cache key of a request
+
+    Args:
+        model: Model name
+        messages: Messages or prompt text
+        params: Generation parameters (temperature, max_tokens, ...)
+
+    Returns:
+        SHA-256 hex digest of the normalized request
+    """
+    payload = {
+        "model": model,
+        "messages": normalize_messages(messages),
+        "params": {k: v for k, v in params.items() if v is not None},
+    }
+    serialized = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=repr)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    Two-tier exact-match response cache
+
+    Responses are stored as the list of chunks they were produced in, so a
+    cached streamed response replays as the same stream. The memory tier is an
+    LRU of recent entries; the SQLite tier persists entries across runs. Both
+    tiers honour the TTL and their own entry limits.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        memory_max_entries: Optional[int] = None,
+        disk_path: Optional[str] = None,
+        disk_max_entries: Optional[int] = None,
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            ttl: Seconds an entry stays valid, 0 for no expiry (defaults to llm.response_cache.ttl)
+            memory_max_entries: Entries kept in memory (defaults to llm.response_cache.memory_max_entries)
+            disk_path: SQLite file, empty to disable the disk tier (defaults to llm.response_cache.disk_path)
+            disk_max_entries: Entries kept on disk (defaults to llm.response_cache.disk_max_entries)
+        """
+        cache_config = config.get("llm.response_cache", {}) or {}
+        self.ttl = ttl if ttl is not None else cache_config.get("ttl", 86400)
+        self.memory_max_entries = memory_max_entries or cache_config.get("memory_max_entries", 256)
+        self.disk_path = disk_path if disk_path is not None else cache_config.get("disk_path", "")
+        self.disk_max_entries = disk_max_entries or cache_config.get("disk_max_entries", 10000)
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Open the SQLite tier on first use (caller holds the lock)"""
+        if self._conn is None and self.disk_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.disk_path)), exist_ok=True)
+                self._conn = sqlite3.connect(self.disk_path, check_same_thread=False)
+                self._conn.execute(
+                    "CREATE TABLE IF NOT EXISTS responses ("
+                    "key TEXT PRIMARY KEY, model TEXT, chunks TEXT, created_at REAL, accessed_at REAL)"
+                )
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"Response cache disk tier disabled: {e}")
+                self.disk_path = ""
+                self._conn = None
+        return self._conn
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - created_at > self.ttl
+
+    def _remember(self, key: str, chunks: List[str], created_at: float):
+        """Put an entry into the memory tier (caller holds the lock)"""
+        self._memory[key] = (chunks, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """
+        Look up a response
+
+        Args:
+            key: Cache key from make_cache_key
+
+        Returns:
+            Response chunks, or None on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[1], now):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return list(entry[0])
+            self._memory.pop(key, None)
+
+            db = self._db()
+            if db is not None:
+                row = db.execute("SELECT chunks, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+                if row and not self._expired(row[1], now):
+                    db.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+                    db.commit()
+                    chunks = json.loads(row[0])
+                    self._remember(key, chunks, row[1])
+                    self.stats["disk_hits"] += 1
+                    return list(chunks)
+            self.stats["misses"] += 1
+            return None
+
+    def put(self, key: str, chunks: List[str], model: str = ""):
+        """
+        Store a response
+
+        Args:
+            key: Cache key from make_cache_key
+            chunks: Response chunks (a single chunk for non-streamed responses)
+            model: Model name, stored for inspection
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, list(chunks), now)
+            self.stats["stores"] += 1
+            db = self._db()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO responses (key, model, chunks, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, model, json.dumps(chunks, ensure_ascii=False), now, now),
+            )
+            if self.ttl:
+                db.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+            db.execute(
+                "DELETE FROM responses WHERE key NOT IN "
+                "(SELECT key FROM responses ORDER BY accessed_at DESC LIMIT ?)",
+                (self.disk_max_entries,),
+            )
+            db.commit()
+
+    def clear(self):
+        """Remove all entries from both tiers"""
+        with self._lock:
+            self._memory.clear()
+            db = self._db()
+            if db is not None:
+                db.execute("DELETE FROM responses")
+                db.commit()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get cache statistics
+
+        Returns:
+            Hit/miss counters and tier sizes
+        """
+        with self._lock:
+            # Do not create the SQLite file just to report on it
+            db = self._db() if self.disk_path and os.path.exists(self.disk_path) else None
+            disk_entries = db.execute("SELECT COUNT(*) FROM responses").fetchone()[0] if db is not None else 0
+            lookups = self.stats["memory_hits"] + self.stats["disk_hits"] + self.stats["misses"]
+            hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+            return {
+                **self.stats,
+                "hit_rate": round(hits / lookups, 3) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": disk_entries,
+                "ttl": self.ttl,
+            }
+
+
+def get_response_cache() -> Optional[ResponseCache]:
+    """
+    Get the shared response cache
+
+    Returns:
+        Global response cache, or None if llm.response_cache.enabled is false
+    """
+    if not config.get("llm.response_cache.enabled", False):
+        return None
+    return response_cache
+
+
+# Global response cache instance (the SQLite file is opened on first use)
+response_cache = ResponseCache()
@@ -0,0 +1,615 @@
+"""
+Routing Provider
+Latency-aware routing across several providers with failover and circuit breaking
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from ..config import config
+from ..utils.logger import global_logger as logger
+from .basic_provider import BasicProvider, ProviderBoundModel
+from .rate_limiter import estimate_tokens
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    """
+    Get the q-th percentile of a list of values
+
+    Args:
+        values: Samples
+        q: Percentile between 0 and 100
+
+    Returns:
+        Percentile value, or None if there are no samples
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(q / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    Check whether an error should fail over to another backend
+
+    Timeouts, connection errors, rate limits and 5xx responses are retryable;
+    client errors such as invalid requests are not.
+
+    Args:
+        error: Exception raised by a backend
+
+    Returns:
+        True if another backend should be tried
+    """
+    name = type(error).__name__
+    if isinstance(error, (TimeoutError, ConnectionError)) or "Timeout" in name or "Connection" in name:
+        return True
+    response = getattr(error, "response", None)
+    status = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+    return isinstance(status, int) and (status == 429 or status >= 500)
+
+
+class BackendHealth:
+    """Rolling latency / error statistics and circuit-breaker state of one backend"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, window_size: int, failure_threshold: int, recovery_timeout: float):
+        """
+        Initialize backend health
+
+        Args:
+            window_size: Number of recent calls kept for latency and error rate
+            failure_threshold: Consecutive failures that open the circuit
+            recovery_timeout: Seconds before an open circuit lets a trial call through
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.latencies: deque = deque(maxlen=window_size)
+        self.ttfts: deque = deque(maxlen=window_size)
+        self.outcomes: deque = deque(maxlen=window_size)
+        self.consecutive_failures = 0
+        self.state = self.CLOSED
+        self.opened_at = 0.0
+        self.requests = 0
+        self.failures = 0
+        self.last_error: Optional[Exception] = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        """Check whether the backend may receive a call, moving open circuits to half-open after the timeout"""
+        with self._lock:
+            if self.state == self.OPEN and time.time() - self.opened_at >= self.recovery_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN:
+                return not self._trial_in_flight
+            return self.state == self.CLOSED
+
+    @property
+    def trial_in_flight(self) -> bool:
+        """Whether the single trial call of a half-open circuit is still running"""
+        with self._lock:
+            return self.state == self.HALF_OPEN and self._trial_in_flight
+
+    def begin(self):
+        """Mark a call as started (a half-open circuit allows only one trial call)"""
+        with self._lock:
+            self.requests += 1
+            if self.state == self.HALF_OPEN:
+                self._trial_in_flight = True
+
+    def record_success(self, latency: float, ttft: Optional[float] = None):
+        """Record a successful call"""
+        with self._lock:
+            self.latencies.append(latency)
+            self.ttfts.append(latency if ttft is None else ttft)
+            self.outcomes.append(True)
+            self.consecutive_failures = 0
+            self.state = self.CLOSED
+            self._trial_in_flight = False
+
+    def record_cancelled(self):
+        """Forget a call abandoned before it finished, e.g. a hedge that lost the race"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self, error: Optional[Exception] = None):
+        """Record a failed call, opening the circuit after too many consecutive failures"""
+        with self._lock:
+            self.last_error = error
+            self.outcomes.append(False)
+            self.failures += 1
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+    @property
+    def error_rate(self) -> float:
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Get the health statistics as a dictionary"""
+        with self._lock:
+            latencies = list(self.latencies)
+            ttfts = list(self.ttfts)
+            return {
+                "state": self.state,
+                "p50_latency": percentile(latencies, 50),
+                "p95_latency": percentile(latencies, 95),
+                "p50_ttft": percentile(ttfts, 50),
+                "p95_ttft": percentile(ttfts, 95),
+                "error_rate": round(self.error_rate, 3),
+                "requests": self.requests,
+                "failures": self.failures,
+                "consecutive_failures": self.consecutive_failures,
+            }
+
+
+class RoutedBoundModel(Runnable):
+    """Tool-bound model that routes each call across the router's backends, each bound to the same tools"""
+
+    def __init__(self, router: "RoutingProvider", bound: Dict[BasicProvider, Any]):
+        """
+        Initialize the wrapper
+
+        Args:
+            router: Routing provider whose health, failover and hedging apply
+            bound: Tool-bound model of each backend
+        """
+        self.router = router
+        self.bound = bound
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        return self.router._route(lambda backend: self.bound[backend].invoke(input, config=config, **kwargs))
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Any:
+        messages, _ = ProviderBoundModel._call_args(input, None, {})
+        return await self.router._aroute(
+            lambda backend: self.bound[backend].ainvoke(input, config=config, **kwargs),
+            self.router._estimate_prompt_tokens(messages),
+        )
+
+    def stream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> Iterator[Any]:
+        yield from self.router._route_stream(lambda backend: self.bound[backend].stream(input, config=config, **kwargs))
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs) -> AsyncIterator[Any]:
+        messages, _ = ProviderBoundModel._call_args(input, None, {})
+        async for chunk in self.router._aroute_stream(
+            lambda backend: self.bound[backend].astream(input, config=config, **kwargs),
+            self.router._estimate_prompt_tokens(messages),
+        ):
+            yield chunk
+
+
+class RoutingProvider(BasicProvider):
+    """
+    Provider that routes each call to the healthiest of several backends
+
+    Backends are tried in order of health; a call that times out or fails with
+    a retryable error moves on to the next backend. Streams fail over only
+    before their first chunk.
+
+    With hedging enabled, an async call whose first chunk has not arrived
+    within the configured percentile of the backend's observed TTFT is sent
+    again to the next backend (or the same one if it is the only backend).
+    The first attempt to produce a chunk wins and the other is cancelled.
+    Synchronous calls are not hedged, since a blocked thread cannot be cancelled.
+    """
+
+    def __init__(
+        self,
+        backends: Optional[List[BasicProvider]] = None,
+        weights: Optional[List[float]] = None,
+        strategy: Optional[str] = None,
+        failure_threshold: Optional[int] = None,
+        recovery_timeout: Optional[float] = None,
+        window_size: int = 100,
+        hedge: Optional[bool] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_samples: Optional[int] = None,
+        model_name: str = "router",
+        api_key: str = "",
+        **kwargs
+    ):
+        """
+        Initialize the routing provider
+
+        Args:
+            backends: Backend providers in priority order (defaults to llm.routing.backends)
+            weights: Relative weight per backend; higher weight is preferred at equal latency
+            strategy: "latency" (healthiest first) or "priority" (configured order, skipping open circuits)
+            failure_threshold: Consecutive failures that open a backend's circuit
+            recovery_timeout: Seconds before an open circuit is retried
+            window_size: Number of recent calls used for latency percentiles and error rate
+            hedge: Whether to hedge slow async calls (defaults to llm.routing.hedge.enabled)
+            hedge_percentile: TTFT percentile after which a hedge is sent
+            hedge_min_samples: TTFT samples a backend needs before its calls are hedged
+            model_name: Name reported for the router
+            api_key: Unused, kept for ProviderFactory compatibility
+            **kwargs: Generation parameters passed to backends built from config
+        """
+        routing_config = config.get("llm.routing", {}) or {}
+        stream_mode = kwargs.pop("stream_mode", None)
+        if backends is None:
+            backends, weights = self._backends_from_config(routing_config, dict(kwargs, stream_mode=stream_mode))
+        if not backends:
+            raise ValueError("RoutingProvider requires at least one backend")
+        self.backends = backends
+        self.weights = weights or [1.0] * len(backends)
+        self.strategy = strategy or routing_config.get("strategy", "latency")
+        failure_threshold = failure_threshold or routing_config.get("failure_threshold", 3)
+        recovery_timeout = recovery_timeout or routing_config.get("recovery_timeout", 30)
+        self.health = [BackendHealth(window_size, failure_threshold, recovery_timeout) for _ in backends]
+        hedge_config = routing_config.get("hedge", {}) or {}
+        self.hedge = hedge if hedge is not None else bool(hedge_config.get("enabled", False))
+        self.hedge_percentile = hedge_percentile or hedge_config.get("percentile", 90)
+        self.hedge_min_samples = hedge_min_samples or hedge_config.get("min_samples", 20)
+        self.hedge_stats = {
+            "requests": 0,
+            "hedged": 0,
+            "hedge_wins": 0,
+            "extra_prompt_tokens": 0,
+            "extra_completion_tokens": 0,
+        }
+        if stream_mode is None:
+            stream_mode = backends[0].stream_mode
+        super().__init__(model_name=model_name, api_key=api_key, stream_mode=stream_mode, **kwargs)
+
+    @staticmethod
+    def _backends_from_config(routing_config: Dict[str, Any], kwargs: Dict[str, Any]) -> tuple:
+        """Build backends listed under llm.routing.backends"""
+        from .initializer import initialize_llm_provider
+
+        backend_kwargs = {k: v for k, v in kwargs.items() if k != "api_base" and v is not None}
+        backends, weights = [], []
+        for entry in routing_config.get("backends", []):
+            provider = initialize_llm_provider(model_name=entry["model"], **backend_kwargs)
+            if provider:
+                backends.append(provider)
+                weights.append(float(entry.get("weight", 1.0)))
+            else:
+                logger.warning(f"Routing backend {entry['model']} could not be initialized, skipping")
+        return backends, weights
+
+    def _get_chat_model(self) -> Any:
+        """Expose the primary backend's chat model (bind_tools binds every backend)"""
+        return self.backends[0].llm
+
+    def _candidates(self) -> List[int]:
+        """
+        Order backends for a new call
+
+        Returns:
+            Indexes of available backends, healthiest first; if every circuit is
+            open, the open backends in configured order as a last resort
+
+        Raises:
+            Exception: The most recent backend error when every backend is
+                half-open with its trial call still running
+        """
+        available = [i for i, health in enumerate(self.health) if health.available()]
+        if not available:
+            # A half-open backend takes a single trial call; never add a second one
+            last_resort = [i for i, health in enumerate(self.health) if not health.trial_in_flight]
+            if last_resort:
+                return last_resort
+            latest = max(self.health, key=lambda health: health.opened_at)
+            raise latest.last_error or RuntimeError("No routing backend is available")
+        if self.strategy == "priority":
+            return available
+
+        def score(i: int) -> tuple:
+            # Measured backends are ranked by p50 latency, penalized by error rate and scaled by weight;
+            # backends without samples keep their configured position after measured ones
+            p50 = percentile(list(self.health[i].latencies), 50)
+            if p50 is None:
+                return (1, i)
+            return (0, p50 * (1 + 4 * self.health[i].error_rate) / max(self.weights[i], 1e-6))
+
+        return sorted(available, key=score)
+
+    def _failover(self, index: int, error: Exception):
+        """Record a failed call so the next backend can be tried; non-retryable errors are re-raised"""
+        if not is_retryable_error(error):
+            raise error
+        self.health[index].record_failure(error)
+        logger.warning(f"Backend {self.backends[index].model_name} failed ({type(error).__name__}: {error}), failing over")
+
+    def _route(self, call: Callable[[BasicProvider], Any]) -> Any:
+        """
+        Run a call on the healthiest backend, failing over on retryable errors
+
+        A call that ends without a recorded outcome (a non-retryable error or
+        cancellation) releases its backend's half-open trial slot.
+        """
+        last_error: Optional[Exception] = None
+        for index in self._candidates():
+            self.health[index].begin()
+            started = time.time()
+            settled = False
+            try:
+                result = call(self.backends[index])
+                self.health[index].record_success(time.time() - started)
+                settled = True
+                return result
+            except Exception as e:
+                self._failover(index, e)
+                settled = True
+                last_error = e
+            finally:
+                if not settled:
+                    self.health[index].record_cancelled()
+        raise last_error
+
+    def _route_stream(self, call: Callable[[BasicProvider], Iterator[Any]]) -> Iterator[Any]:
+        """Stream from the healthiest backend, failing over only before the first chunk"""
+        last_error: Optional[Exception] = None
+        for index in self._candidates():
+            self.health[index].begin()
+            started = time.time()
+            ttft = None
+            settled = False
+            try:
+                for chunk in call(self.backends[index]):
+                    if ttft is None:
+                        ttft = time.time() - started
+                    yield chunk
+                self.health[index].record_success(time.time() - started, ttft)
+                settled = True
+                return
+            except Exception as e:
+                if ttft is not None:
+                    self.health[index].record_failure(e)
+                    settled = True
+                    raise
+                self._failover(index, e)
+                settled = True
+                last_error = e
+            finally:
+                # Also reached when the consumer closes the stream early
+                if not settled:
+                    self.health[index].record_cancelled()
+        raise last_error
+
+    async def _aroute(self, call: Callable[[BasicProvider], Any], prompt_tokens: int = 0) -> Any:
+        """Async version of _route"""
+        if self.hedge:
+            async def single(backend: BasicProvider) -> AsyncIterator[Any]:
+                yield await call(backend)
+
+            results = [result async for result in self._ahedge_stream(single, prompt_tokens)]
+            return results[0]
+        last_error: Optional[Exception] = None
+        for index in self._candidates():
+            self.health[index].begin()
+            started = time.time()
+            settled = False
+            try:
+                result = await call(self.backends[index])
+                self.health[index].record_success(time.time() - started)
+                settled = True
+                return result
+            except Exception as e:
+                self._failover(index, e)
+                settled = True
+                last_error = e
+            finally:
+                if not settled:
+                    self.health[index].record_cancelled()
+        raise last_error
+
+    async def _aroute_stream(self, call: Callable[[BasicProvider], AsyncIterator[Any]], prompt_tokens: int = 0) -> AsyncIterator[Any]:
+        """Async version of _route_stream"""
+        if self.hedge:
+            async for chunk in self._ahedge_stream(call, prompt_tokens):
+                yield chunk
+            return
+        last_error: Optional[Exception] = None
+        for index in self._candidates():
+            self.health[index].begin()
+            started = time.time()
+            ttft = None
+            settled = False
+            try:
+                async for chunk in call(self.backends[index]):
+                    if ttft is None:
+                        ttft = time.time() - started
+                    yield chunk
+                self.health[index].record_success(time.time() - started, ttft)
+                settled = True
+                return
+            except Exception as e:
+                if ttft is not None:
+                    self.health[index].record_failure(e)
+                    settled = True
+                    raise
+                self._failover(index, e)
+                settled = True
+                last_error = e
+            finally:
+                if not settled:
+                    self.health[index].record_cancelled()
+        raise last_error
+
+    def _hedge_delay(self, index: int) -> Optional[float]:
+        """Seconds to wait for a backend's first chunk before hedging, or None while it has too few samples"""
+        ttfts = list(self.health[index].ttfts)
+        if len(ttfts) < self.hedge_min_samples:
+            return None
+        return percentile(ttfts, self.hedge_percentile)
+
+    def _launch(self, index: int, call: Callable[[BasicProvider], AsyncIterator[Any]], hedge: bool) -> Dict[str, Any]:
+        """Start streaming from a backend into a queue on a separate task"""
+        self.health[index].begin()
+        queue: asyncio.Queue = asyncio.Queue()
+        attempt = {"index": index, "queue": queue, "started": time.time(), "tokens": 0, "hedge": hedge}
+
+        async def pump():
+            try:
+                async for chunk in call(self.backends[index]):
+                    attempt["tokens"] += estimate_tokens(str(getattr(chunk, "content", chunk)))
+                    await queue.put(("chunk", chunk))
+                await queue.put(("done", None))
+            except Exception as e:
+                await queue.put(("error", e))
+
+        attempt["task"] = asyncio.ensure_future(pump())
+        attempt["getter"] = asyncio.ensure_future(queue.get())
+        return attempt
+
+    def _abandon(self, attempt: Dict[str, Any]):
+        """Cancel an attempt that lost the race and count what it cost"""
+        attempt["getter"].cancel()
+        attempt["task"].cancel()
+        self.health[attempt["index"]].record_cancelled()
+        self.hedge_stats["extra_completion_tokens"] += attempt["tokens"]
+
+    async def _ahedge_stream(self, call: Callable[[BasicProvider], AsyncIterator[Any]], prompt_tokens: int) -> AsyncIterator[Any]:
+        """
+        Stream from the healthiest backend, hedging if its first chunk is late
+
+        Args:
+            call: Function starting the stream on a backend
+            prompt_tokens: Estimated prompt tokens, counted as extra cost per hedge
+
+        Yields:
+            Chunks of the winning attempt
+        """
+        self.hedge_stats["requests"] += 1
+        untried = self._candidates()
+        attempts = [self._launch(untried.pop(0), call, hedge=False)]
+        hedged = False
+        winner = None
+        last_error: Optional[Exception] = None
+        try:
+            while winner is None:
+                delay = None if hedged else self._hedge_delay(attempts[0]["index"])
+                getters = {attempt["getter"]: attempt for attempt in attempts}
+                done, _ = await asyncio.wait(getters, timeout=delay, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    target = untried.pop(0) if untried else attempts[0]["index"]
+                    attempts.append(self._launch(target, call, hedge=True))
+                    self.hedge_stats["hedged"] += 1
+                    self.hedge_stats["extra_prompt_tokens"] += prompt_tokens
+                    continue
+                for getter in done:
+                    attempt = getters[getter]
+                    kind, value = getter.result()
+                    if kind != "error":
+                        if winner is None:
+                            winner, first = attempt, (kind, value)
+                        continue
+                    last_error = value
+                    self._failover(attempt["index"], value)
+                    attempts.remove(attempt)
+                if winner is None and not attempts:
+                    if not untried:
+                        raise last_error
+                    attempts.append(self._launch(untried.pop(0), call, hedge=False))
+
+            for attempt in attempts:
+                if attempt is not winner:
+                    self._abandon(attempt)
+            attempts = [winner]
+            if winner["hedge"]:
+                self.hedge_stats["hedge_wins"] += 1
+
+            index = winner["index"]
+            ttft = time.time() - winner["started"]
+            kind, value = first
+            while kind == "chunk":
+                yield value
+                kind, value = await winner["queue"].get()
+            attempts = []
+            if kind == "error":
+                self.health[index].record_failure(value)
+                raise value
+            self.health[index].record_success(time.time() - winner["started"], ttft)
+        finally:
+            # Attempts still listed here ended without an outcome (error, cancellation or early close)
+            for attempt in attempts:
+                attempt["getter"].cancel()
+                attempt["task"].cancel()
+                self.health[attempt["index"]].record_cancelled()
+
+    def _generate(self, user_input: str, system_prompt: str, **kwargs) -> str:
+        return self._route(lambda backend: backend._generate(user_input, system_prompt, **kwargs))
+
+    def _stream(self, user_input: str, system_prompt: str, **kwargs) -> Iterator[str]:
+        return self._route_stream(lambda backend: backend._stream(user_input, system_prompt, **kwargs))
+
+    async def _agenerate(self, user_input: str, system_prompt: str, **kwargs) -> str:
+        return await self._aroute(
+            lambda backend: backend._agenerate(user_input, system_prompt, **kwargs),
+            self._estimate_prompt_tokens(system_prompt + user_input),
+        )
+
+    def _astream(self, user_input: str, system_prompt: str, **kwargs) -> AsyncIterator[str]:
+        return self._aroute_stream(
+            lambda backend: backend._astream(user_input, system_prompt, **kwargs),
+            self._estimate_prompt_tokens(system_prompt + user_input),
+        )
+
+    def invoke(self, messages, **kwargs):
+        return self._route(lambda backend: backend.invoke(messages, **kwargs))
+
+    def stream(self, messages, **kwargs):
+        return self._route_stream(lambda backend: backend.stream(messages, **kwargs))
+
+    async def ainvoke(self, messages, **kwargs):
+        return await self._aroute(lambda backend: backend.ainvoke(messages, **kwargs), self._estimate_prompt_tokens(messages))
+
+    def astream(self, messages, **kwargs):
+        return self._aroute_stream(lambda backend: backend.astream(messages, **kwargs), self._estimate_prompt_tokens(messages))
+
+    def bind_tools(self, tools, **kwargs):
+        """
+        Bind tools to every backend so tool-calling agents are routed too
+
+        Args:
+            tools: Tools to bind
+            **kwargs: Additional parameters
+
+        Returns:
+            Model with bound tools that fails over between backends
+        """
+        return RoutedBoundModel(self, {backend: backend.bind_tools(tools, **kwargs) for backend in self.backends})
+
+    def get_model_info(self) -> Dict[str, Any]:
+        """
+        Get model information, including per-backend health, circuit-breaker state and hedging metrics
+
+        Returns:
+            Model information dictionary
+        """
+        info = super().get_model_info()
+        info["routing"] = {
+            "strategy": self.strategy,
+            "backends": [
+                {"model_name": backend.model_name, "weight": weight, **health.snapshot()}
+                for backend, weight, health in zip(self.backends, self.weights, self.health)
+            ],
+            "hedging": {
+                "enabled": self.hedge,
+                "percentile": self.hedge_percentile,
+                "min_samples": self.hedge_min_samples,
+                **self.hedge_stats,
+                "hedge_rate": round(self.hedge_stats["hedged"] / self.hedge_stats["requests"], 3)
+                if self.hedge_stats["requests"] else 0.0,
+            },
+        }
+        return info
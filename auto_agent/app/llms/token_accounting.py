@@ -0,0 +1,503 @@
+"""
+Token Accounting
+Offline token counting, context-window budgeting and per call/agent/run usage records
+"""
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from ..config import config
+from ..utils.logger import global_logger as logger
+
+# Initial (latin characters per token, tokens per CJK character) per provider family,
+# refined at runtime from the prompt token counts the APIs report
+FAMILY_RATIOS = {
+    "default": (4.0, 1.0),
+    "gpt": (4.0, 1.0),
+    "claude": (3.5, 1.3),
+    "deepseek": (4.0, 0.6),
+    "qwen": (4.0, 0.7),
+    "glm": (4.0, 0.7),
+    "kimi": (4.0, 0.7),
+    "doubao": (4.0, 0.7),
+    "minipro": (4.0, 0.7),
+    "ollama": (4.0, 1.2),
+}
+
+# Model name prefixes of each provider family
+FAMILY_PREFIXES = (
+    ("gpt", ("gpt", "o1", "o3", "o4", "openai", "text-")),
+    ("claude", ("claude", "anthropic")),
+    ("deepseek", ("deepseek",)),
+    ("qwen", ("qwen", "qwq")),
+    ("glm", ("glm", "chatglm")),
+    ("kimi", ("kimi", "moonshot")),
+    ("doubao", ("doubao",)),
+    ("minipro", ("minipro", "abab", "minimax")),
+    ("ollama", ("ollama", "llama", "mistral", "gemma", "phi")),
+)
+
+# Tokens added per message for role and separators
+MESSAGE_OVERHEAD = 4
+
+# Context-window policies
+POLICIES = ("none", "trim", "summarize", "error")
+
+
+def token_family(model_name: str) -> str:
+    """
+    Get the tokenizer family of a model
+
+    Args:
+        model_name: Model name (e.g. "deepseek-chat", "claude-sonnet-4-5")
+
+    Returns:
+        Family name, "default" if unknown
+    """
+    name = (model_name or "").lower()
+    for family, prefixes in FAMILY_PREFIXES:
+        if name.startswith(prefixes):
+            return family
+    return "default"
+
+
+def message_role(message: Any) -> str:
+    """Get the role of a dict or LangChain message"""
+    if isinstance(message, dict):
+        return message.get("role", "")
+    return {"human": "user", "ai": "assistant"}.get(getattr(message, "type", ""), getattr(message, "type", ""))
+
+
+def message_content(message: Any) -> Any:
+    """Get the content of a dict or LangChain message"""
+    return message.get("content", "") if isinstance(message, dict) else getattr(message, "content", message)
+
+
+def with_content(message: Any, content: str) -> Any:
+    """Copy a dict or LangChain message with new content"""
+    if isinstance(message, dict):
+        return dict(message, content=content)
+    return message.model_copy(update={"content": content})
+
+
+def usage_from_response(response: Any) -> Optional[Dict[str, int]]:
+    """
+    Extract token usage reported by the API
+
+    Args:
+        response: Chat model response or the usage chunk of a stream
+
+    Returns:
+        Dictionary with input/output/cache_read/cache_creation tokens, or None if not reported
+    """
+    usage = getattr(response, "usage_metadata", None)
+    if not usage:
+        return None
+    details = usage.get("input_token_details") or {}
+    cache_read = details.get("cache_read")
+    if cache_read is None:
+        metadata = getattr(response, "response_metadata", None) or {}
+        cache_read = (metadata.get("token_usage") or {}).get("prompt_cache_hit_tokens")
+    return {
+        "input_tokens": usage.get("input_tokens") or 0,
+        "output_tokens": usage.get("output_tokens") or 0,
+        "cache_read": cache_read or 0,
+        "cache_creation": details.get("cache_creation") or 0,
+    }
+
+
+class TokenCounter:
+    """
+    Offline token counter for one provider family
+
+    Uses tiktoken when configured and its encoding is available locally,
+    otherwise a character-class estimator whose scale is calibrated against
+    the prompt token counts reported by the API.
+    """
+
+    def __init__(self, family: str, tokenizer: Optional[str] = None):
+        """
+        Initialize the counter
+
+        Args:
+            family: Provider family (see FAMILY_RATIOS)
+            tokenizer: "estimate" or "tiktoken" (defaults to llm.token_accounting.tokenizer)
+        """
+        self.family = family
+        self.latin_chars_per_token, self.tokens_per_cjk = FAMILY_RATIOS.get(family, FAMILY_RATIOS["default"])
+        self.scale = 1.0
+        self.samples = 0
+        self._encoding = None
+        self._lock = threading.Lock()
+        tokenizer = tokenizer or config.get("llm.token_accounting.tokenizer", "estimate")
+        if tokenizer == "tiktoken":
+            try:
+                import tiktoken
+
+                self._encoding = tiktoken.get_encoding("o200k_base" if family == "gpt" else "cl100k_base")
+            except Exception as e:
+                logger.warning(f"tiktoken unavailable for {family}, using estimates: {e}")
+
+    def count_text(self, text: Any) -> int:
+        """
+        Count the tokens of a text
+
+        Args:
+            text: Text (non-string content is serialized)
+
+        Returns:
+            Token count
+        """
+        text = text if isinstance(text, str) else str(text)
+        if not text:
+            return 0
+        if self._encoding is not None:
+            return len(self._encoding.encode(text, disallowed_special=()))
+        cjk = sum(1 for ch in text if "一" <= ch <= "鿿" or "぀" <= ch <= "ヿ" or "가" <= ch <= "힯")
+        raw = cjk * self.tokens_per_cjk + (len(text) - cjk) / self.latin_chars_per_token
+        return max(1, round(raw * self.scale))
+
+    def count_messages(self, messages: Any) -> int:
+        """
+        Count the prompt tokens of messages
+
+        Args:
+            messages: Messages or prompt text
+
+        Returns:
+            Token count including per-message overhead
+        """
+        if isinstance(messages, str):
+            return self.count_text(messages) + MESSAGE_OVERHEAD
+        return sum(self.count_text(message_content(m)) + MESSAGE_OVERHEAD for m in messages)
+
+    def calibrate(self, estimated: int, actual: int):
+        """
+        Move the estimator scale towards the ratio observed on a real request
+
+        Args:
+            estimated: Prompt tokens estimated before sending
+            actual: Prompt tokens reported by the API
+        """
+        if self._encoding is not None or estimated <= 0 or actual <= 0:
+            return
+        with self._lock:
+            ratio = min(4.0, max(0.25, actual / estimated))
+            self.scale = min(4.0, max(0.25, self.scale * (0.8 + 0.2 * ratio)))
+            self.samples += 1
+
+
+_counters: Dict[str, TokenCounter] = {}
+_counters_lock = threading.Lock()
+
+
+def get_token_counter(model_name: str) -> TokenCounter:
+    """
+    Get the shared token counter of a model's family
+
+    Args:
+        model_name: Model name
+
+    Returns:
+        Token counter
+    """
+    family = token_family(model_name)
+    with _counters_lock:
+        counter = _counters.get(family)
+        if counter is None:
+            counter = _counters[family] = TokenCounter(family)
+        return counter
+
+
+def context_window(model_name: str) -> int:
+    """
+    Get the context window of a model from llm.token_accounting.context_windows
+
+    Args:
+        model_name: Model name
+
+    Returns:
+        Context window in tokens
+    """
+    windows = config.get("llm.token_accounting.context_windows", {}) or {}
+    return int(windows.get(token_family(model_name)) or windows.get("default") or 32768)
+
+
+class ContextBudgetExceeded(ValueError):
+    """Raised by the "error" policy when a prompt does not fit the context window"""
+
+
+def _truncate_middle(message: Any, counter: TokenCounter, max_tokens: int) -> Any:
+    """Keep the head and tail of a message so that it fits in max_tokens"""
+    content = message_content(message)
+    tokens = counter.count_text(content)
+    if not isinstance(content, str) or tokens <= max_tokens:
+        return message
+    keep = max(0, int(len(content) * max_tokens / tokens) - 64)
+    marker = f"\n...[truncated {tokens - max_tokens} tokens]...\n"
+    return with_content(message, content[: keep // 2] + marker + content[len(content) - keep // 2:])
+
+
+def _summarize(dropped: List[Any], counter: TokenCounter, max_tokens: int) -> Dict[str, str]:
+    """Build an extractive summary message of dropped messages"""
+    lines = []
+    budget = max_tokens
+    for message in dropped:
+        text = str(message_content(message)).strip().replace("\n", " ")
+        line = f"- {message_role(message)}: {text[:200]}{'...' if len(text) > 200 else ''}"
+        cost = counter.count_text(line)
+        if cost > budget:
+            break
+        lines.append(line)
+        budget -= cost
+    return {"role": "system", "content": "Summary of earlier conversation (older messages omitted):\n" + "\n".join(lines)}
+
+
+def fit_messages(
+    messages: Any,
+    counter: TokenCounter,
+    budget: int,
+    policy: str = "trim",
+    fixed_tokens: int = 0,
+    summary_max_tokens: int = 512,
+) -> tuple:
+    """
+    Fit messages into a prompt token budget
+
+    Leading system messages and the last message are kept. "trim" drops the
+    oldest messages in between (with the tool results that belong to them),
+    "summarize" replaces them with an extractive summary, and if the prompt
+    still does not fit the longest remaining message is cut in the middle.
+
+    Args:
+        messages: Messages or prompt text
+        counter: Token counter of the model
+        budget: Maximum prompt tokens
+        policy: One of POLICIES
+        fixed_tokens: Tokens sent outside the messages (e.g. a system kwarg)
+        summary_max_tokens: Size limit of the summary message
+
+    Returns:
+        Tuple of (messages, trimmed)
+
+    Raises:
+        ContextBudgetExceeded: If the policy is "error" and the prompt is too large
+    """
+    budget -= fixed_tokens
+    if policy == "none" or isinstance(messages, str) or counter.count_messages(messages) <= budget:
+        return messages, False
+    tokens = counter.count_messages(messages)
+    if policy == "error":
+        raise ContextBudgetExceeded(f"Prompt of {tokens} tokens exceeds the budget of {budget} tokens")
+
+    messages = list(messages)
+    head = 0
+    while head < len(messages) - 1 and message_role(messages[head]) == "system":
+        head += 1
+    system, history, last = messages[:head], messages[head:-1], messages[-1:]
+    dropped: List[Any] = []
+    while history and counter.count_messages(system + history + last) > budget:
+        dropped.append(history.pop(0))
+        while history and message_role(history[0]) == "tool":
+            dropped.append(history.pop(0))
+    if dropped and policy == "summarize":
+        summary = _summarize(dropped, counter, summary_max_tokens)
+        if counter.count_messages(system + [summary] + history + last) <= budget:
+            system = system + [summary]
+
+    messages = system + history + last
+    overflow = counter.count_messages(messages) - budget
+    if overflow > 0:
+        index = max(range(len(messages)), key=lambda i: counter.count_text(message_content(messages[i])))
+        own = counter.count_text(message_content(messages[index]))
+        messages[index] = _truncate_middle(messages[index], counter, max(0, own - overflow))
+    logger.warning(f"Prompt of {tokens} tokens trimmed to {counter.count_messages(messages) + fixed_tokens} ({policy})")
+    return messages, True
+
+
+class CallUsage:
+    """Token usage of one provider call, filled in as the response arrives"""
+
+    def __init__(self, estimated_prompt_tokens: int, trimmed: bool = False):
+        self.estimated_prompt_tokens = estimated_prompt_tokens
+        self.trimmed = trimmed
+        self.usage: Optional[Dict[str, int]] = None
+        self.completion_text_tokens = 0
+
+    def observe(self, response: Any, counter: TokenCounter):
+        """
+        Record a response or stream chunk
+
+        Args:
+            response: Chat model response or chunk
+            counter: Token counter used when the API reports no usage
+        """
+        usage = usage_from_response(response)
+        if usage:
+            # Streams may split usage across chunks (e.g. input tokens first, output tokens last)
+            self.usage = {key: (self.usage or {}).get(key, 0) + value for key, value in usage.items()}
+        content = getattr(response, "content", None)
+        if content:
+            self.completion_text_tokens += counter.count_text(content)
+
+    @property
+    def prompt_tokens(self) -> int:
+        return self.usage["input_tokens"] if self.usage and self.usage["input_tokens"] else self.estimated_prompt_tokens
+
+    @property
+    def completion_tokens(self) -> int:
+        return self.usage["output_tokens"] if self.usage and self.usage["output_tokens"] else self.completion_text_tokens
+
+    @property
+    def cached_tokens(self) -> int:
+        return self.usage["cache_read"] if self.usage else 0
+
+
+_current_agent: ContextVar[Optional[str]] = ContextVar("token_agent", default=None)
+_current_run: ContextVar[Optional[str]] = ContextVar("token_run", default=None)
+
+
+class TokenLedger:
+    """
+    Process-wide record of token usage per call, agent and run
+
+    The agent and run a call is attributed to come from the enclosing
+    ``scope()``; calls outside any scope are recorded under None.
+    """
+
+    TOTAL_KEYS = ("calls", "prompt_tokens", "completion_tokens", "cached_tokens", "estimated_prompt_tokens", "trimmed_calls")
+
+    def __init__(self, max_records: int = 1000):
+        """
+        Initialize the ledger
+
+        Args:
+            max_records: Number of recent call records kept
+        """
+        self.records: deque = deque(maxlen=max_records)
+        self._totals: Dict[str, Dict[Any, Dict[str, int]]] = {"model": {}, "agent": {}, "run": {}}
+        self._run_agents: Dict[Any, Dict[Any, Dict[str, int]]] = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def scope(self, agent: Optional[str] = None, run: Optional[str] = None) -> Iterator[None]:
+        """
+        Attribute calls made inside the block to an agent and/or run
+
+        Args:
+            agent: Agent name
+            run: Run ID
+        """
+        tokens = []
+        if agent is not None:
+            tokens.append((_current_agent, _current_agent.set(agent)))
+        if run is not None:
+            tokens.append((_current_run, _current_run.set(run)))
+        try:
+            yield
+        finally:
+            for var, token in reversed(tokens):
+                var.reset(token)
+
+    @classmethod
+    def _add(cls, totals: Dict[str, int], record: Dict[str, Any]):
+        for key in cls.TOTAL_KEYS:
+            totals[key] = totals.get(key, 0) + record.get(key, 0)
+
+    def record(self, model: str, call: CallUsage) -> Dict[str, Any]:
+        """
+        Record a finished call
+
+        Args:
+            model: Model name
+            call: Usage of the call
+
+        Returns:
+            The call record
+        """
+        record = {
+            "time": time.time(),
+            "model": model,
+            "agent": _current_agent.get(),
+            "run": _current_run.get(),
+            "calls": 1,
+            "prompt_tokens": call.prompt_tokens,
+            "completion_tokens": call.completion_tokens,
+            "cached_tokens": call.cached_tokens,
+            "estimated_prompt_tokens": call.estimated_prompt_tokens,
+            "trimmed_calls": int(call.trimmed),
+        }
+        with self._lock:
+            self.records.append(record)
+            for dimension in ("model", "agent", "run"):
+                self._add(self._totals[dimension].setdefault(record[dimension], {}), record)
+            self._add(self._run_agents.setdefault(record["run"], {}).setdefault(record["agent"], {}), record)
+        return record
+
+    def totals(self, by: str = "model") -> Dict[Any, Dict[str, int]]:
+        """
+        Get accumulated usage
+
+        Args:
+            by: "model", "agent" or "run"
+
+        Returns:
+            Totals keyed by model name, agent name or run ID
+        """
+        with self._lock:
+            return {key: dict(value) for key, value in self._totals[by].items()}
+
+    def report(self, run: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Build a usage report for one run
+
+        Args:
+            run: Run ID (defaults to the current run scope)
+
+        Returns:
+            Run totals and per-agent breakdown
+        """
+        run = run if run is not None else _current_run.get()
+        with self._lock:
+            totals = dict(self._totals["run"].get(run, {}))
+            agents = {agent: dict(value) for agent, value in self._run_agents.get(run, {}).items()}
+        return {"run": run, **{key: totals.get(key, 0) for key in self.TOTAL_KEYS}, "agents": agents}
+
+    def format_report(self, run: Optional[str] = None) -> str:
+        """
+        Format a run report for logs
+
+        Args:
+            run: Run ID (defaults to the current run scope)
+
+        Returns:
+            Multi-line report text
+        """
+        report = self.report(run)
+        lines = [
+            f"Token usage for run {report['run']}: {report['calls']} calls, "
+            f"{report['prompt_tokens']} prompt / {report['completion_tokens']} completion / "
+            f"{report['cached_tokens']} cached tokens, {report['trimmed_calls']} trimmed"
+        ]
+        for agent, totals in report["agents"].items():
+            lines.append(
+                f"  {agent}: {totals['calls']} calls, {totals['prompt_tokens']} prompt / "
+                f"{totals['completion_tokens']} completion / {totals['cached_tokens']} cached"
+            )
+        return "\n".join(lines)
+
+    def reset(self):
+        """Forget all records"""
+        with self._lock:
+            self.records.clear()
+            for totals in self._totals.values():
+                totals.clear()
+            self._run_agents.clear()
+
+
+# Global token ledger instance
+token_ledger = TokenLedger()
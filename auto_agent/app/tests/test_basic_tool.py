@@ -1,6 +1,7 @@
 import os
 import sys
 import tempfile
+import time
 import unittest
 from unittest.mock import MagicMock, patch
 
@@ -10,7 +11,7 @@ sys.path.append(
 )
 
 # Import the actual functions instead of the decorated tools
-from app.agents.tools.basic_tool import BasicTool
+from app.agents.tools.basic_tool import BasicTool, _read_text
 from app.agents.tools.basic_tool import delete_directory as _delete_directory
 from app.agents.tools.basic_tool import delete_file as _delete_file
 from app.agents.tools.basic_tool import edit_file as _edit_file
@@ -22,6 +23,9 @@ from app.agents.tools.basic_tool import list_files as _list_files
 from app.agents.tools.basic_tool import read_file as _read_file
 from app.agents.tools.basic_tool import web_search as _web_search
 from app.agents.tools.basic_tool import write_file as _write_file
+from app.utils.line_index import LineIndex, LineIndexCache, line_index_cache
+from app.utils.python_worker_pool import PythonWorkerPool
+from app.utils.subprocess_engine import SubprocessEngine
 
 
 class TestBasicTool(unittest.TestCase):
@@ -112,6 +116,39 @@ class TestBasicTool(unittest.TestCase):
         result = asyncio.run(_read_file("non_existent_file_12345.txt"))
         self.assertIn("Error reading file", result)
 
+    def test_read_file_ranges(self):
+        """Test read_file line and byte ranges, head and tail"""
+        import asyncio
+
+        log_file = os.path.join(self.temp_dir, "ranges.log")
+        with open(log_file, "w", encoding="utf-8") as f:
+            f.write("".join(f"line {i}\n" for i in range(10)) + "last")
+
+        def read(**kwargs):
+            return asyncio.run(_read_file(log_file, **kwargs))
+
+        self.assertEqual(read(offset=2, limit=2), "line 2\nline 3\n[lines 3-4 of 11]")
+        self.assertEqual(read(mode="head", limit=1), "line 0\n[lines 1-1 of 11]")
+        self.assertEqual(read(mode="tail", limit=2), "line 9\nlast\n[lines 10-11 of 11]")
+        self.assertEqual(read(unit="byte", offset=5, limit=6), "0\nline\n[bytes 5-10 of 74]")
+        self.assertEqual(read(unit="byte", mode="tail", limit=4), "last\n[bytes 70-73 of 74]")
+        self.assertEqual(read(offset=20), "[offset 20 is past the end: 11 lines]")
+        self.assertIn("Error reading file: offset must be >= 0", read(offset=-1))
+        self.assertIn("Error reading file: unit must be", read(unit="page"))
+
+    def test_read_file_caps_output(self):
+        """Test read_file without a range stops at max_bytes on a line boundary"""
+        import asyncio
+
+        log_file = os.path.join(self.temp_dir, "capped.log")
+        with open(log_file, "w", encoding="utf-8") as f:
+            f.write(("x" * 99 + "\n") * 5000)
+
+        with patch("app.agents.tools.basic_tool.config.get", return_value={"max_bytes": 1000}):
+            result = asyncio.run(_read_file(log_file))
+        self.assertTrue(result.startswith(("x" * 99 + "\n") * 10))
+        self.assertTrue(result.endswith("[lines 1-10 of 5000; output capped at 1000 bytes, continue with offset=10]"))
+
     def test_write_file(self):
         """Test write_file tool"""
         import asyncio
@@ -208,35 +245,29 @@ class TestBasicTool(unittest.TestCase):
         result = asyncio.run(_web_search("test query"))
         self.assertIn("No results found", result)
 
-    @patch("app.agents.tools.basic_tool.subprocess.run")
-    def test_execute_command(self, mock_run):
+    def test_execute_command(self):
         """Test execute_command tool"""
         import asyncio
 
-        # Set up mock response
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        mock_result.stdout = "Command output"
-        mock_result.stderr = ""
-        mock_run.return_value = mock_result
-
-        result = asyncio.run(_execute_command("echo 'test'"))
+        result = asyncio.run(_execute_command("echo 'Command output'"))
         self.assertIn("Exit code: 0", result)
         self.assertIn("Command output", result)
 
-    @patch("app.agents.tools.basic_tool.subprocess.run")
-    def test_execute_python(self, mock_run):
-        """Test execute_python tool"""
+    def test_execute_command_timeout(self):
+        """Test execute_command kills a command that exceeds its timeout"""
         import asyncio
+        import time
 
-        # Set up mock response
-        mock_result = MagicMock()
-        mock_result.returncode = 0
-        mock_result.stdout = "Python output"
-        mock_result.stderr = ""
-        mock_run.return_value = mock_result
+        start = time.monotonic()
+        result = asyncio.run(_execute_command("python3 -c 'import time; time.sleep(10)'", timeout=0.5))
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertIn("Timed out after 0.5s", result)
+
+    def test_execute_python(self):
+        """Test execute_python tool"""
+        import asyncio
 
-        result = asyncio.run(_execute_python("print('test')"))
+        result = asyncio.run(_execute_python("print('Python output')"))
         self.assertIn("Exit code: 0", result)
         self.assertIn("Python output", result)
 
@@ -306,5 +337,406 @@ class TestBasicTool(unittest.TestCase):
             self.assertIn(expected_tool, tool_names)
 
 
+@unittest.skipUnless(os.name == "posix", "process groups are POSIX-only")
+class TestSubprocessEngine(unittest.TestCase):
+    """Test the asyncio subprocess engine behind the command tools"""
+
+    @staticmethod
+    def _alive(pid):
+        """Check whether a process exists and is not a zombie"""
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                return f.read().split(")")[-1].split()[0] != "Z"
+        except (FileNotFoundError, ProcessLookupError):
+            return False
+
+    def test_streams_output_and_caps_size(self):
+        """Test output is streamed to the callback as it arrives and truncated at the cap"""
+        import asyncio
+
+        chunks = []
+        engine = SubprocessEngine(max_output_bytes=64)
+        script = "import sys, time; print('first', flush=True); time.sleep(0.3); print('x' * 200); print('oops', file=sys.stderr)"
+        result = asyncio.run(
+            engine.run(["python3", "-c", script], on_output=lambda stream, text: chunks.append((time.monotonic(), stream, text)))
+        )
+        finished = time.monotonic()
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(chunks[0][1:], ("stdout", "first"[: len(chunks[0][2])]))
+        self.assertLess(chunks[0][0], finished - 0.2)
+        self.assertEqual(len(result.stdout.encode()) + len(result.stderr.encode()), 64)
+        self.assertEqual(result.truncated_bytes, 6 + 201 + 5 - 64)
+        self.assertIn("[Output truncated", result.format())
+
+    def test_timeout_kills_process_group(self):
+        """Test a timeout kills background children of the command too"""
+        import asyncio
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pid_file = os.path.join(temp_dir, "child.pid")
+            engine = SubprocessEngine()
+            result = asyncio.run(engine.run(f"sleep 30 & echo $! > {pid_file}; wait", timeout=0.5))
+            with open(pid_file) as f:
+                child = int(f.read())
+        self.assertTrue(result.timed_out)
+        time.sleep(0.1)
+        self.assertFalse(self._alive(child))
+
+    def test_cancellation_kills_process_group(self):
+        """Test cancelling the awaiting task kills the process group"""
+        import asyncio
+
+        with tempfile.TemporaryDirectory() as temp_dir:
+            pid_file = os.path.join(temp_dir, "child.pid")
+
+            async def cancel_run():
+                task = asyncio.ensure_future(SubprocessEngine().run(f"sleep 30 & echo $! > {pid_file}; wait"))
+                await asyncio.sleep(0.5)
+                task.cancel()
+                with self.assertRaises(asyncio.CancelledError):
+                    await task
+
+            asyncio.run(cancel_run())
+            with open(pid_file) as f:
+                child = int(f.read())
+        time.sleep(0.1)
+        self.assertFalse(self._alive(child))
+
+    def test_parallel_process_cap(self):
+        """Test no more than max_parallel processes run at once"""
+        import asyncio
+
+        engine = SubprocessEngine(max_parallel=2)
+
+        async def run_all():
+            return await asyncio.gather(*[engine.run(["python3", "-c", "import time; time.sleep(0.3)"]) for _ in range(4)])
+
+        start = time.monotonic()
+        results = asyncio.run(run_all())
+        self.assertGreaterEqual(time.monotonic() - start, 0.6)
+        self.assertTrue(all(r.returncode == 0 for r in results))
+        self.assertEqual(engine.get_stats()["started"], 4)
+
+
+class TestPythonWorkerPool(unittest.TestCase):
+    """Test the warm Python worker pool behind execute_python"""
+
+    def setUp(self):
+        """Create a one-worker pool"""
+        self.pool = PythonWorkerPool(size=1, preload=["json as j"], max_calls=10, memory_limit_mb=0)
+
+    def tearDown(self):
+        """Stop the pool's workers"""
+        self.pool.shutdown()
+
+    def _pid(self):
+        return int(self.pool.run("import os; print(os.getpid())").stdout)
+
+    def test_warm_worker_runs_snippets_in_fresh_namespaces(self):
+        """Test preloaded modules, per-call namespaces and warm-call latency"""
+        self.assertEqual(self.pool.run("print(j.dumps([1]))").stdout, "[1]\n")
+        self.pool.run("leaked = 1")
+        self.assertEqual(self.pool.run("print('leaked' in globals())").stdout, "False\n")
+
+        start = time.monotonic()
+        result = self.pool.run("print(sum(range(10)))")
+        self.assertLess(time.monotonic() - start, 0.05)
+        self.assertEqual((result.returncode, result.stdout), (0, "45\n"))
+
+        result = self.pool.run("1 / 0")
+        self.assertEqual(result.returncode, 1)
+        self.assertIn("ZeroDivisionError", result.stderr)
+
+    def test_worker_recycled_after_max_calls(self):
+        """Test a worker is replaced once it has run max_calls snippets"""
+        self.pool.max_calls = 3
+        pids = [self._pid() for _ in range(4)]
+        self.assertEqual(len(set(pids[:3])), 1)
+        self.assertNotEqual(pids[3], pids[0])
+        self.assertEqual(self.pool.get_stats()["recycled"], 1)
+
+    def test_timeout_and_crash_replace_worker(self):
+        """Test a hung or crashed worker is killed and the next call gets a new one"""
+        first = self._pid()
+        result = self.pool.run("while True: pass", timeout=0.5)
+        self.assertTrue(result.timed_out)
+        second = self._pid()
+        self.assertNotEqual(second, first)
+
+        result = self.pool.run("import os; os._exit(3)")
+        self.assertIn("exited unexpectedly", result.stderr)
+        self.assertNotEqual(self._pid(), second)
+        stats = self.pool.get_stats()
+        self.assertEqual((stats["timed_out"], stats["crashed"]), (1, 1))
+
+    def test_cancelled_call_kills_worker(self):
+        """Test cancelling arun kills the running snippet and replaces its worker"""
+        import asyncio
+
+        first = self._pid()
+
+        async def cancel():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(self.pool.arun("import time; time.sleep(30)"), 0.3)
+
+        start = time.monotonic()
+        asyncio.run(cancel())
+        self.assertNotEqual(self._pid(), first)
+        self.assertLess(time.monotonic() - start, 5)
+        self.assertEqual(self.pool.get_stats()["cancelled"], 1)
+
+    def test_imports_resolve_from_working_directory_and_pythonpath(self):
+        """Test snippets import workspace modules like python -c, and see edits to them"""
+        temp_dir = tempfile.mkdtemp()
+        lib_dir = os.path.join(temp_dir, "lib")
+        os.mkdir(lib_dir)
+        with open(os.path.join(temp_dir, "workmod.py"), "w", encoding="utf-8") as f:
+            f.write("VALUE = 1\n")
+        with open(os.path.join(lib_dir, "libmod.py"), "w", encoding="utf-8") as f:
+            f.write("NAME = 'lib'\n")
+        snippet = f"import os; os.chdir({temp_dir!r}); import workmod, libmod; print(workmod.VALUE, libmod.NAME)"
+        pool = PythonWorkerPool(size=1, preload=[], memory_limit_mb=0)
+        with patch.dict(os.environ, {"PYTHONPATH": lib_dir}):
+            pool.warm()
+        try:
+            self.assertEqual(pool.run(snippet).stdout, "1 lib\n")
+            with open(os.path.join(temp_dir, "workmod.py"), "w", encoding="utf-8") as f:
+                f.write("VALUE = 2\n")
+            self.assertEqual(pool.run(snippet).stdout, "2 lib\n")
+        finally:
+            pool.shutdown()
+            import shutil
+
+            shutil.rmtree(temp_dir)
+
+    def test_output_is_streamed(self):
+        """Test arun forwards output lines to the callback as the snippet writes them"""
+        import asyncio
+
+        chunks = []
+
+        async def run():
+            return await self.pool.arun(
+                "import sys, time\nprint('a')\ntime.sleep(0.2)\nprint('b', file=sys.stderr)",
+                on_output=lambda stream, text: chunks.append((stream, text, time.monotonic())),
+            )
+
+        result = asyncio.run(run())
+        self.assertEqual([(stream, text) for stream, text, _ in chunks], [("stdout", "a\n"), ("stderr", "b\n")])
+        self.assertGreaterEqual(chunks[1][2] - chunks[0][2], 0.15)
+        self.assertEqual((result.stdout, result.stderr), ("a\n", "b\n"))
+
+    def _python_c(self, code):
+        import subprocess
+
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, timeout=30)
+        return result.stdout, result.stderr
+
+    def _pooled(self, code):
+        result = self.pool.run(code)
+        return result.stdout, result.stderr
+
+    @unittest.skipUnless(os.name == "posix", "uses echo from the shell")
+    def test_child_process_output_is_captured(self):
+        """Test output written to file descriptors 1 and 2 by child processes is returned like python -c"""
+        snippet = "import os, subprocess\nos.system('echo x')\nsubprocess.run(['echo', 'y'])\nos.system('echo e >&2')"
+        self.assertEqual(self._pooled(snippet), ("x\ny\n", "e\n"))
+        self.assertEqual(self._pooled(snippet), self._python_c(snippet))
+
+    def test_process_state_does_not_leak_between_snippets(self):
+        """Test os.environ, sys.path and root logging changes are undone after each snippet"""
+        self.pool.run("import os, sys; os.environ['POOL_LEAK'] = '1'; os.environ.pop('PATH', None); sys.path.insert(0, '/leak')")
+        snippet = "import os, sys; print(os.environ.get('POOL_LEAK'), 'PATH' in os.environ, '/leak' in sys.path)"
+        self.assertEqual(self._pooled(snippet), self._python_c(snippet))
+
+        snippet = "import logging; logging.basicConfig(level=logging.INFO); logging.info('hello')"
+        self.assertEqual(self._pooled(snippet), ("", "INFO:root:hello\n"))
+        self.assertEqual(self._pooled(snippet), self._python_c(snippet))
+
+    def test_patched_json_does_not_break_protocol(self):
+        """Test a snippet replacing json functions still gets its reply and the worker stays usable"""
+        pid = self._pid()
+        snippet = "import json; json.dumps = json.loads = None; print('patched')"
+        self.assertEqual(self._pooled(snippet), self._python_c(snippet))
+        self.assertEqual(self._pid(), pid)
+        self.assertEqual(self.pool.get_stats()["crashed"], 0)
+
+    def test_unreadable_reply_is_a_crash(self):
+        """Test a reply line that is not a JSON object ends the call as a crashed worker"""
+        import io
+
+        from app.utils.python_worker_pool import PythonWorker
+
+        worker = PythonWorker.__new__(PythonWorker)
+        worker.process = MagicMock()
+        worker.process.stdout = io.StringIO("not json\n")
+        self.assertIsNone(worker._read_reply(1))
+        worker.process.stdout = io.StringIO("[1]\n")
+        self.assertIsNone(worker._read_reply(1))
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "RLIMIT_AS is enforced on Linux")
+    def test_memory_limit(self):
+        """Test a snippet exceeding the memory limit fails and its worker is replaced"""
+        pool = PythonWorkerPool(size=1, preload=[], memory_limit_mb=256)
+        try:
+            result = pool.run("data = bytearray(512 * 1024 * 1024)")
+            self.assertEqual(result.returncode, 1)
+            self.assertIn("MemoryError", result.stderr)
+            self.assertEqual(pool.run("print('ok')").stdout, "ok\n")
+        finally:
+            pool.shutdown()
+
+
+class TestLineIndex(unittest.TestCase):
+    """Test the mmap-backed line-offset index used by read_file"""
+
+    def setUp(self):
+        """Create a log file above the mmap threshold"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.temp_dir, "big.log")
+        with open(self.log_file, "w", encoding="utf-8") as f:
+            f.write("".join(f"entry {i:07d}\n" for i in range(200000)))
+
+    def tearDown(self):
+        """Clean up test fixtures"""
+        import shutil
+
+        shutil.rmtree(self.temp_dir)
+
+    def test_offsets_across_chunks_and_long_lines(self):
+        """Test every line offset matches a plain split, with chunks smaller than some lines"""
+        import mmap
+
+        class SmallChunkIndex(LineIndex):
+            STRIDE = 4
+            CHUNK_SIZE = 16
+
+        data = b"a\n" + b"b" * 40 + b"\n\nccc\r\n" + b"d\n" * 20 + b"tail"
+        path = os.path.join(self.temp_dir, "mixed.txt")
+        with open(path, "wb") as f:
+            f.write(data)
+        expected = [0] + [i + 1 for i, byte in enumerate(data) if byte == ord("\n")]
+
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            index = SmallChunkIndex(mm, 0, len(data))
+            self.assertEqual(index.line_count, len(expected))
+            self.assertEqual([index.offset(mm, n) for n in range(index.line_count + 1)], expected + [len(data)])
+
+    def test_read_file_random_access_uses_cached_index(self):
+        """Test line ranges of a large file scan it once, then reuse the index"""
+        import asyncio
+
+        builds = line_index_cache.stats["builds"]
+        self.assertEqual(
+            asyncio.run(_read_file(self.log_file, offset=150000, limit=2)),
+            "entry 0150000\nentry 0150001\n[lines 150001-150002 of 200000]",
+        )
+        start = time.monotonic()
+        self.assertEqual(
+            asyncio.run(_read_file(self.log_file, mode="tail", limit=1)),
+            "entry 0199999\n[lines 200000-200000 of 200000]",
+        )
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEqual(line_index_cache.stats["builds"], builds + 1)
+
+    def test_index_invalidated_when_file_changes(self):
+        """Test a changed mtime rebuilds the index even when the size is unchanged"""
+        cache = LineIndexCache(max_entries=2)
+        self.assertEqual(cache.line_range(self.log_file, 5, 1)[0], b"entry 0000005\n")
+        self.assertEqual(cache.line_range(self.log_file, 6, 1)[0], b"entry 0000006\n")
+        self.assertEqual(cache.stats, {"hits": 1, "builds": 1})
+
+        stat = os.stat(self.log_file)
+        with open(self.log_file, "r+b") as f:
+            f.write(b"first line\n")
+        os.utime(self.log_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+        raw, first, end, total = cache.line_range(self.log_file, 1, 2)
+        self.assertEqual(raw, b"00\nentry 0000001\n")
+        self.assertEqual((first, end, total), (1, 3, 200001))
+        self.assertEqual(cache.stats["builds"], 2)
+
+    def test_head_read_skips_index(self):
+        """Test reads from the first line scan forward without indexing the file"""
+        import asyncio
+
+        builds = line_index_cache.stats["builds"]
+        self.assertEqual(
+            asyncio.run(_read_file(self.log_file, limit=2)),
+            "entry 0000000\nentry 0000001\n[lines 1-2, more follow]",
+        )
+        self.assertEqual(line_index_cache.stats["builds"], builds)
+
+        cache = LineIndexCache()
+        self.assertEqual(cache.line_range(self.log_file, 0, None, max_bytes=20), (b"entry 0000000\nentry 0", 0, 1, None))
+        self.assertEqual(cache.stats["builds"], 0)
+
+    def test_line_range_copies_at_most_max_bytes(self):
+        """Test an indexed range larger than the cap is cut before copying"""
+        cache = LineIndexCache()
+        raw, first, end, total = cache.line_range(self.log_file, 10, None, max_bytes=100)
+        self.assertEqual(len(raw), 101)
+        self.assertTrue(raw.startswith(b"entry 0000010\n"))
+        self.assertEqual((first, end, total), (10, 200000, 200000))
+
+
+class TestToolLoopLag(unittest.TestCase):
+    """Benchmark event-loop lag while agents call file tools concurrently"""
+
+    CONCURRENT_CALLS = 10
+
+    def setUp(self):
+        """Create a large workspace file"""
+        self.temp_dir = tempfile.mkdtemp()
+        self.big_file = os.path.join(self.temp_dir, "big.txt")
+        with open(self.big_file, "w", encoding="utf-8") as f:
+            f.write("workspace line with some text\n" * 300000)
+
+    def tearDown(self):
+        """Clean up test fixtures"""
+        import shutil
+
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    @staticmethod
+    async def _max_loop_lag(calls):
+        """Run calls concurrently and return the worst delay seen by a 1 ms heartbeat"""
+        import asyncio
+        import time
+
+        lags = []
+        done = asyncio.Event()
+
+        async def heartbeat():
+            while not done.is_set():
+                start = time.perf_counter()
+                await asyncio.sleep(0.001)
+                lags.append(time.perf_counter() - start - 0.001)
+
+        beat = asyncio.create_task(heartbeat())
+        await asyncio.sleep(0.01)
+        results = await asyncio.gather(*calls)
+        done.set()
+        await beat
+        return max(lags), results
+
+    def test_concurrent_reads_do_not_block_loop(self):
+        """Test file tools keep the event loop responsive compared to inline blocking reads"""
+        import asyncio
+
+        async def inline_read(file_path):
+            # The previous implementation: blocking open() on the event loop
+            return _read_text(file_path)
+
+        before, _ = asyncio.run(self._max_loop_lag([inline_read(self.big_file) for _ in range(self.CONCURRENT_CALLS)]))
+        after, results = asyncio.run(self._max_loop_lag([_read_file(self.big_file) for _ in range(self.CONCURRENT_CALLS)]))
+        print(
+            f"\n{self.CONCURRENT_CALLS} concurrent read_file calls, max loop lag: "
+            f"{before * 1000:.1f} ms inline, {after * 1000:.1f} ms on the I/O executor"
+        )
+        self.assertTrue(all(len(r) == len(results[0]) for r in results))
+        self.assertLess(after, before)
+
+
 if __name__ == "__main__":
     unittest.main()
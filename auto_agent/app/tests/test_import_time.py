@@ -0,0 +1,52 @@
+import os
+import subprocess
+import sys
+import unittest
+
+# Project root, where "app" is importable from
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Seconds a cold "from app.main import main" may take (override with AUTO_AGENT_IMPORT_BUDGET)
+IMPORT_BUDGET = float(os.environ.get("AUTO_AGENT_IMPORT_BUDGET", "2.5"))
+
+# Packages that must only be imported once an agent or provider of that kind is created
+HEAVY_PACKAGES = ("deepagents", "langchain_anthropic", "langchain_openai", "langchain_ollama", "anthropic", "openai")
+
+PROBE = """
+import sys, time
+started = time.perf_counter()
+from app.main import main
+elapsed = time.perf_counter() - started
+heavy = sorted({name.split(".")[0] for name in sys.modules} & set(sys.argv[1:]))
+print(f"{elapsed}|{','.join(heavy)}")
+"""
+
+
+class TestImportTime(unittest.TestCase):
+    """Test application startup import cost"""
+
+    def _cold_import(self):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE, *HEAVY_PACKAGES],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=120,
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        elapsed, heavy = result.stdout.strip().splitlines()[-1].split("|")
+        return float(elapsed), [name for name in heavy.split(",") if name]
+
+    def test_main_import_within_budget(self):
+        """Test a cold import of app.main stays under the startup budget"""
+        elapsed, _ = self._cold_import()
+        self.assertLess(elapsed, IMPORT_BUDGET, f"from app.main import main took {elapsed:.2f}s (budget {IMPORT_BUDGET}s)")
+
+    def test_main_import_skips_provider_packages(self):
+        """Test importing app.main does not load LLM integration packages"""
+        _, heavy = self._cold_import()
+        self.assertEqual(heavy, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
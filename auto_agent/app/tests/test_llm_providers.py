@@ -1,7 +1,13 @@
+import asyncio
+import json
 import os
 import sys
+import tempfile
+import threading
+import time
 import unittest
-from unittest.mock import MagicMock, patch
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import AsyncMock, MagicMock, patch
 
 # Add the project root to Python path
 sys.path.append(
@@ -9,6 +15,13 @@ sys.path.append(
 )
 
 from app.llms.basic_provider import BasicProvider
+from app.llms.batch_client import BatchResult
+from app.llms.http_pool import HTTPClientPool
+from app.llms.provider_factory import ProviderFactory
+from app.llms.rate_limiter import RateLimiter, parse_retry_after
+from app.llms.response_cache import ResponseCache, make_cache_key
+from app.llms.routing_provider import RoutingProvider
+from app.llms.token_accounting import ContextBudgetExceeded, TokenCounter, fit_messages, token_family, token_ledger
 
 # Try to import all providers
 try:
@@ -165,6 +178,952 @@ class TestBasicProvider(unittest.TestCase):
         self.assertEqual(info["kwargs"]["param1"], "value1")
 
 
+class FakeChunk:
+    """Minimal LangChain-style message chunk"""
+
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeAsyncChatModel:
+    """Chat model exposing native async methods that sleep instead of calling an API"""
+
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = []
+
+    async def ainvoke(self, messages, **kwargs):
+        self.calls.append(messages)
+        await asyncio.sleep(self.delay)
+        return FakeChunk(f"echo: {messages[-1]['content'] if isinstance(messages, list) else messages}")
+
+    async def astream(self, messages, **kwargs):
+        self.calls.append(messages)
+        for part in ["Hello", "", " world"]:
+            await asyncio.sleep(0)
+            yield FakeChunk(part)
+
+
+class AsyncTestProvider(BasicProvider):
+    """Concrete provider backed by FakeAsyncChatModel"""
+
+    def _get_chat_model(self):
+        return FakeAsyncChatModel()
+
+
+class TestBasicProviderAsync(unittest.TestCase):
+    """Test native async generate/stream path"""
+
+    def test_agenerate_uses_ainvoke(self):
+        """Test agenerate awaits the chat model's ainvoke"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key")
+
+        result = asyncio.run(provider.agenerate("Hi", "You are a helpful assistant"))
+
+        self.assertEqual(result, "echo: Hi")
+        self.assertEqual(provider.llm.calls[0][0], {"role": "system", "content": "You are a helpful assistant"})
+
+    def test_achat_streams_chunks(self):
+        """Test achat yields non-empty chunks in stream mode"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key", stream_mode=True)
+
+        async def collect():
+            return [chunk async for chunk in provider.achat("Hi")]
+
+        self.assertEqual(asyncio.run(collect()), ["Hello", " world"])
+
+    def test_concurrent_calls_share_event_loop(self):
+        """Test many concurrent calls overlap on one event loop"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key")
+
+        async def run_all():
+            return await asyncio.gather(*(provider.agenerate(f"q{i}") for i in range(200)))
+
+        started = time.time()
+        results = asyncio.run(run_all())
+        self.assertEqual(len(results), 200)
+        self.assertLess(time.time() - started, 2.0)
+
+    def test_llm_service_uses_async_provider(self):
+        """Test LLMServiceImpl generate/stream go through the async provider API"""
+        from app.core.services.llm_service import LLMServiceImpl
+
+        service = LLMServiceImpl()
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key")
+
+        async def run():
+            text = await service.generate(provider, "Hi")
+            chunks = [chunk async for chunk in service.stream(provider, "Hi")]
+            return text, chunks
+
+        text, chunks = asyncio.run(run())
+        self.assertEqual(text, "echo: Hi")
+        self.assertEqual(chunks, ["Hello", " world"])
+
+
+class FakeRateLimitError(Exception):
+    """429 error carrying a Retry-After header like openai.RateLimitError"""
+
+    def __init__(self, retry_after="0.2"):
+        super().__init__("rate limited")
+        self.status_code = 429
+        self.response = MagicMock(headers={"retry-after": retry_after})
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test token-bucket rate limiting"""
+
+    def test_tpm_budget_delays_requests(self):
+        """Test a request waits for the token bucket to refill"""
+        limiter = RateLimiter(tpm=600)
+        limiter.release(limiter.acquire(600))
+
+        started = time.time()
+        limiter.release(limiter.acquire(5))
+        self.assertGreaterEqual(time.time() - started, 0.4)
+        self.assertEqual(limiter.get_stats()["throttled"], 1)
+
+    def test_concurrency_cap(self):
+        """Test at most max_concurrency requests run at once"""
+        limiter = RateLimiter(max_concurrency=2)
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def worker():
+            with limiter.limit():
+                with lock:
+                    active.append(1)
+                    peak.append(len(active))
+                time.sleep(0.05)
+                with lock:
+                    active.pop()
+
+        threads = [threading.Thread(target=worker) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(max(peak), 2)
+
+    def test_async_waiters_are_served_in_order(self):
+        """Test waiters are granted slots first-come first-served"""
+        limiter = RateLimiter(rpm=60)
+        limiter._requests = 0
+        limiter.rpm = 1200  # refill one request every 50ms
+        order = []
+
+        async def request(i):
+            async with limiter.alimit():
+                order.append(i)
+
+        async def run():
+            tasks = []
+            for i in range(4):
+                tasks.append(asyncio.create_task(request(i)))
+                await asyncio.sleep(0.001)
+            await asyncio.gather(*tasks)
+
+        asyncio.run(run())
+        self.assertEqual(order, [0, 1, 2, 3])
+
+    def test_parse_retry_after(self):
+        """Test Retry-After parsing and non rate-limit errors"""
+        self.assertEqual(parse_retry_after(FakeRateLimitError("3"), 1.0), 3.0)
+        self.assertIsNone(parse_retry_after(ValueError("boom"), 1.0))
+
+    def test_provider_retries_after_rate_limit(self):
+        """Test the provider backs off on 429 and retries the call"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key")
+        provider.rate_limiter = RateLimiter(rpm=100)
+        provider.llm = MagicMock()
+        provider.llm.invoke.side_effect = [FakeRateLimitError("0.2"), FakeChunk("ok")]
+
+        started = time.time()
+        self.assertEqual(provider.chat("Hi", "system"), "ok")
+        self.assertGreaterEqual(time.time() - started, 0.2)
+        self.assertEqual(provider.llm.invoke.call_count, 2)
+
+    def test_tool_bound_model_is_rate_limited(self):
+        """Test calls on the model returned by bind_tools go through the limiter"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key")
+        provider.rate_limiter = RateLimiter(rpm=100)
+        provider.llm = MagicMock()
+        bound = provider.llm.bind_tools.return_value
+        bound.invoke.side_effect = [FakeRateLimitError("0.1"), FakeChunk("called tool")]
+        bound.ainvoke = AsyncMock(return_value=FakeChunk("async"))
+        bound.stream.return_value = iter([FakeChunk("a"), FakeChunk("b")])
+
+        model = provider.bind_tools(["search"])
+        self.assertEqual(model.invoke([{"role": "user", "content": "Hi"}]).content, "called tool")
+        self.assertEqual(asyncio.run(model.ainvoke([{"role": "user", "content": "Hi"}])).content, "async")
+        self.assertEqual([c.content for c in model.stream([{"role": "user", "content": "Hi"}])], ["a", "b"])
+
+        provider.llm.bind_tools.assert_called_once_with(["search"])
+        self.assertEqual(bound.invoke.call_count, 2)
+        self.assertEqual(provider.rate_limiter.get_stats()["total_requests"], 4)
+
+
+class TestProviderFactory(unittest.TestCase):
+    """Test provider registry and shared HTTP clients"""
+
+    def setUp(self):
+        ProviderFactory.clear_cache()
+
+    def tearDown(self):
+        ProviderFactory.clear_cache()
+
+    @patch("app.llms.deepseek_provider.ChatOpenAI")
+    def test_same_config_reuses_provider(self, mock_chat_openai):
+        """Test identical configurations share one provider instance"""
+        first = ProviderFactory.create_provider("deepseek", model_name="deepseek-chat", api_key="key", temperature=0.3)
+        second = ProviderFactory.create_provider("deepseek-chat", model_name="deepseek-chat", api_key="key", temperature=0.3)
+
+        self.assertIs(first, second)
+        mock_chat_openai.assert_called_once()
+
+    @patch("app.llms.deepseek_provider.ChatOpenAI")
+    def test_different_config_creates_provider(self, mock_chat_openai):
+        """Test different parameters or keys create separate providers"""
+        base = ProviderFactory.create_provider("deepseek", model_name="deepseek-chat", api_key="key", temperature=0.3)
+        other_params = ProviderFactory.create_provider("deepseek", model_name="deepseek-chat", api_key="key", temperature=0.5)
+        other_key = ProviderFactory.create_provider("deepseek", model_name="deepseek-chat", api_key="key2", temperature=0.3)
+        uncached = ProviderFactory.create_provider("deepseek", use_cache=False, model_name="deepseek-chat", api_key="key", temperature=0.3)
+
+        self.assertIsNot(base, other_params)
+        self.assertIsNot(base, other_key)
+        self.assertIsNot(base, uncached)
+        self.assertEqual(ProviderFactory.get_cache_stats()["size"], 3)
+
+    @patch("app.llms.deepseek_provider.ChatOpenAI")
+    def test_providers_share_http_client_per_endpoint(self, mock_chat_openai):
+        """Test providers for the same endpoint get the same keep-alive client"""
+        ProviderFactory.create_provider("deepseek", model_name="deepseek-chat", api_key="key", temperature=0.3)
+        ProviderFactory.create_provider("deepseek", model_name="deepseek-reasoner", api_key="key", temperature=0.3)
+
+        first_kwargs = mock_chat_openai.call_args_list[0].kwargs
+        second_kwargs = mock_chat_openai.call_args_list[1].kwargs
+        self.assertIs(first_kwargs["http_client"], second_kwargs["http_client"])
+        self.assertIs(first_kwargs["http_async_client"], second_kwargs["http_async_client"])
+
+    def test_provider_classes_load_lazily(self):
+        """Test PROVIDERS holds import paths and classes are imported on first use"""
+        self.assertIsInstance(ProviderFactory.PROVIDERS["claude"], str)
+        provider_class = ProviderFactory.get_provider_class("deepseek")
+
+        from app.llms.deepseek_provider import DeepSeekProvider as Imported
+
+        self.assertIs(provider_class, Imported)
+        self.assertIsNone(ProviderFactory.get_provider_class("unknown"))
+
+    def test_plugin_providers_from_entry_points(self):
+        """Test providers registered under the plugin entry-point group can be created"""
+        entry_point = MagicMock(value="app.tests.test_llm_providers:AsyncTestProvider")
+        entry_point.name = "Plugin"
+        original = dict(ProviderFactory.PROVIDERS)
+        ProviderFactory._plugins_loaded = False
+        try:
+            with patch("app.llms.provider_factory.entry_points", return_value=[entry_point]) as mock_entry_points:
+                self.assertTrue(ProviderFactory.is_provider_available("plugin"))
+                provider = ProviderFactory.create_provider("plugin-model", model_name="plugin-model", api_key="key")
+            mock_entry_points.assert_called_once_with(group="auto_agent.llm_providers")
+            self.assertEqual(type(provider).__name__, "AsyncTestProvider")
+
+            ProviderFactory.register_provider("inline", AsyncTestProvider)
+            self.assertIs(ProviderFactory.get_provider_class("inline"), AsyncTestProvider)
+        finally:
+            ProviderFactory.PROVIDERS.clear()
+            ProviderFactory.PROVIDERS.update(original)
+            ProviderFactory._classes.pop("plugin", None)
+            ProviderFactory._plugins_loaded = False
+
+    def test_http_pool_keys_by_endpoint(self):
+        """Test the HTTP pool keys clients by scheme and host"""
+        pool = HTTPClientPool(max_connections=2, max_keepalive_connections=1, keepalive_expiry=5)
+        try:
+            self.assertIs(pool.get_client("https://api.deepseek.com/v1"), pool.get_client("https://API.deepseek.com/beta"))
+            self.assertIsNot(pool.get_client("https://api.deepseek.com/v1"), pool.get_client("https://api.moonshot.cn/v1"))
+            self.assertEqual(len(pool.get_stats()["endpoints"]), 2)
+        finally:
+            pool.close_all()
+
+
+    def test_async_clients_work_across_event_loops(self):
+        """Test a provider's shared async client serves consecutive asyncio.run() calls"""
+        from app.llms.gpt_provider import GPTProvider
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubChatHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        pool = HTTPClientPool()
+        try:
+            with patch("app.llms.basic_provider.http_client_pool", pool):
+                provider = GPTProvider("gpt-test", "key", api_base=f"http://127.0.0.1:{server.server_port}/v1")
+            self.assertEqual(asyncio.run(provider.agenerate("hello")), "stub: hello")
+            self.assertEqual(asyncio.run(provider.agenerate("again")), "stub: again")
+
+            key = pool.endpoint_key(provider.api_base)
+
+            async def loop_client():
+                return pool.get_loop_client(key)
+
+            first, second = asyncio.run(loop_client()), asyncio.run(loop_client())
+            self.assertIsNot(first, second)
+            # Clients of finished loops are released rather than accumulating
+            self.assertLessEqual(len(pool._loop_clients), 1)
+        finally:
+            server.shutdown()
+            server.server_close()
+            pool.close_all()
+
+
+class StubChatHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-style chat completions endpoint echoing the last message"""
+
+    # Keep connections open so a second event loop would reuse the first loop's connection
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        content = request["messages"][-1]["content"]
+        body = json.dumps({
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": request["model"],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": f"stub: {content}"}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 3, "completion_tokens": 2, "total_tokens": 5},
+        }).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeServerError(Exception):
+    """5xx error like openai.InternalServerError"""
+
+    def __init__(self):
+        super().__init__("upstream unavailable")
+        self.status_code = 503
+
+
+class TestRoutingProvider(unittest.TestCase):
+    """Test latency-aware routing, failover and circuit breaking"""
+
+    def _backends(self):
+        primary = AsyncTestProvider(model_name="primary", api_key="key")
+        fallback = AsyncTestProvider(model_name="fallback", api_key="key")
+        primary.llm = MagicMock()
+        fallback.llm = MagicMock()
+        fallback.llm.invoke.return_value = FakeChunk("from fallback")
+        return primary, fallback
+
+    def test_fails_over_on_timeout_and_5xx(self):
+        """Test retryable errors move the call to the next backend"""
+        primary, fallback = self._backends()
+        router = RoutingProvider(backends=[primary, fallback], strategy="priority", failure_threshold=3, recovery_timeout=60)
+
+        primary.llm.invoke.side_effect = TimeoutError("read timed out")
+        self.assertEqual(router.chat("Hi", "system"), "from fallback")
+        primary.llm.invoke.side_effect = FakeServerError()
+        self.assertEqual(router.chat("Hi", "system"), "from fallback")
+
+        backends = router.get_model_info()["routing"]["backends"]
+        self.assertEqual(backends[0]["failures"], 2)
+        self.assertEqual(backends[1]["requests"], 2)
+
+    def test_client_error_does_not_fail_over(self):
+        """Test non-retryable errors are raised without trying other backends"""
+        primary, fallback = self._backends()
+        router = RoutingProvider(backends=[primary, fallback])
+        primary.llm.invoke.side_effect = ValueError("bad request")
+
+        with self.assertRaises(ValueError):
+            router.chat("Hi", "system")
+        fallback.llm.invoke.assert_not_called()
+
+    def test_circuit_opens_and_recovers(self):
+        """Test a failing backend is skipped while open and retried after the recovery timeout"""
+        primary, fallback = self._backends()
+        router = RoutingProvider(backends=[primary, fallback], strategy="priority", failure_threshold=2, recovery_timeout=0.2)
+        primary.llm.invoke.side_effect = TimeoutError()
+
+        router.chat("Hi", "system")
+        router.chat("Hi", "system")
+        self.assertEqual(router.get_model_info()["routing"]["backends"][0]["state"], "open")
+        router.chat("Hi", "system")
+        self.assertEqual(primary.llm.invoke.call_count, 2)
+
+        time.sleep(0.25)
+        primary.llm.invoke.side_effect = None
+        primary.llm.invoke.return_value = FakeChunk("from primary")
+        self.assertEqual(router.chat("Hi", "system"), "from primary")
+        self.assertEqual(router.get_model_info()["routing"]["backends"][0]["state"], "closed")
+
+    def test_routes_to_lowest_latency_backend(self):
+        """Test measured backends are ordered by p50 latency and weight"""
+        primary, fallback = self._backends()
+        router = RoutingProvider(backends=[primary, fallback])
+        for _ in range(5):
+            router.health[0].record_success(1.0)
+            router.health[1].record_success(0.2)
+
+        self.assertEqual(router._candidates(), [1, 0])
+        router.weights = [10.0, 1.0]
+        self.assertEqual(router._candidates(), [0, 1])
+        router.strategy = "priority"
+        router.weights = [1.0, 1.0]
+        self.assertEqual(router._candidates(), [0, 1])
+
+    def test_async_stream_fails_over_before_first_chunk(self):
+        """Test astream switches backend when the first backend fails before streaming"""
+        primary = AsyncTestProvider(model_name="primary", api_key="key", stream_mode=True)
+        fallback = AsyncTestProvider(model_name="fallback", api_key="key", stream_mode=True)
+
+        async def broken_astream(messages, **kwargs):
+            raise FakeServerError()
+            yield
+
+        primary.llm.astream = broken_astream
+        router = RoutingProvider(backends=[primary, fallback])
+
+        async def collect():
+            return [chunk async for chunk in router.achat("Hi")]
+
+        self.assertEqual(asyncio.run(collect()), ["Hello", " world"])
+        info = router.get_model_info()["routing"]["backends"]
+        self.assertEqual(info[0]["failures"], 1)
+        self.assertIsNotNone(info[1]["p50_ttft"])
+
+    def test_half_open_trial_is_released_without_outcome(self):
+        """Test a trial call ending in a client error or an abandoned stream does not block the backend"""
+        primary, fallback = self._backends()
+        router = RoutingProvider(backends=[primary, fallback], strategy="priority", failure_threshold=1, recovery_timeout=0.1)
+        health = router.health[0]
+
+        health.record_failure()
+        time.sleep(0.15)
+        primary.llm.invoke.side_effect = ValueError("bad request")
+        with self.assertRaises(ValueError):
+            router.invoke([{"role": "user", "content": "Hi"}])
+        self.assertTrue(health.available())
+
+        health.record_failure()
+        time.sleep(0.15)
+        primary.llm.stream.return_value = iter([FakeChunk("a"), FakeChunk("b")])
+        stream = router.stream([{"role": "user", "content": "Hi"}])
+        self.assertEqual(next(stream).content, "a")
+        stream.close()
+        self.assertTrue(health.available())
+
+    def test_half_open_trial_in_flight_is_never_a_last_resort(self):
+        """Test a backend whose trial call is running gets no second call when no backend is available"""
+        primary, fallback = self._backends()
+        router = RoutingProvider(backends=[primary, fallback], strategy="priority", failure_threshold=1, recovery_timeout=0.1)
+        router.health[0].record_failure(TimeoutError())
+        time.sleep(0.15)
+        self.assertTrue(router.health[0].available())
+        router.health[0].begin()
+
+        router.health[1].record_failure(FakeServerError())
+        self.assertEqual(router._candidates(), [1])
+        time.sleep(0.15)
+        self.assertEqual(router._candidates(), [1])
+        router.health[1].begin()
+
+        with self.assertRaises(FakeServerError):
+            router.invoke([{"role": "user", "content": "Hi"}])
+        primary.llm.invoke.assert_not_called()
+        fallback.llm.invoke.assert_not_called()
+
+    def test_tool_bound_model_fails_over(self):
+        """Test bind_tools binds every backend and routes agent turns across them"""
+        primary, fallback = self._backends()
+        router = RoutingProvider(backends=[primary, fallback], strategy="priority")
+        primary.llm.bind_tools.return_value.invoke.side_effect = FakeServerError()
+        fallback.llm.bind_tools.return_value.invoke.return_value = FakeChunk("tool call")
+
+        model = router.bind_tools(["search"])
+        self.assertEqual(model.invoke([{"role": "user", "content": "Hi"}]).content, "tool call")
+
+        primary.llm.bind_tools.assert_called_once_with(["search"])
+        fallback.llm.bind_tools.assert_called_once_with(["search"])
+        self.assertEqual(router.get_model_info()["routing"]["backends"][0]["failures"], 1)
+
+
+class SlowStartChatModel:
+    """Chat model whose calls wait a scripted delay before answering"""
+
+    def __init__(self, delays, label):
+        self.delays = list(delays)
+        self.label = label
+        self.cancelled = 0
+
+    async def ainvoke(self, messages, **kwargs):
+        delay = self.delays.pop(0) if self.delays else 0
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return FakeChunk(f"{self.label} after {delay}")
+
+    async def astream(self, messages, **kwargs):
+        delay = self.delays.pop(0) if self.delays else 0
+        try:
+            await asyncio.sleep(delay)
+            for part in [self.label, " done"]:
+                yield FakeChunk(part)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+class TestHedgedRequests(unittest.TestCase):
+    """Test hedging of slow async calls"""
+
+    def _router(self, backends):
+        router = RoutingProvider(backends=backends, strategy="priority", hedge=True, hedge_percentile=90, hedge_min_samples=5)
+        for _ in range(10):
+            router.health[0].record_success(0.05)
+        return router
+
+    def test_slow_stream_is_hedged_to_alternate(self):
+        """Test a late first chunk sends a hedge and the loser is cancelled"""
+        primary = AsyncTestProvider(model_name="primary", api_key="key", stream_mode=True)
+        fallback = AsyncTestProvider(model_name="fallback", api_key="key", stream_mode=True)
+        primary.llm = SlowStartChatModel([2.0], "primary")
+        fallback.llm = SlowStartChatModel([0], "fallback")
+        router = self._router([primary, fallback])
+
+        async def collect():
+            return [chunk async for chunk in router.achat("Hi")]
+
+        started = time.time()
+        self.assertEqual(asyncio.run(collect()), ["fallback", " done"])
+        self.assertLess(time.time() - started, 1.0)
+        self.assertEqual(primary.llm.cancelled, 1)
+
+        hedging = router.get_model_info()["routing"]["hedging"]
+        self.assertEqual(hedging["hedged"], 1)
+        self.assertEqual(hedging["hedge_wins"], 1)
+        self.assertEqual(hedging["hedge_rate"], 1.0)
+        self.assertGreater(hedging["extra_prompt_tokens"], 0)
+
+    def test_fast_call_is_not_hedged(self):
+        """Test calls answering within the TTFT percentile are not duplicated"""
+        primary = AsyncTestProvider(model_name="primary", api_key="key")
+        fallback = AsyncTestProvider(model_name="fallback", api_key="key")
+        primary.llm = SlowStartChatModel([0], "primary")
+        fallback.llm = SlowStartChatModel([0], "fallback")
+        router = self._router([primary, fallback])
+
+        self.assertEqual(asyncio.run(router.agenerate("Hi")), "primary after 0")
+        hedging = router.get_model_info()["routing"]["hedging"]
+        self.assertEqual((hedging["requests"], hedging["hedged"]), (1, 0))
+
+    def test_single_backend_hedges_to_itself(self):
+        """Test a lone backend receives the duplicate request"""
+        only = AsyncTestProvider(model_name="only", api_key="key")
+        only.llm = SlowStartChatModel([2.0, 0], "only")
+        router = self._router([only])
+
+        self.assertEqual(asyncio.run(router.agenerate("Hi")), "only after 0")
+        self.assertEqual(only.llm.cancelled, 1)
+        self.assertEqual(router.get_model_info()["routing"]["hedging"]["hedge_wins"], 1)
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test the exact-match response cache"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmpdir.name, "responses.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_key_is_normalized(self):
+        """Test equivalent requests share a key and different parameters do not"""
+        messages = [{"role": "system", "content": "你是一个专业的助手"}, {"role": "user", "content": "Hi"}]
+        spaced = [{"content": "你是一个专业的助手 ", "role": "system"}, {"role": "user", "content": "Hi\r\n"}]
+
+        self.assertEqual(make_cache_key("m", messages, {"temperature": 0}), make_cache_key("m", spaced, {"temperature": 0}))
+        self.assertNotEqual(make_cache_key("m", messages, {"temperature": 0}), make_cache_key("m", messages, {"temperature": 0.5}))
+        self.assertNotEqual(make_cache_key("m", messages, {}), make_cache_key("other", messages, {}))
+
+    def test_disk_tier_persists(self):
+        """Test entries survive a new cache instance through SQLite"""
+        ResponseCache(ttl=60, disk_path=self.db_path).put("k", ["Hello", " world"])
+
+        cache = ResponseCache(ttl=60, disk_path=self.db_path)
+        self.assertEqual(cache.get("k"), ["Hello", " world"])
+        self.assertEqual(cache.get("k"), ["Hello", " world"])
+        stats = cache.get_stats()
+        self.assertEqual((stats["disk_hits"], stats["memory_hits"]), (1, 1))
+
+    def test_ttl_and_size_limits(self):
+        """Test expired entries miss and tiers are trimmed to their limits"""
+        cache = ResponseCache(ttl=0.1, memory_max_entries=2, disk_path=self.db_path, disk_max_entries=2)
+        for key in ("a", "b", "c"):
+            cache.put(key, [key])
+        stats = cache.get_stats()
+        self.assertEqual((stats["memory_entries"], stats["disk_entries"]), (2, 2))
+
+        time.sleep(0.15)
+        self.assertIsNone(cache.get("c"))
+
+    def test_provider_serves_repeated_requests_from_cache(self):
+        """Test chat hits the cache, replays streams and honours the bypass flag"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key", temperature=0)
+        provider.response_cache = ResponseCache(ttl=60, disk_path=self.db_path)
+        provider.llm = MagicMock()
+        provider.llm.invoke.return_value = FakeChunk("cached answer")
+        provider.llm.stream.side_effect = lambda *args, **kwargs: iter([FakeChunk("Hel"), FakeChunk("lo")])
+
+        self.assertEqual(provider.chat("Hi", "system"), "cached answer")
+        self.assertEqual(provider.chat("Hi", "system"), "cached answer")
+        self.assertEqual(provider.llm.invoke.call_count, 1)
+        provider.chat("Hi", "system", use_cache=False)
+        self.assertEqual(provider.llm.invoke.call_count, 2)
+
+        provider.stream_mode = True
+        self.assertEqual(list(provider.chat("Stream", "system")), ["Hel", "lo"])
+        self.assertEqual(list(provider.chat("Stream", "system")), ["Hel", "lo"])
+        self.assertEqual(provider.llm.stream.call_count, 1)
+        self.assertEqual(provider.get_model_info()["response_cache"]["memory_hits"], 2)
+
+    def test_sync_and_async_share_keys_per_endpoint(self):
+        """Test sync and async calls build the same request, and keys differ by endpoint and thinking mode"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="test-api-key", temperature=0)
+        provider.response_cache = ResponseCache(ttl=60, disk_path=self.db_path)
+        provider.llm = MagicMock()
+        provider.llm.invoke.return_value = FakeChunk("sync answer")
+
+        self.assertEqual(provider.chat("Hi", ""), "sync answer")
+        self.assertEqual(provider.llm.invoke.call_args[0][0], [{"role": "user", "content": "Hi"}])
+        self.assertEqual(asyncio.run(provider.agenerate("Hi", "")), "sync answer")
+        provider.llm.ainvoke.assert_not_called()
+
+        messages = [{"role": "user", "content": "Hi"}]
+        key = provider._cache_key(messages, {})
+        other = AsyncTestProvider(model_name="test-model", api_key="test-api-key", api_base="https://other.example.com", temperature=0)
+        thinking = AsyncTestProvider(model_name="test-model", api_key="test-api-key", thinking_mode=True, temperature=0)
+        other.response_cache = thinking.response_cache = provider.response_cache
+        self.assertNotEqual(key, other._cache_key(messages, {}))
+        self.assertNotEqual(key, thinking._cache_key(messages, {}))
+
+
+@unittest.skipUnless(ClaudeProvider and DeepSeekProvider, "Claude/DeepSeek providers not available")
+class TestPromptCache(unittest.TestCase):
+    """Test prompt-prefix cache breakpoints, ordering and hit reporting"""
+
+    LONG_PROMPT = "You are a careful assistant. " * 200
+
+    def _response(self, usage=None, token_usage=None):
+        response = FakeChunk("ok")
+        response.usage_metadata = usage
+        response.response_metadata = {"token_usage": token_usage} if token_usage else {}
+        return response
+
+    @patch("app.llms.claude_provider.ChatAnthropic")
+    def test_claude_marks_long_system_prompt(self, mock_chat_anthropic):
+        """Test a long system prompt becomes a cache_control block and short ones stay plain"""
+        provider = ClaudeProvider(model_name="claude-sonnet-4-5", api_key="key")
+        provider.llm = MagicMock()
+        provider.llm.invoke.return_value = self._response(
+            {"input_tokens": 2000, "output_tokens": 5, "total_tokens": 2005, "input_token_details": {"cache_read": 1500, "cache_creation": 0}}
+        )
+
+        provider.chat("Hi", self.LONG_PROMPT)
+        system = provider.llm.invoke.call_args.kwargs["system"]
+        self.assertEqual(system[0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(system[0]["text"], self.LONG_PROMPT)
+
+        provider.chat("Hi", "short")
+        self.assertEqual(provider.llm.invoke.call_args.kwargs["system"], "short")
+
+        stats = provider.get_model_info()["prompt_cache"]
+        self.assertEqual(stats["cache_read_tokens"], 3000)
+        self.assertEqual(stats["cache_hit_rate"], 0.75)
+
+    @patch("app.llms.claude_provider.ChatAnthropic")
+    def test_claude_marks_leading_system_message(self, mock_chat_anthropic):
+        """Test invoke() with LangChain messages puts the breakpoint on the system message"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        provider = ClaudeProvider(model_name="claude-sonnet-4-5", api_key="key")
+        provider.llm = MagicMock()
+        provider.llm.invoke.return_value = self._response()
+
+        provider.invoke([HumanMessage(content="Hi"), SystemMessage(content=self.LONG_PROMPT)])
+        sent = provider.llm.invoke.call_args.args[0]
+        self.assertEqual(sent[0].type, "system")
+        self.assertEqual(sent[0].content[0]["cache_control"], {"type": "ephemeral"})
+        self.assertEqual(sent[1].content, "Hi")
+
+    @patch("app.llms.deepseek_provider.ChatOpenAI")
+    def test_deepseek_orders_static_prefix_and_reports_hits(self, mock_chat_openai):
+        """Test system messages go first and prompt_cache_hit_tokens are counted"""
+        provider = DeepSeekProvider(model_name="deepseek-chat", api_key="key")
+        provider.llm = MagicMock()
+        provider.llm.invoke.return_value = self._response(
+            {"input_tokens": 800, "output_tokens": 5, "total_tokens": 805},
+            {"prompt_cache_hit_tokens": 640, "prompt_cache_miss_tokens": 160},
+        )
+
+        provider.invoke([{"role": "user", "content": "Hi"}, {"role": "system", "content": "static"}])
+        sent = provider.llm.invoke.call_args.args[0]
+        self.assertEqual([m["role"] for m in sent], ["system", "user"])
+        self.assertEqual(provider.get_prompt_cache_stats()["cache_read_tokens"], 640)
+        self.assertTrue(mock_chat_openai.call_args.kwargs["stream_usage"])
+
+    @patch("app.llms.deepseek_provider.ChatOpenAI")
+    def test_deepseek_keeps_mid_conversation_system_messages(self, mock_chat_openai):
+        """Test only the leading prompt is reordered and tool-bound calls are reordered too"""
+        provider = DeepSeekProvider(model_name="deepseek-chat", api_key="key")
+        provider.llm = MagicMock()
+        bound = provider.llm.bind_tools.return_value
+        bound.invoke.return_value = self._response()
+
+        provider.bind_tools(["search"]).invoke([
+            {"role": "user", "content": "Hi"},
+            {"role": "system", "content": "static"},
+            {"role": "assistant", "content": "Hello"},
+            {"role": "system", "content": "summary so far"},
+            {"role": "user", "content": "Next"},
+        ])
+        sent = bound.invoke.call_args.args[0]
+        self.assertEqual([m["content"] for m in sent], ["static", "Hi", "Hello", "summary so far", "Next"])
+
+    @patch("app.llms.claude_provider.ChatAnthropic")
+    def test_claude_marks_tool_bound_calls(self, mock_chat_anthropic):
+        """Test the cache breakpoint is added to calls on the model returned by bind_tools"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        provider = ClaudeProvider(model_name="claude-sonnet-4-5", api_key="key")
+        provider.llm = MagicMock()
+        bound = provider.llm.bind_tools.return_value
+        bound.invoke.return_value = self._response()
+
+        provider.bind_tools(["search"]).invoke([SystemMessage(content=self.LONG_PROMPT), HumanMessage(content="Hi")])
+        sent = bound.invoke.call_args.args[0]
+        self.assertEqual(sent[0].content[0]["cache_control"], {"type": "ephemeral"})
+
+
+class StubBatchHandler(BaseHTTPRequestHandler):
+    """Minimal OpenAI-style files/batches endpoint"""
+
+    state = {}
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, payload, text=None):
+        body = text.encode("utf-8") if text is not None else json.dumps(payload).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        if self.path.endswith("/files"):
+            self.state["requests"] = [json.loads(line) for line in body.splitlines() if line.startswith('{"custom_id"')]
+            self._reply({"id": "file-in"})
+        else:
+            self.state["polls"] = 0
+            self._reply({"id": "batch-1", "status": "validating"})
+
+    def do_GET(self):
+        if self.path.endswith("/batches/batch-1"):
+            self.state["polls"] += 1
+            status = "completed" if self.state["polls"] > 1 else "in_progress"
+            self._reply({"id": "batch-1", "status": status, "output_file_id": "file-out", "error_file_id": "file-err"})
+            return
+        lines = []
+        for request in self.state["requests"]:
+            content = request["body"]["messages"][-1]["content"]
+            failed = content == "bad"
+            if failed != self.path.endswith("/file-err/content"):
+                continue
+            response = (
+                {"status_code": 400, "body": {"error": {"message": "invalid prompt"}}}
+                if failed
+                else {"status_code": 200, "body": {"choices": [{"message": {"content": f"stub: {content}"}}]}}
+            )
+            lines.append(json.dumps({"custom_id": request["custom_id"], "response": response}))
+        # Return results out of order, as real batch output files may
+        self._reply(None, text="\n".join(reversed(lines)))
+
+
+class BatchTestProvider(AsyncTestProvider):
+    """Provider pretending to expose an offline batch endpoint"""
+
+    supports_batch_api = True
+
+
+class TestBatchChat(unittest.TestCase):
+    """Test bulk chat requests"""
+
+    def test_online_batch_keeps_order_and_isolates_errors(self):
+        """Test requests run concurrently, in order, with per-item errors"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="key")
+        provider.llm = MagicMock()
+
+        def invoke(messages, **kwargs):
+            content = messages[-1]["content"]
+            time.sleep(0.1)
+            if content == "bad":
+                raise ValueError("invalid prompt")
+            return FakeChunk(f"answer {content}")
+
+        provider.llm.invoke.side_effect = invoke
+        requests = [f"q{i}" for i in range(7)] + [{"user_input": "bad", "system_prompt": "system"}]
+
+        started = time.time()
+        results = provider.batch_chat(requests, max_concurrency=8)
+        self.assertLess(time.time() - started, 0.5)
+        self.assertEqual([r.content for r in results[:7]], [f"answer q{i}" for i in range(7)])
+        self.assertFalse(results[7].ok)
+        self.assertIn("invalid prompt", results[7].error)
+
+    def test_async_batch(self):
+        """Test abatch_chat runs on the event loop and returns ordered results"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="key")
+
+        results = asyncio.run(provider.abatch_chat([f"q{i}" for i in range(20)], max_concurrency=5))
+        self.assertEqual([r.content for r in results], [f"echo: q{i}" for i in range(20)])
+
+    def test_submit_and_poll_batch(self):
+        """Test batch mode uploads, polls and maps results back by custom_id"""
+        server = ThreadingHTTPServer(("127.0.0.1", 0), StubBatchHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        try:
+            api_base = f"http://127.0.0.1:{server.server_port}/v1"
+            provider = BatchTestProvider(model_name="test-model", api_key="key", api_base=api_base, temperature=0)
+
+            results = provider.batch_chat(["one", "bad", "three"], mode="batch", poll_interval=0.01)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertIsInstance(results[0], BatchResult)
+        self.assertEqual([r.content for r in results], ["stub: one", None, "stub: three"])
+        self.assertEqual(results[1].error, "invalid prompt")
+        self.assertEqual(StubBatchHandler.state["polls"], 2)
+        self.assertEqual(StubBatchHandler.state["requests"][0]["body"]["temperature"], 0)
+
+
+class TestTokenAccounting(unittest.TestCase):
+    """Test token counting, context budgeting and the usage ledger"""
+
+    def _history(self):
+        return [
+            {"role": "system", "content": "rules"},
+            {"role": "user", "content": "old question " * 100},
+            {"role": "assistant", "content": "", "tool_calls": [{"id": "1"}]},
+            {"role": "tool", "content": "tool output " * 100},
+            {"role": "assistant", "content": "recent answer"},
+            {"role": "user", "content": "latest question"},
+        ]
+
+    def test_counter_families_and_calibration(self):
+        """Test family detection, CJK-aware estimates and calibration from reported usage"""
+        self.assertEqual(token_family("claude-sonnet-4-5"), "claude")
+        self.assertEqual(token_family("anthropic:claude-sonnet-4-5"), "claude")
+        self.assertEqual(token_family("ollama/llama3"), "ollama")
+        self.assertEqual(token_family("unknown-model"), "default")
+
+        counter = TokenCounter("deepseek", tokenizer="estimate")
+        self.assertEqual(counter.count_text("a" * 400), 100)
+        self.assertEqual(counter.count_text("你好" * 50), 60)
+        for _ in range(20):
+            counter.calibrate(counter.count_text("a" * 400), 150)
+        self.assertAlmostEqual(counter.count_text("a" * 400), 150, delta=3)
+
+    def test_trim_keeps_system_and_last_message(self):
+        """Test trimming drops the oldest history together with its tool results"""
+        counter = TokenCounter("default", tokenizer="estimate")
+        messages, trimmed = fit_messages(self._history(), counter, budget=60)
+        self.assertTrue(trimmed)
+        self.assertEqual([m["role"] for m in messages], ["system", "assistant", "user"])
+        self.assertEqual(messages[-1]["content"], "latest question")
+
+        unchanged, trimmed = fit_messages(self._history(), counter, budget=10000)
+        self.assertFalse(trimmed)
+        self.assertEqual(len(unchanged), 6)
+
+    def test_summarize_error_and_truncate_policies(self):
+        """Test the summarize and error policies and middle truncation of an oversized message"""
+        counter = TokenCounter("default", tokenizer="estimate")
+        messages, _ = fit_messages(self._history(), counter, budget=150, policy="summarize")
+        self.assertTrue(messages[1]["content"].startswith("Summary of earlier conversation"))
+        self.assertIn("old question", messages[1]["content"])
+
+        with self.assertRaises(ContextBudgetExceeded):
+            fit_messages(self._history(), counter, budget=60, policy="error")
+
+        huge = [{"role": "user", "content": "x" * 4000}]
+        messages, trimmed = fit_messages(huge, counter, budget=200)
+        self.assertTrue(trimmed)
+        self.assertIn("[truncated", messages[0]["content"])
+        self.assertLessEqual(counter.count_messages(messages), 200)
+
+    def test_provider_records_usage_per_agent_and_run(self):
+        """Test provider calls are trimmed to the window and recorded in the ledger"""
+        provider = AsyncTestProvider(model_name="test-model", api_key="key", max_tokens=32000)
+        provider.llm = MagicMock()
+        response = FakeChunk("done")
+        response.usage_metadata = {"input_tokens": 40, "output_tokens": 7, "total_tokens": 47}
+        provider.llm.invoke.return_value = response
+
+        with token_ledger.scope(agent="writer", run="run-tokens"):
+            provider.invoke([{"role": "user", "content": "y" * 8000}, {"role": "user", "content": "go"}])
+        sent = provider.llm.invoke.call_args.args[0]
+        self.assertEqual(sent, [{"role": "user", "content": "go"}])
+
+        report = token_ledger.report("run-tokens")
+        self.assertEqual((report["calls"], report["prompt_tokens"], report["completion_tokens"]), (1, 40, 7))
+        self.assertEqual(report["agents"]["writer"]["trimmed_calls"], 1)
+        self.assertIn("writer: 1 calls", token_ledger.format_report("run-tokens"))
+        self.assertEqual(provider.get_model_info()["token_usage"]["prompt_tokens"], 40)
+
+    def test_agent_turns_are_recorded(self):
+        """Test a tool-calling agent loop records its model calls for the enclosing run"""
+        from langchain.agents import create_agent
+        from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+        from langchain_core.messages import AIMessage
+        from langchain_core.tools import tool
+
+        class ToolChatModel(GenericFakeChatModel):
+            def bind_tools(self, tools, **kwargs):
+                return self
+
+        @tool
+        def lookup(query: str) -> str:
+            """Look something up"""
+            return query
+
+        reply = AIMessage(content="done", usage_metadata={"input_tokens": 11, "output_tokens": 3, "total_tokens": 14})
+        provider = AsyncTestProvider(model_name="test-model", api_key="key")
+        provider.llm = ToolChatModel(messages=iter([reply]))
+        agent = create_agent(model=provider, tools=[lookup])
+
+        with token_ledger.scope(agent="researcher", run="run-agent"):
+            for _ in agent.stream({"messages": [{"role": "user", "content": "hi"}]}):
+                pass
+
+        report = token_ledger.report("run-agent")
+        self.assertEqual((report["calls"], report["prompt_tokens"], report["completion_tokens"]), (1, 11, 3))
+        self.assertEqual(report["agents"]["researcher"]["calls"], 1)
+
+
 # Test individual providers if they are available
 
 if GPTProvider:
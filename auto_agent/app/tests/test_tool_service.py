@@ -0,0 +1,162 @@
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import unittest
+
+# Add the project root to Python path
+sys.path.append(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+)
+
+from app.core.services.tool_service import tool_service
+from app.core.tool_registry import tool_registry
+
+
+class TestToolServiceBatch(unittest.TestCase):
+    """Test parallel tool-call execution in ToolServiceImpl"""
+
+    def setUp(self):
+        """Register test tools that log when they start and finish"""
+        self.events = []
+
+        async def slow_read(path: str, delay: float = 0.2) -> str:
+            self.events.append(("start", "read", path))
+            await asyncio.sleep(delay)
+            self.events.append(("end", "read", path))
+            return f"read {path}"
+
+        async def slow_write(path: str, delay: float = 0.2) -> str:
+            self.events.append(("start", "write", path))
+            await asyncio.sleep(delay)
+            self.events.append(("end", "write", path))
+            return f"wrote {path}"
+
+        async def limited(delay: float = 0.1) -> str:
+            await asyncio.sleep(delay)
+            return "done"
+
+        async def broken() -> str:
+            raise RuntimeError("tool exploded")
+
+        async def run_command(command: str) -> str:
+            self.events.append(("start", "command", command))
+            await asyncio.sleep(0.1)
+            self.events.append(("end", "command", command))
+            return command
+
+        tool_registry.register_tool("test_read", slow_read, "Test read", read_only=True, path_arg="path")
+        tool_registry.register_tool("test_write", slow_write, "Test write", read_only=False, path_arg="path")
+        tool_registry.register_tool("test_limited", limited, "Test limited", read_only=True, max_concurrency=1)
+        tool_registry.register_tool("test_broken", broken, "Test broken", read_only=True)
+        tool_registry.register_tool("test_command", run_command, "Test command", read_only=False)
+
+    def tearDown(self):
+        """Unregister test tools"""
+        for name in ("test_read", "test_write", "test_limited", "test_broken", "test_command"):
+            tool_registry.unregister_tool(name)
+
+    def _batch(self, calls, **kwargs):
+        start = time.monotonic()
+        results = asyncio.run(tool_service.execute_tools_batch(calls, **kwargs))
+        return results, time.monotonic() - start
+
+    def test_reads_run_in_parallel_in_order_with_isolated_errors(self):
+        """Test independent reads overlap, results keep call order and failures stay per call"""
+        calls = [{"id": f"call-{i}", "name": "test_read", "args": {"path": f"file{i}.txt"}} for i in range(5)]
+        calls.insert(2, {"id": "bad", "name": "test_broken", "args": {}})
+        calls.append({"id": "missing", "name": "no_such_tool", "args": {}})
+
+        results, elapsed = self._batch(calls)
+        self.assertLess(elapsed, 0.6)
+        self.assertEqual([r["id"] for r in results], [c["id"] for c in calls])
+        self.assertEqual(results[0]["result"], "read file0.txt")
+        self.assertEqual((results[2]["success"], results[2]["error"]), (False, "tool exploded"))
+        self.assertEqual(results[-1]["error"], "Tool 'no_such_tool' not found")
+        self.assertTrue(all(r["success"] for r in results if r["name"] == "test_read"))
+
+    def test_concurrency_limits(self):
+        """Test the per-tool limit and the batch-wide cap"""
+        _, elapsed = self._batch([{"name": "test_limited", "args": {}} for _ in range(3)])
+        self.assertGreaterEqual(elapsed, 0.3)
+
+        _, elapsed = self._batch([{"name": "test_read", "args": [f"f{i}", 0.1]} for i in range(4)], max_concurrency=2)
+        self.assertGreaterEqual(elapsed, 0.2)
+        self.assertLess(elapsed, 0.35)
+
+    def test_tool_limit_is_shared_across_batches(self):
+        """Test a tool's max_concurrency holds across concurrent batches"""
+
+        async def two_batches():
+            await asyncio.gather(*(tool_service.execute_tools_batch([{"name": "test_limited", "args": {}}]) for _ in range(2)))
+
+        start = time.monotonic()
+        asyncio.run(two_batches())
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_capped_tool_does_not_starve_other_calls(self):
+        """Test calls waiting on a tool's own limit leave batch slots to other tools"""
+        calls = [{"name": "test_limited", "args": {"delay": 0.2}} for _ in range(3)]
+        calls.append({"name": "test_read", "args": {"path": "free.txt", "delay": 0.1}})
+        start = time.monotonic()
+
+        async def read_finishes():
+            batch = asyncio.ensure_future(tool_service.execute_tools_batch(calls, max_concurrency=2))
+            while ("end", "read", "free.txt") not in self.events:
+                await asyncio.sleep(0.01)
+            elapsed = time.monotonic() - start
+            await batch
+            return elapsed
+
+        self.assertLess(asyncio.run(read_finishes()), 0.3)
+
+    def test_unscoped_mutating_call_is_a_barrier(self):
+        """Test a mutating call without a known path runs after earlier calls and before later ones"""
+        calls = [
+            {"name": "test_read", "args": {"path": "a.txt", "delay": 0.1}},
+            {"name": "test_write", "args": {"path": "b.txt", "delay": 0.1}},
+            {"name": "test_command", "args": {"command": "make"}},
+            {"name": "test_read", "args": {"path": "c.txt", "delay": 0.1}},
+        ]
+        results, _ = self._batch(calls)
+
+        self.assertTrue(all(r["success"] for r in results))
+        command_start = self.events.index(("start", "command", "make"))
+        command_end = self.events.index(("end", "command", "make"))
+        self.assertGreater(command_start, self.events.index(("end", "read", "a.txt")))
+        self.assertGreater(command_start, self.events.index(("end", "write", "b.txt")))
+        self.assertLess(command_end, self.events.index(("start", "read", "c.txt")))
+
+    def test_same_path_writes_are_serialized(self):
+        """Test writes to one path run in order while other paths proceed in parallel"""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            target = os.path.join(temp_dir, "shared.txt")
+            other = os.path.join(temp_dir, "other.txt")
+            calls = [
+                {"name": "test_write", "args": {"path": target}},
+                {"name": "test_write", "args": {"path": target}},
+                {"name": "test_read", "args": {"path": target}},
+                {"name": "test_read", "args": {"path": other}},
+                {"name": "test_write", "args": {"path": temp_dir}},
+            ]
+            results, elapsed = self._batch(calls)
+
+        self.assertTrue(all(r["success"] for r in results))
+        shared = [(kind, op) for kind, op, path in self.events if path == target]
+        self.assertEqual(
+            shared,
+            [("start", "write"), ("end", "write"), ("start", "write"), ("end", "write"), ("start", "read"), ("end", "read")],
+        )
+        # The other file is read alongside the first write; the directory write waits for everything under it
+        self.assertLess(self.events.index(("start", "read", other)), self.events.index(("end", "write", target)))
+        self.assertEqual(self.events[-1], ("end", "write", temp_dir))
+        self.assertLess(elapsed, 1.2)
+
+    def test_execute_tool_calls_registered_function(self):
+        """Test execute_tool runs a registered tool"""
+        self.assertEqual(asyncio.run(tool_service.execute_tool("test_read", "a.txt", delay=0)), "read a.txt")
+
+
+if __name__ == "__main__":
+    unittest.main()
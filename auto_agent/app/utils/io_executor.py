@@ -0,0 +1,101 @@
+"""
+IO Executor
+Dedicated thread pool that runs blocking file-system calls off the event loop
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from ..config import config
+from .logger import global_logger as logger
+
+
+class IOExecutor:
+    """
+    Runs blocking I/O for async code on a bounded pool of worker threads
+
+    The pool size caps how many file operations run at once across all
+    agents; further calls wait in the pool's queue without blocking the
+    event loop that awaits them.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None):
+        """
+        Initialize the executor
+
+        Args:
+            max_workers: Maximum concurrent I/O calls (defaults to tools.io_max_workers)
+        """
+        self.max_workers = max_workers or int(config.get("tools.io_max_workers", 4))
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "active": 0, "peak_active": 0}
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Create the thread pool on first use"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="AutoAgentIO"
+                )
+            return self._executor
+
+    def _call(self, func: Callable, *args, **kwargs) -> Any:
+        """Run a call on a worker thread, tracking how many are active"""
+        with self._lock:
+            self.stats["active"] += 1
+            self.stats["peak_active"] = max(self.stats["peak_active"], self.stats["active"])
+        try:
+            return func(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.stats["active"] -= 1
+
+    async def run(self, func: Callable, *args, **kwargs) -> Any:
+        """
+        Run a blocking function on the I/O pool and await its result
+
+        Args:
+            func: Blocking function
+            *args: Positional arguments for the function
+            **kwargs: Keyword arguments for the function
+
+        Returns:
+            Function result (exceptions are re-raised in the caller)
+        """
+        executor = self._get_executor()
+        with self._lock:
+            self.stats["submitted"] += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, functools.partial(self._call, func, *args, **kwargs))
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get executor statistics
+
+        Returns:
+            Pool size and call counters
+        """
+        with self._lock:
+            return {"max_workers": self.max_workers, **self.stats}
+
+    def shutdown(self, wait: bool = True):
+        """
+        Shutdown the thread pool; it is recreated on the next call
+
+        Args:
+            wait: Whether to wait for running calls to complete
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            logger.info("Shutting down I/O executor")
+            executor.shutdown(wait=wait)
+
+
+# Global I/O executor instance (threads are started on first use)
+io_executor = IOExecutor()
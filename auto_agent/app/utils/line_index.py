@@ -0,0 +1,212 @@
+"""
+Line Index
+Sparse line-offset index over memory-mapped files for random access by line number
+"""
+
+import mmap
+import os
+import threading
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+from typing import Dict, Optional, Tuple
+
+from ..config import config
+
+
+class LineIndex:
+    """
+    Byte offsets of every STRIDE-th line start of a file
+
+    Built in one pass over a memory map, splitting 1 MB chunks in C (small
+    enough that the scan does not hold the GIL for long); finding line N then
+    takes one array lookup and at most STRIDE - 1 newline searches. Lines are
+    terminated by b"\\n"; a final line without a newline still counts.
+    """
+
+    STRIDE = 64
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, mm: mmap.mmap, mtime_ns: int, size: int):
+        """
+        Scan a mapped file
+
+        Args:
+            mm: Memory map of the whole file
+            mtime_ns: Modification time the index was built for
+            size: File size the index was built for
+        """
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.checkpoints = array("q")
+        self.line_count = 0
+        self._build(mm)
+
+    def _build(self, mm: mmap.mmap):
+        line, start = 0, 0
+        while start < self.size:
+            complete = mm[start:start + self.CHUNK_SIZE].split(b"\n")[:-1]
+            if not complete:
+                # A single line longer than the chunk, or the unterminated last line
+                if line % self.STRIDE == 0:
+                    self.checkpoints.append(start)
+                line += 1
+                end = mm.find(b"\n", start)
+                start = self.size if end == -1 else end + 1
+                continue
+            starts = list(accumulate((len(part) + 1 for part in complete), initial=start))
+            self.checkpoints.extend(starts[(-line) % self.STRIDE:len(complete):self.STRIDE])
+            line += len(complete)
+            start = starts[-1]
+        self.line_count = line
+
+    def offset(self, mm: mmap.mmap, line: int) -> int:
+        """
+        Get the byte offset where a line starts
+
+        Args:
+            mm: Memory map of the indexed file
+            line: Zero-based line number
+
+        Returns:
+            Byte offset, or the file size for lines past the end
+        """
+        if line >= self.line_count:
+            return self.size
+        position = self.checkpoints[line // self.STRIDE]
+        for _ in range(line % self.STRIDE):
+            position = mm.find(b"\n", position) + 1
+        return position
+
+
+class LineIndexCache:
+    """
+    LRU of line indexes keyed by path, invalidated when a file's mtime or size changes
+
+    Concurrent reads of a file that is not indexed yet wait for a single scan.
+    Reads from the first line of such a file scan forward instead of
+    indexing it, since they need neither a line offset nor the line count.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        """
+        Initialize the cache
+
+        Args:
+            max_entries: Number of file indexes kept (defaults to tools.read_file.index_cache_size)
+        """
+        self.max_entries = max_entries or int(config.get("tools.read_file.index_cache_size", 32))
+        self._indexes: "OrderedDict[str, LineIndex]" = OrderedDict()
+        self._building: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "builds": 0}
+
+    def get(self, file_path: str, mm: mmap.mmap, stat: Optional[os.stat_result] = None) -> LineIndex:
+        """
+        Get the index of a mapped file, building it on first use or after a change
+
+        Args:
+            file_path: File path
+            mm: Memory map of the file
+            stat: File status (read from the path if omitted)
+
+        Returns:
+            Line index
+        """
+        key = os.path.abspath(file_path)
+        stat = stat or os.stat(key)
+        with self._lock:
+            index = self._lookup(key, stat)
+            if index is not None:
+                return index
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                index = self._lookup(key, stat)
+                if index is not None:
+                    return index
+            index = LineIndex(mm, stat.st_mtime_ns, stat.st_size)
+            with self._lock:
+                self._indexes[key] = index
+                while len(self._indexes) > self.max_entries:
+                    self._indexes.popitem(last=False)
+                self._building.pop(key, None)
+                self.stats["builds"] += 1
+        return index
+
+    def _lookup(self, key: str, stat: os.stat_result) -> Optional[LineIndex]:
+        """Return a cached index still matching the file (caller holds the lock)"""
+        index = self._indexes.get(key)
+        if index is None or (index.mtime_ns, index.size) != (stat.st_mtime_ns, stat.st_size):
+            return None
+        self._indexes.move_to_end(key)
+        self.stats["hits"] += 1
+        return index
+
+    def line_range(
+        self,
+        file_path: str,
+        first: Optional[int],
+        count: Optional[int],
+        tail: bool = False,
+        max_bytes: Optional[int] = None,
+    ) -> Tuple[bytes, int, int, Optional[int]]:
+        """
+        Read a range of lines from a file through its index
+
+        Args:
+            file_path: File path
+            first: Zero-based first line (ignored for tail)
+            count: Number of lines, None for the rest of the file
+            tail: Read the last count lines instead
+            max_bytes: Output cap; at most max_bytes + 1 bytes are copied, so a
+                range longer than the cap is returned cut (mid-line) past it
+
+        Returns:
+            Tuple of (raw bytes, first line, end line (exclusive), total lines);
+            total is None when a read from the first line stopped before the end
+            of a file that is not indexed
+        """
+        with open(file_path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            if stat.st_size == 0:
+                return b"", 0, 0, 0
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                span = stat.st_size if max_bytes is None else min(stat.st_size, max_bytes + 1)
+                if not tail and not first:
+                    with self._lock:
+                        index = self._lookup(os.path.abspath(file_path), stat)
+                    if index is None:
+                        return self._head(mm, span, stat.st_size, count)
+                else:
+                    index = self.get(file_path, mm, stat)
+                total = index.line_count
+                if tail:
+                    first = max(0, total - (count or 0))
+                first = min(first or 0, total)
+                end = total if count is None else min(total, first + count)
+                start = index.offset(mm, first)
+                return mm[start:min(index.offset(mm, end), start + span)], first, end, total
+
+    @staticmethod
+    def _head(mm: mmap.mmap, stop: int, size: int, count: Optional[int]) -> Tuple[bytes, int, int, Optional[int]]:
+        """Read the first count lines within the first stop bytes by scanning forward"""
+        if count is None:
+            position = stop
+            end = mm[:stop].count(b"\n") + (stop == size and mm[size - 1] != ord("\n"))
+        else:
+            position, end = 0, 0
+            while position < stop and end < count:
+                newline = mm.find(b"\n", position, stop)
+                if newline == -1:
+                    # An unterminated last line counts; a line cut at stop does not
+                    end += stop == size
+                    position = stop
+                    break
+                end += 1
+                position = newline + 1
+        return mm[:position], 0, end, end if position == size else None
+
+
+# Global line index cache instance
+line_index_cache = LineIndexCache()
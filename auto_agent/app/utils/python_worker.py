@@ -0,0 +1,258 @@
+"""
+Python Worker
+Warm interpreter loop used by the Python worker pool
+
+Run as a standalone script (it imports nothing from the app package):
+
+    python python_worker.py '{"preload": ["numpy as np"], "memory_limit_mb": 2048, "max_output_bytes": 1048576}'
+
+The worker imports the preload modules, writes {"ready": true} and then
+executes one snippet per JSON line read from stdin, answering with one JSON
+line per snippet on stdout. A request with "stream": true also gets
+{"stream": "stdout" | "stderr", "data": ...} lines as the snippet writes
+output, before its reply. The original stdin/stdout file descriptors are
+reserved for this protocol; snippets see an empty stdin and their output is
+captured, including what they or their child processes write to file
+descriptors 1 and 2 (os.system, subprocess), which is appended to the
+snippet's stdout and stderr.
+
+Imports resolve as for ``python -c``: from the working directory, then
+PYTHONPATH and the site directories. Each snippet gets a fresh globals
+namespace holding only the preloaded modules, modules it imported from
+outside the interpreter's installation are forgotten so edited files are
+picked up, and the working directory, os.environ, sys.path and the root
+logger's handlers and level are restored after every call.
+"""
+
+import builtins
+import importlib
+import io
+import json
+import os
+import sys
+import tempfile
+import traceback
+from contextlib import redirect_stderr, redirect_stdout
+
+# Installation directories (stdlib and site-packages); modules loaded from elsewhere are reloaded per snippet
+INSTALL_PREFIXES = tuple({os.path.abspath(p) for p in (sys.prefix, sys.base_prefix, sys.exec_prefix)})
+# Streamed output is sent at line ends or once this many characters are pending
+STREAM_CHUNK = 4096
+
+
+class CappedWriter(io.TextIOBase):
+    """Text stream keeping at most a fixed number of characters, optionally forwarding them line by line"""
+
+    def __init__(self, limit: int, emit=None):
+        self.parts = []
+        self.size = 0
+        self.limit = limit
+        self.dropped = 0
+        self.emit = emit
+        self.pending = ""
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        kept = text[: max(0, self.limit - self.size)]
+        self.parts.append(kept)
+        self.size += len(kept)
+        self.dropped += len(text) - len(kept)
+        if kept and self.emit is not None:
+            self.pending += kept
+            if "\n" in kept or len(self.pending) >= STREAM_CHUNK:
+                self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.pending:
+            self.emit(self.pending)
+            self.pending = ""
+
+    def getvalue(self) -> str:
+        return "".join(self.parts)
+
+
+def preload(specs) -> dict:
+    """Import modules given as "name" or "name as alias" and return their bindings"""
+    bindings = {}
+    for spec in specs:
+        name, _, alias = spec.partition(" as ")
+        name = name.strip()
+        module = importlib.import_module(name)
+        if alias.strip():
+            bindings[alias.strip()] = module
+        else:
+            top = name.split(".")[0]
+            bindings[top] = sys.modules[top]
+    return bindings
+
+
+def limit_memory(limit_mb: int):
+    """Cap the address space of this process, where the platform supports it"""
+    try:
+        import resource
+    except ImportError:
+        return
+    limit = limit_mb * 1024 * 1024
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+def format_exception() -> str:
+    """Format the current exception without the worker's own frame"""
+    etype, value, tb = sys.exc_info()
+    return "".join(traceback.format_exception(etype, value, tb.tb_next if tb else None))
+
+
+def forget_local_modules(loaded: set):
+    """Drop modules imported since the snapshot from outside the interpreter's installation"""
+    for name in set(sys.modules) - loaded:
+        path = getattr(sys.modules[name], "__file__", None)
+        if path and not os.path.abspath(path).startswith(INSTALL_PREFIXES):
+            del sys.modules[name]
+
+
+def capture_fds() -> list:
+    """Point file descriptors 1 and 2 at fresh temporary files, returning (fd, saved copy, file) triples"""
+    captures = []
+    for fd in (1, 2):
+        file = tempfile.TemporaryFile()
+        captures.append((fd, os.dup(fd), file))
+        os.dup2(file.fileno(), fd)
+    return captures
+
+
+def release_fds(captures: list, writers: list):
+    """Restore file descriptors 1 and 2 and append what was written to them to the matching writers"""
+    for stream in (sys.__stdout__, sys.__stderr__):
+        try:
+            stream.flush()
+        except (AttributeError, OSError, ValueError):
+            pass
+    for (fd, saved, file), writer in zip(captures, writers):
+        os.dup2(saved, fd)
+        os.close(saved)
+        size = os.fstat(file.fileno()).st_size
+        file.seek(0)
+        data = file.read(max(0, writer.limit - writer.size))
+        file.close()
+        writer.write(data.decode("utf-8", errors="replace"))
+        writer.dropped += size - len(data)
+
+
+def snapshot_root_logger():
+    """Return the root logger's handlers and level, or None if logging is not imported yet"""
+    logging = sys.modules.get("logging")
+    if logging is None:
+        return None
+    return list(logging.root.handlers), logging.root.level
+
+
+def restore_root_logger(snapshot):
+    """Remove root logger handlers added by a snippet (e.g. by logging.basicConfig) and restore its level"""
+    logging = sys.modules.get("logging")
+    if logging is None:
+        return
+    handlers, level = snapshot if snapshot is not None else ([], logging.WARNING)
+    for handler in list(logging.root.handlers):
+        if handler not in handlers:
+            logging.root.removeHandler(handler)
+            handler.close()
+    logging.root.setLevel(level)
+
+
+def restore_environ(saved: dict):
+    """Undo changes a snippet made to os.environ"""
+    for key in set(os.environ) - set(saved):
+        del os.environ[key]
+    for key, value in saved.items():
+        if os.environ.get(key) != value:
+            os.environ[key] = value
+
+
+def execute(code: str, bindings: dict, max_output: int, emit=None) -> dict:
+    """Run one snippet and describe its outcome, passing output to emit(stream, text) as it is written"""
+    stdout = CappedWriter(max_output, emit and (lambda text: emit("stdout", text)))
+    stderr = CappedWriter(max_output, emit and (lambda text: emit("stderr", text)))
+    namespace = {"__name__": "__main__", "__builtins__": builtins, **bindings}
+    exit_code, recycle = 0, False
+    cwd = os.getcwd()
+    environ = dict(os.environ)
+    path = list(sys.path)
+    root_logger = snapshot_root_logger()
+    loaded = set(sys.modules)
+    importlib.invalidate_caches()
+    sys.stdin = io.StringIO("")
+    captures = capture_fds()
+    with redirect_stdout(stdout), redirect_stderr(stderr):
+        try:
+            exec(compile(code, "<snippet>", "exec"), namespace)
+        except SystemExit as e:
+            if isinstance(e.code, int) or e.code is None:
+                exit_code = e.code or 0
+            else:
+                exit_code = 1
+                stderr.write(f"{e.code}\n")
+        except MemoryError:
+            exit_code, recycle = 1, True
+            stderr.write(format_exception())
+        except BaseException:
+            exit_code = 1
+            stderr.write(format_exception())
+        release_fds(captures, [stdout, stderr])
+        if emit is not None:
+            stdout.flush()
+            stderr.flush()
+    os.chdir(cwd)
+    restore_environ(environ)
+    sys.path[:] = path
+    restore_root_logger(root_logger)
+    forget_local_modules(loaded)
+    return {
+        "exit_code": exit_code,
+        "stdout": stdout.getvalue(),
+        "stderr": stderr.getvalue(),
+        "truncated": stdout.dropped + stderr.dropped,
+        "recycle": recycle,
+    }
+
+
+def main():
+    # Bind the protocol codec before any snippet runs, so patching the json module cannot break replies
+    encode = json.JSONEncoder().encode
+    decode = json.JSONDecoder().decode
+    options = decode(sys.argv[1]) if len(sys.argv) > 1 else {}
+    # Like python -c: resolve imports from the working directory instead of this script's directory
+    if sys.path and os.path.abspath(sys.path[0]) == os.path.dirname(os.path.abspath(__file__)):
+        sys.path[0] = ""
+    # Keep the protocol pipes for ourselves; stray fd-level reads and writes outside snippets go to /dev/null
+    requests = os.fdopen(os.dup(0), "r", encoding="utf-8")
+    replies = os.fdopen(os.dup(1), "w", encoding="utf-8")
+    devnull = os.open(os.devnull, os.O_RDWR)
+    os.dup2(devnull, 0)
+    os.dup2(devnull, 1)
+
+    bindings = preload(options.get("preload", []))
+    if options.get("memory_limit_mb"):
+        limit_memory(int(options["memory_limit_mb"]))
+    max_output = int(options.get("max_output_bytes", 1048576))
+
+    def send(message: dict):
+        replies.write(encode(message) + "\n")
+        replies.flush()
+
+    def emit(stream: str, text: str):
+        send({"stream": stream, "data": text})
+
+    send({"ready": True})
+    for line in requests:
+        request = decode(line)
+        reply = execute(request["code"], bindings, max_output, emit if request.get("stream") else None)
+        send(reply)
+        if reply["recycle"]:
+            break
+
+
+if __name__ == "__main__":
+    main()
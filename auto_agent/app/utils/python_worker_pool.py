@@ -0,0 +1,411 @@
+"""
+Python Worker Pool
+Pre-warmed Python interpreters that run snippets over a pipe
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from ..config import config
+from .logger import global_logger as logger
+from .subprocess_engine import ProcessResult, SubprocessEngine
+
+# Standalone worker script, run with the current interpreter (imports resolve as for python -c)
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "python_worker.py")
+
+
+class PythonWorker:
+    """One warm interpreter process running python_worker.py"""
+
+    def __init__(self, options: Dict[str, Any], startup_timeout: float):
+        """
+        Start the worker and wait until its preload modules are imported
+
+        Args:
+            options: Worker options (preload, memory_limit_mb, max_output_bytes)
+            startup_timeout: Seconds to wait for the worker to become ready
+
+        Raises:
+            RuntimeError: If the worker exits or does not become ready in time
+        """
+        kwargs: Dict[str, Any] = {}
+        if os.name == "posix":
+            kwargs["start_new_session"] = True
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT, json.dumps(options)],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding="utf-8",
+            bufsize=1,
+            **kwargs,
+        )
+        self.calls = 0
+        self.timed_out = False
+        if self._read_reply(startup_timeout) != {"ready": True}:
+            self.close()
+            raise RuntimeError("Python worker failed to start (check tools.python_pool.preload and memory_limit_mb)")
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid
+
+    @property
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _read_reply(
+        self, timeout: float, on_output: Optional[Callable[[str, str], Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Read lines up to the next reply, passing streamed output on and killing the worker after timeout"""
+        self.timed_out = False
+
+        def expire():
+            self.timed_out = True
+            self.kill()
+
+        timer = threading.Timer(timeout, expire)
+        timer.daemon = True
+        timer.start()
+        try:
+            while True:
+                line = self.process.stdout.readline()
+                if not line:
+                    return None
+                try:
+                    message = json.loads(line)
+                except ValueError:
+                    message = None
+                if not isinstance(message, dict):
+                    # The protocol stream is corrupt; report the worker as crashed so it is replaced
+                    logger.warning(f"Python worker sent an unreadable reply: {line[:200]!r}")
+                    return None
+                if "stream" not in message:
+                    return message
+                try:
+                    on_output(message["stream"], message["data"])
+                except Exception as e:
+                    logger.warning(f"Python worker output callback failed: {e}")
+        finally:
+            timer.cancel()
+
+    def execute(
+        self, code: str, timeout: float, on_output: Optional[Callable[[str, str], Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Run a snippet
+
+        Args:
+            code: Python source
+            timeout: Seconds before the worker is killed
+            on_output: Callback receiving (stream name, text) as the snippet writes output
+
+        Returns:
+            Worker reply, or None if the worker died or timed out
+        """
+        self.calls += 1
+        try:
+            self.process.stdin.write(json.dumps({"code": code, "stream": on_output is not None}) + "\n")
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            return None
+        return self._read_reply(timeout, on_output)
+
+    def kill(self):
+        """Kill the worker and anything the snippet spawned"""
+        try:
+            if os.name == "posix":
+                os.killpg(self.process.pid, signal.SIGKILL)
+            else:
+                self.process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    def close(self):
+        """Stop the worker and release its pipes"""
+        self.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass
+
+
+class PythonWorkerPool:
+    """
+    Pool of warm Python workers for execute_python
+
+    Workers start lazily (or via warm()), import the configured preload
+    modules once and then run snippets sent over a pipe, avoiding interpreter
+    startup and repeated imports on every call. A worker is replaced after
+    max_calls snippets, after a timeout or memory error, when it crashes and
+    when the awaiting caller is cancelled; replacements are started in the
+    background so the pool stays warm.
+
+    Workers are isolated processes with an address-space limit, a fresh
+    namespace per snippet and no access to the protocol pipes; they are not a
+    security boundary.
+    """
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        preload: Optional[List[str]] = None,
+        max_calls: Optional[int] = None,
+        memory_limit_mb: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_output_bytes: Optional[int] = None,
+        startup_timeout: Optional[float] = None,
+    ):
+        """
+        Initialize the pool
+
+        Args:
+            size: Maximum number of workers (defaults to tools.python_pool.size)
+            preload: Modules imported by each worker, as "name" or "name as alias" (defaults to tools.python_pool.preload)
+            max_calls: Snippets a worker runs before it is replaced (defaults to tools.python_pool.max_calls)
+            memory_limit_mb: Address-space limit per worker, 0 for none (defaults to tools.python_pool.memory_limit_mb)
+            timeout: Default per-snippet timeout in seconds (defaults to tools.python_pool.timeout)
+            max_output_bytes: Characters of stdout and of stderr kept per snippet (defaults to tools.subprocess.max_output_bytes)
+            startup_timeout: Seconds a worker may take to import its preload modules
+        """
+        pool_config = config.get("tools.python_pool", {}) or {}
+        self.enabled = bool(pool_config.get("enabled", True))
+        self.size = size or int(pool_config.get("size", 2))
+        self.preload = preload if preload is not None else list(pool_config.get("preload", []))
+        self.max_calls = max_calls or int(pool_config.get("max_calls", 100))
+        self.memory_limit_mb = memory_limit_mb if memory_limit_mb is not None else int(pool_config.get("memory_limit_mb", 0))
+        self.timeout = timeout or float(pool_config.get("timeout", 30))
+        self.max_output_bytes = max_output_bytes or int(config.get("tools.subprocess.max_output_bytes", 1048576))
+        self.startup_timeout = startup_timeout or float(pool_config.get("startup_timeout", 60))
+        self._idle: List[PythonWorker] = []
+        self._total = 0
+        self._cond = threading.Condition()
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.stats = {"calls": 0, "started": 0, "recycled": 0, "timed_out": 0, "crashed": 0, "cancelled": 0}
+
+    def _options(self) -> Dict[str, Any]:
+        return {
+            "preload": self.preload,
+            "memory_limit_mb": self.memory_limit_mb,
+            "max_output_bytes": self.max_output_bytes,
+        }
+
+    def _start_worker(self) -> PythonWorker:
+        """Start a worker for a slot already reserved in _total"""
+        try:
+            worker = PythonWorker(self._options(), self.startup_timeout)
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self.stats["started"] += 1
+        return worker
+
+    def _checkout(self) -> PythonWorker:
+        """Take an idle worker, start one if below size, or wait for one to be returned"""
+        with self._cond:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.alive:
+                        return worker
+                    worker.close()
+                    self._total -= 1
+                    self.stats["crashed"] += 1
+                if self._total < self.size:
+                    self._total += 1
+                    break
+                self._cond.wait()
+        return self._start_worker()
+
+    def _replenish(self):
+        """Start an idle worker in place of a retired one"""
+        with self._cond:
+            if self._total >= self.size:
+                return
+            self._total += 1
+        try:
+            worker = self._start_worker()
+        except Exception as e:
+            logger.warning(f"Failed to start replacement Python worker: {e}")
+            return
+        with self._cond:
+            self._idle.append(worker)
+            self._cond.notify()
+
+    def _checkin(self, worker: PythonWorker, retire: bool):
+        """Return a worker to the pool, or replace it"""
+        if not retire and worker.alive and worker.calls < self.max_calls:
+            with self._cond:
+                self._idle.append(worker)
+                self._cond.notify()
+            return
+        worker.close()
+        with self._cond:
+            self._total -= 1
+            self.stats["recycled"] += 1
+            self._cond.notify()
+        threading.Thread(target=self._replenish, name="AutoAgentPythonWarmup", daemon=True).start()
+
+    def run(
+        self,
+        code: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str, str], Any]] = None,
+    ) -> ProcessResult:
+        """
+        Run a snippet on a warm worker, blocking until it finishes
+
+        Args:
+            code: Python source
+            timeout: Seconds before the worker is killed (defaults to the pool timeout)
+            on_output: Callback receiving (stream name, text) as output arrives, called on this thread
+
+        Returns:
+            Process result (exit code 1 with the traceback in stderr for uncaught exceptions)
+        """
+        return self._run(code, timeout, on_output, {})
+
+    def _run(
+        self,
+        code: str,
+        timeout: Optional[float],
+        on_output: Optional[Callable[[str, str], Any]],
+        call: Dict[str, Any],
+    ) -> ProcessResult:
+        """
+        Run a snippet, sharing its state with a canceller
+
+        Args:
+            code: Python source
+            timeout: Seconds before the worker is killed (defaults to the pool timeout)
+            on_output: Output callback
+            call: State shared under the pool lock: "worker" while the snippet
+                runs, "cancelled" once the caller gave up
+
+        Returns:
+            Process result
+        """
+        timeout = timeout or self.timeout
+        worker = self._checkout()
+        started = time.monotonic()
+        reply = None
+        with self._cond:
+            call["worker"] = worker
+            cancelled = call.get("cancelled", False)
+        ran = not cancelled
+        try:
+            if ran:
+                reply = worker.execute(code, timeout, on_output)
+        finally:
+            with self._cond:
+                del call["worker"]
+                cancelled = call.get("cancelled", False)
+            # A worker the canceller may have killed is never reused
+            self._checkin(worker, retire=ran and (cancelled or reply is None or reply.get("recycle", False)))
+        with self._cond:
+            self.stats["calls"] += 1
+            if cancelled:
+                self.stats["cancelled"] += 1
+            elif reply is None:
+                self.stats["timed_out" if worker.timed_out else "crashed"] += 1
+        duration = time.monotonic() - started
+        if cancelled:
+            return ProcessResult(worker.process.returncode, "", "Cancelled", duration=duration, timeout=timeout)
+        if reply is None:
+            if worker.timed_out:
+                return ProcessResult(worker.process.returncode, "", "", timed_out=True, duration=duration, timeout=timeout)
+            return ProcessResult(worker.process.returncode, "", "Python worker exited unexpectedly", duration=duration)
+        return ProcessResult(
+            reply["exit_code"],
+            reply["stdout"],
+            reply["stderr"],
+            truncated_bytes=reply["truncated"],
+            duration=duration,
+            timeout=timeout,
+        )
+
+    async def arun(
+        self,
+        code: str,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str, str], Any]] = None,
+    ) -> ProcessResult:
+        """
+        Run a snippet on a warm worker without blocking the event loop
+
+        Args:
+            code: Python source
+            timeout: Seconds before the worker is killed (defaults to the pool timeout)
+            on_output: Callback receiving (stream name, text) as output arrives, called on the event loop; may be async
+
+        Returns:
+            Process result
+
+        Raises:
+            asyncio.CancelledError: If the caller is cancelled; the snippet's worker is killed and replaced
+        """
+        with self._cond:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.size,
+                    thread_name_prefix="AutoAgentPython"
+                )
+            executor = self._executor
+        loop = asyncio.get_running_loop()
+        forward = None
+        if on_output is not None:
+            def forward(stream: str, text: str):
+                asyncio.run_coroutine_threadsafe(SubprocessEngine._emit(on_output, stream, text), loop)
+        call: Dict[str, Any] = {}
+        try:
+            return await loop.run_in_executor(executor, self._run, code, timeout, forward, call)
+        except asyncio.CancelledError:
+            with self._cond:
+                call["cancelled"] = True
+                if "worker" in call:
+                    call["worker"].kill()
+            raise
+
+    def warm(self):
+        """Start workers until the pool is full"""
+        threads = [threading.Thread(target=self._replenish, daemon=True) for _ in range(self.size)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def shutdown(self):
+        """Stop idle workers (workers are started again on the next call)"""
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._total -= len(idle)
+        for worker in idle:
+            worker.close()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get pool statistics
+
+        Returns:
+            Pool size, worker counts and call counters
+        """
+        with self._cond:
+            return {"size": self.size, "workers": self._total, "idle": len(self._idle), **self.stats}
+
+
+# Global Python worker pool (workers start on first use)
+python_worker_pool = PythonWorkerPool()
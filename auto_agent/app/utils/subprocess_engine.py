@@ -0,0 +1,261 @@
+"""
+Subprocess Engine
+Runs commands as asyncio subprocesses with streamed output, timeouts, output caps and process-group cleanup
+"""
+
+import asyncio
+import codecs
+import inspect
+import os
+import signal
+import subprocess
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Sequence, Union
+
+from ..config import config
+from .logger import global_logger as logger
+
+
+class ProcessResult:
+    """Outcome of a finished, timed-out or truncated subprocess"""
+
+    def __init__(
+        self,
+        returncode: Optional[int],
+        stdout: str,
+        stderr: str,
+        timed_out: bool = False,
+        truncated_bytes: int = 0,
+        duration: float = 0.0,
+        timeout: Optional[float] = None,
+    ):
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr = stderr
+        self.timed_out = timed_out
+        self.truncated_bytes = truncated_bytes
+        self.duration = duration
+        self.timeout = timeout
+
+    def format(self) -> str:
+        """
+        Format the result as tool output
+
+        Returns:
+            Exit code, output and error text, followed by timeout/truncation notes
+        """
+        text = f"Exit code: {self.returncode}\nOutput: {self.stdout}\nError: {self.stderr}"
+        if self.timed_out:
+            text += f"\n[Timed out after {self.timeout}s; the process group was killed]"
+        if self.truncated_bytes:
+            text += f"\n[Output truncated: {self.truncated_bytes} bytes omitted]"
+        return text
+
+    def __repr__(self) -> str:
+        return f"ProcessResult(returncode={self.returncode}, timed_out={self.timed_out})"
+
+
+class SubprocessEngine:
+    """
+    Asyncio subprocess runner shared by the command and script tools
+
+    Each process runs in its own process group (session) so that a timeout
+    or cancellation kills everything it spawned. Output is read from both
+    pipes while the process runs, forwarded to an optional callback and kept
+    up to a byte cap; the rest is drained and counted so the process never
+    blocks on a full pipe. A process-wide slot count bounds how many
+    subprocesses run at once across all event loops.
+    """
+
+    READ_SIZE = 4096
+    # Seconds to wait for the pipes to close after killing a process group
+    KILL_DRAIN_TIMEOUT = 2.0
+
+    def __init__(
+        self,
+        max_parallel: Optional[int] = None,
+        timeout: Optional[float] = None,
+        max_output_bytes: Optional[int] = None,
+    ):
+        """
+        Initialize the engine
+
+        Args:
+            max_parallel: Maximum concurrent subprocesses (defaults to tools.subprocess.max_parallel)
+            timeout: Default timeout in seconds (defaults to tools.subprocess.timeout)
+            max_output_bytes: Bytes of stdout+stderr kept per process (defaults to tools.subprocess.max_output_bytes)
+        """
+        engine_config = config.get("tools.subprocess", {}) or {}
+        self.max_parallel = max_parallel or int(engine_config.get("max_parallel", 4))
+        self.timeout = timeout or float(engine_config.get("timeout", 120))
+        self.max_output_bytes = max_output_bytes or int(engine_config.get("max_output_bytes", 1048576))
+        self._slots = threading.BoundedSemaphore(self.max_parallel)
+        self._lock = threading.Lock()
+        self.stats = {"started": 0, "running": 0, "timed_out": 0, "cancelled": 0, "truncated": 0}
+
+    async def _acquire_slot(self):
+        """Wait without blocking the event loop until a process slot is free"""
+        while not self._slots.acquire(blocking=False):
+            await asyncio.sleep(0.02)
+
+    def _count(self, key: str, delta: int = 1):
+        with self._lock:
+            self.stats[key] += delta
+
+    @staticmethod
+    def _kill_group(process: asyncio.subprocess.Process):
+        """Kill the process and every process in its group"""
+        try:
+            if os.name == "posix":
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+        except (ProcessLookupError, PermissionError):
+            pass
+
+    async def _reap(self, process: asyncio.subprocess.Process, waiter: asyncio.Future):
+        """Kill the process group and let the pipes drain so their transports close"""
+        self._kill_group(process)
+        _, pending = await asyncio.wait({waiter}, timeout=self.KILL_DRAIN_TIMEOUT)
+        if pending:
+            # A process outside the group still holds the pipes open
+            waiter.cancel()
+
+    @staticmethod
+    async def _emit(on_output: Callable[[str, str], Any], stream: str, text: str):
+        """Forward output to a sync or async callback; callback errors do not stop the process"""
+        try:
+            result = on_output(stream, text)
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.warning(f"Subprocess output callback failed: {e}")
+
+    async def _pump(
+        self,
+        reader: asyncio.StreamReader,
+        stream: str,
+        buffers: Dict[str, bytearray],
+        state: Dict[str, int],
+        on_output: Optional[Callable[[str, str], Any]],
+    ):
+        """Read one pipe until EOF, keeping output within the shared byte cap"""
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        while True:
+            data = await reader.read(self.READ_SIZE)
+            if not data:
+                break
+            kept = data[: max(0, self.max_output_bytes - state["kept"])]
+            state["kept"] += len(kept)
+            state["dropped"] += len(data) - len(kept)
+            buffers[stream] += kept
+            if kept and on_output is not None:
+                text = decoder.decode(kept)
+                if text:
+                    await self._emit(on_output, stream, text)
+
+    async def run(
+        self,
+        command: Union[str, Sequence[str]],
+        cwd: Optional[str] = None,
+        timeout: Optional[float] = None,
+        on_output: Optional[Callable[[str, str], Any]] = None,
+        env: Optional[Dict[str, str]] = None,
+    ) -> ProcessResult:
+        """
+        Run a command and collect its output
+
+        Args:
+            command: Shell command string, or argument list run without a shell
+            cwd: Working directory
+            timeout: Seconds before the process group is killed (defaults to the engine timeout)
+            on_output: Callback receiving (stream name, text) as output arrives; may be async
+            env: Environment for the process
+
+        Returns:
+            Process result
+
+        Raises:
+            asyncio.CancelledError: If the caller is cancelled; the process group is killed first
+        """
+        timeout = timeout or self.timeout
+        await self._acquire_slot()
+        try:
+            return await self._run(command, cwd, timeout, on_output, env)
+        finally:
+            self._slots.release()
+
+    async def _run(self, command, cwd, timeout, on_output, env) -> ProcessResult:
+        kwargs: Dict[str, Any] = {
+            "stdin": subprocess.DEVNULL,
+            "stdout": subprocess.PIPE,
+            "stderr": subprocess.PIPE,
+            "cwd": cwd,
+            "env": env,
+        }
+        if os.name == "posix":
+            kwargs["start_new_session"] = True
+        else:
+            kwargs["creationflags"] = subprocess.CREATE_NEW_PROCESS_GROUP
+        started = time.monotonic()
+        if isinstance(command, str):
+            process = await asyncio.create_subprocess_shell(command, **kwargs)
+        else:
+            process = await asyncio.create_subprocess_exec(*command, **kwargs)
+        self._count("started")
+        self._count("running")
+
+        buffers = {"stdout": bytearray(), "stderr": bytearray()}
+        state = {"kept": 0, "dropped": 0}
+        pumps = [
+            asyncio.ensure_future(self._pump(process.stdout, "stdout", buffers, state, on_output)),
+            asyncio.ensure_future(self._pump(process.stderr, "stderr", buffers, state, on_output)),
+        ]
+        waiter = asyncio.gather(*pumps, process.wait())
+        timed_out = False
+        try:
+            done, _ = await asyncio.wait({waiter}, timeout=timeout)
+            if done:
+                waiter.result()
+            else:
+                timed_out = True
+                self._count("timed_out")
+                logger.warning(f"Subprocess {process.pid} timed out after {timeout}s, killing its process group")
+                await self._reap(process, waiter)
+        except asyncio.CancelledError:
+            self._count("cancelled")
+            await self._reap(process, waiter)
+            raise
+        finally:
+            self._count("running", -1)
+        if state["dropped"]:
+            self._count("truncated")
+        return ProcessResult(
+            process.returncode,
+            buffers["stdout"].decode("utf-8", errors="replace"),
+            buffers["stderr"].decode("utf-8", errors="replace"),
+            timed_out=timed_out,
+            truncated_bytes=state["dropped"],
+            duration=time.monotonic() - started,
+            timeout=timeout,
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        """
+        Get engine statistics
+
+        Returns:
+            Limits and process counters
+        """
+        with self._lock:
+            return {
+                "max_parallel": self.max_parallel,
+                "timeout": self.timeout,
+                "max_output_bytes": self.max_output_bytes,
+                **self.stats,
+            }
+
+
+# Global subprocess engine instance
+subprocess_engine = SubprocessEngine()
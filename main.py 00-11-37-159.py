@@ -1,7 +1,17 @@
 import requests
+import hashlib
 import json
+import math
+import os
+import queue
+import re
+import sqlite3
 import time
-from typing import List, Dict, Optional, Generator
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import List, Dict, Optional, Generator, Callable, Iterable, Iterator
 from skills_loader import list_skills, format_skills_system_prompt, get_skill_content, match_skills_by_tags, SkillMetadata
 
 # ===================== 全局配置 =====================
@@ -23,25 +33,88 @@ DEEPSEEK_HEADERS = {
 OLLAMA_API_URL = "http://localhost:11434/api/chat"
 OLLAMA_MODEL = "qwen3:8b"
 
+# 调度配置（子任务按依赖关系并发执行）
+MAX_WORKERS = 4  # 同时执行的子任务上限
+PROVIDER_MAX_CONCURRENCY = {  # 各模型提供方的并发上限，未配置的提供方只受 MAX_WORKERS 限制
+    "deepseek": 4,
+    "ollama": 1,  # 本地模型通常只能串行推理
+}
+SCHEDULE_MODE = "critical_path"  # 可选 "fifo"（按拆解顺序）或 "critical_path"（下游工作量大的就绪任务优先）
+AGENT_ROLE_WEIGHT = 1.0  # 分配子Agent时角色一致的加分（标签按逆文档频率加权，每个命中标签至少 1 分）
+UPSTREAM_RESULT_MAX_TOKENS = 1500  # 注入下游任务提示词的每个上游结果的 token 上限，超出部分截断
+
+# 推测执行配置（上游任务流式输出达到一定进度时，用空闲名额提前启动下游任务，上游完成后校验）
+SPECULATE_ENABLED = False  # 默认关闭；仅在流式调用且 MAX_WORKERS > 1 时生效
+SPECULATE_START_RATIO = 0.8  # 上游输出达到预期输出 token 数的该比例时启动推测
+SPECULATE_SIMILARITY_THRESHOLD = 0.7  # 上游最终结果与推测快照的相似度（字符 bigram Jaccard）不低于该值则采用推测结果
+
+# 耗时估算配置（critical_path 模式冷启动时使用，之后由历史耗时持续校正）
+COST_STATS_PATH = "./workspace/status/task_cost_stats.json"
+BASE_LATENCY_SEC = 1.0  # 首字延迟
+PREFILL_SEC_PER_TOKEN = 0.0005  # 每个提示词 token 的预填充耗时
+DECODE_SEC_PER_TOKEN = 0.03  # 每个输出 token 的解码耗时
+DEFAULT_OUTPUT_TOKENS = 800  # 无历史数据时的预期输出 token 数
+
+# 需求拆解配置
+DECOMPOSE_STREAM = True  # 流式拆解：每解析出一个子任务即开始调度，无依赖的任务在模型输出剩余计划时已开始执行
+PARSE_MAX_RETRIES = 2  # 拆解结果无法解析时的重新提问次数
+
+# 结果整合配置（子任务结果过多时分组摘要、逐层合并）
+INTEGRATE_FINAL_BUDGET = 6000  # 最终整合调用中子任务结果的 token 上限，未超出时直接整合
+INTEGRATE_GROUP_BUDGET = 8000  # 每次摘要调用的输入 token 上限
+INTEGRATE_LEVEL_BUDGETS = [1500, 800, 500]  # 第 1/2/3... 层每份摘要的目标 token 数，层数超出时沿用最后一项
+INTEGRATE_GROUP_BY = "subtree"  # 首层分组方式："subtree"（依赖子树）或 "tag"（首个标签）
+
+# 子任务结果缓存配置（相同提示词与上游结果的子任务直接复用结果）
+TASK_CACHE_ENABLED = True
+TASK_CACHE_PATH = "./workspace/cache/task_results.sqlite"
+TASK_CACHE_MAX_ENTRIES = 2000  # 超出后按最近访问时间淘汰
+TASK_CACHE_TTL_SEC = 7 * 24 * 3600  # 条目有效期
+
+# 计划缓存配置（相同需求直接复用拆解计划，相似需求以已有计划为模板修改）
+PLAN_CACHE_ENABLED = True
+PLAN_CACHE_PATH = "./workspace/cache/plan_cache.json"
+PLAN_CACHE_MAX_ENTRIES = 500  # 超出后按最近使用时间淘汰
+PLAN_SIMILARITY_THRESHOLD = 0.5  # 近似匹配的最低相似度（MinHash 估计的 Jaccard 相似度）
+MINHASH_NUM_PERM = 64  # MinHash 签名长度
+PLAN_LSH_BANDS = 16  # LSH 分桶数，需整除 MINHASH_NUM_PERM
+
+# 子Agent池配置（进程内跨多次运行复用同角色同标签的子Agent）
+SUB_AGENT_POOL_ENABLED = True  # False 时每个 MasterAgent 使用独立的子Agent池
+SUB_AGENT_POOL_MAX_SIZE = 256  # 超出后按最近使用时间淘汰
+SUB_AGENT_POOL_IDLE_SEC = 30 * 60  # 空闲超过该时长的子Agent被淘汰
+
+# 运行日志配置（计划、子任务结果、整合阶段逐条落盘，中断后可 resume）
+RUN_JOURNAL_DIR = "./workspace/status/runs"
+FAILED_RESULT_PREFIXES = ("DeepSeek调用失败：", "Ollama调用失败：", "不支持的模型类型：", "子任务执行失败：", "无可用子Agent")  # 视为失败、恢复时需重跑的结果
+
 # ===================== 工具类：大模型调用封装（支持流式+非流式） =====================
 class LLMClient:
     """所有Agent统一调用大模型的封装类，支持本地Ollama和远程DeepSeek，兼容流式/非流式输出"""
     @staticmethod
-    def chat(messages: List[Dict], temperature: float = 0.7, stream: bool = DEFAULT_STREAM) -> str | Generator[str, None, None]:
+    def chat(messages: List[Dict], temperature: float = 0.7, stream: bool = DEFAULT_STREAM, model_type: Optional[str] = None) -> str | Generator[str, None, None]:
         """
         统一调用入口：stream=True返回生成器（流式），stream=False返回字符串（非流式）
         :param messages: 对话消息列表
         :param temperature: 生成随机性
         :param stream: 是否开启流式输出
+        :param model_type: 模型提供方（默认使用全局 MODEL_TYPE）
         :return: 字符串（非流式）或生成器（流式）
         """
-        if MODEL_TYPE == "deepseek":
+        model_type = model_type or MODEL_TYPE
+        if model_type == "deepseek":
             return LLMClient._chat_deepseek(messages, temperature, stream)
-        elif MODEL_TYPE == "ollama":
+        elif model_type == "ollama":
             return LLMClient._chat_ollama(messages, temperature, stream)
         else:
-            return f"不支持的模型类型：{MODEL_TYPE}"
+            return f"不支持的模型类型：{model_type}"
     
+    @staticmethod
+    def model_name(model_type: Optional[str] = None) -> str:
+        """获取模型提供方对应的模型名"""
+        model_type = model_type or MODEL_TYPE
+        return {"deepseek": DEEPSEEK_MODEL, "ollama": OLLAMA_MODEL}.get(model_type, model_type)
+
     @staticmethod
     def _chat_deepseek(messages: List[Dict], temperature: float = 0.7, stream: bool = False) -> str | Generator[str, None, None]:
         """DeepSeek 流式/非流式调用（SSE 格式响应）"""
@@ -123,6 +196,118 @@ class LLMClient:
                 return error_gen()
             return error_msg
 
+# ===================== 子任务结果缓存（内容寻址） =====================
+class TaskResultCache:
+    """
+    子任务结果缓存：以 (模型, 温度, 任务提示词, 技能提示词, 上游结果) 的哈希为键，SQLite 落盘，LRU + TTL 淘汰
+    上游结果参与哈希，修改某个任务只会使该任务及其下游失效，其余任务继续命中
+    :param path: SQLite 文件路径
+    :param max_entries: 最大条目数，超出后按最近访问时间淘汰
+    :param ttl: 条目有效期（秒），None 表示不过期
+    """
+    def __init__(self, path: str = TASK_CACHE_PATH, max_entries: int = TASK_CACHE_MAX_ENTRIES, ttl: Optional[float] = TASK_CACHE_TTL_SEC):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS task_cache ("
+            "key TEXT PRIMARY KEY, task_id TEXT, result TEXT, created_at REAL, accessed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_task_cache_accessed ON task_cache (accessed_at)")
+        self._conn.commit()
+        self.reset_stats()
+
+    @staticmethod
+    def make_key(model: str, temperature: float, prompt: str, skills_prompt: str, upstream: Dict[str, str]) -> str:
+        """
+        计算缓存键
+        :param model: 模型标识（提供方:模型名）
+        :param temperature: 生成温度
+        :param prompt: 任务提示词（定制化模板渲染结果，不含技能提示）
+        :param skills_prompt: 技能提示词
+        :param upstream: {依赖任务ID: 依赖任务结果}
+        :return: sha256 十六进制摘要
+        """
+        payload = {
+            "model": model,
+            "temperature": temperature,
+            "prompt": prompt,
+            "skills_prompt": skills_prompt,
+            "upstream": sorted((dep, hashlib.sha256(result.encode("utf-8")).hexdigest()) for dep, result in upstream.items()),
+        }
+        return hashlib.sha256(json.dumps(payload, ensure_ascii=False, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def reset_stats(self):
+        """重置本次运行的命中统计"""
+        with self._lock:
+            self.hits: List[str] = []
+            self.misses: List[str] = []
+
+    def get(self, key: str, task_id: str = "") -> Optional[str]:
+        """
+        查询缓存，过期条目视为未命中并删除
+        :param key: 缓存键
+        :param task_id: 子任务ID（仅用于统计）
+        :return: 缓存结果，未命中返回 None
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT result, created_at FROM task_cache WHERE key = ?", (key,)).fetchone()
+            if row and self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM task_cache WHERE key = ?", (key,))
+                self._conn.commit()
+                row = None
+            if not row:
+                self.misses.append(task_id)
+                return None
+            self._conn.execute("UPDATE task_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits.append(task_id)
+            return row[0]
+
+    def put(self, key: str, result: str, task_id: str = ""):
+        """
+        写入缓存并按 LRU 淘汰超出上限的条目
+        :param key: 缓存键
+        :param result: 子任务结果
+        :param task_id: 子任务ID
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO task_cache (key, task_id, result, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, task_id, result, now, now),
+            )
+            self._conn.execute(
+                "DELETE FROM task_cache WHERE key IN (SELECT key FROM task_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def report(self) -> Dict:
+        """本次运行的命中统计"""
+        with self._lock:
+            total = len(self.hits) + len(self.misses)
+            return {
+                "hits": len(self.hits),
+                "misses": len(self.misses),
+                "hit_rate": len(self.hits) / total if total else 0.0,
+                "hit_tasks": list(self.hits),
+            }
+
+    def print_report(self):
+        """打印本次运行的命中统计"""
+        stats = self.report()
+        total = stats["hits"] + stats["misses"]
+        if not total:
+            return
+        print(f"\n===== 子任务缓存：命中 {stats['hits']}/{total}（{stats['hit_rate'] * 100:.1f}%） =====")
+        if stats["hit_tasks"]:
+            print(f"命中任务：{', '.join(stats['hit_tasks'])}")
+
 # ===================== 子Agent类（支持流式执行） =====================
 class SubAgent:
     """
@@ -132,44 +317,102 @@ class SubAgent:
     :param ability_tags: 能力标签
     :param prompt_template: 定制化Prompt模板
     :param skills: 该Agent可用的技能列表
+    :param model_type: 该Agent使用的模型提供方（用于按提供方限制并发）
+    子Agent可能经子Agent池被多个 MasterAgent 共享，结果缓存由调用方在每次执行时传入，不保存在子Agent上
     """
-    def __init__(self, agent_id: str, role: str, ability_tags: List[str], prompt_template: str, skills: Optional[List[SkillMetadata]] = None):
+    def __init__(self, agent_id: str, role: str, ability_tags: List[str], prompt_template: str, skills: Optional[List[SkillMetadata]] = None, model_type: str = MODEL_TYPE):
         self.agent_id = agent_id
         self.role = role
         self.ability_tags = ability_tags
         self.prompt_template = prompt_template
         self.skills = skills or []
+        self.model_type = model_type
+        self.temperature = 0.6
+        self.skills_prompt = format_skills_system_prompt(self.skills) if self.skills else ""  # 技能提示词只构建一次
         self.llm = LLMClient()
 
-    def execute_task(self, task: Dict, stream: bool = DEFAULT_STREAM) -> str:
+    def _render_prompt(self, task: Dict) -> tuple:
         """
-        执行子任务：支持流式输出（实时打印），返回完整结果
+        渲染子任务提示词
         :param task: 子任务字典
-        :param stream: 是否开启流式输出
-        :return: 子任务完整执行结果
+        :return: (技能提示词, 定制化模板渲染结果)
         """
-        # 替换Prompt模板变量
-        final_prompt = self.prompt_template.format(
+        # 替换Prompt模板变量；核心执行要求随任务变化，按任务渲染（子Agent经池跨运行复用）
+        task_prompt = self.prompt_template.format(
             task_name=task["name"],
             task_goal=task["goal"],
             task_input=task["input"],
-            task_output=task["output"]
+            task_output=task["output"],
+            task_core_requirements=task.get("core_requirements") or "无"
         )
-        
-        # 添加技能系统提示
-        skills_prompt = ""
-        if self.skills:
-            skills_prompt = format_skills_system_prompt(self.skills)
-            final_prompt = skills_prompt + "\n" + final_prompt
-        
+        return self.skills_prompt, task_prompt
+
+    def build_prompt(self, task: Dict, upstream: Optional[Dict[str, str]] = None) -> str:
+        """
+        生成子任务的最终提示词（技能提示 + 定制化模板 + 上游任务结果）
+        :param task: 子任务字典
+        :param upstream: {依赖任务ID: 结果}，作为本任务的输入附在提示词末尾（推测执行时为上游的部分输出）
+        :return: 最终提示词
+        """
+        skills_prompt, task_prompt = self._render_prompt(task)
+        prompt = skills_prompt + "\n" + task_prompt if skills_prompt else task_prompt
+        if upstream:
+            details = "\n\n".join(
+                f"任务{dep}：\n{ResultIntegrator._split_text(result, UPSTREAM_RESULT_MAX_TOKENS)[0]}"
+                for dep, result in sorted(upstream.items())
+            )
+            prompt += f"\n上游任务结果（本任务依赖的前置任务输出）：\n{details}"
+        return prompt
+
+    def cache_key(self, task: Dict, upstream: Optional[Dict[str, str]] = None) -> str:
+        """
+        计算子任务的结果缓存键
+        :param task: 子任务字典
+        :param upstream: {依赖任务ID: 结果}
+        :return: 缓存键
+        """
+        skills_prompt, task_prompt = self._render_prompt(task)
+        model = f"{self.model_type}:{LLMClient.model_name(self.model_type)}"
+        return TaskResultCache.make_key(model, self.temperature, task_prompt, skills_prompt, upstream or {})
+
+    def execute_task(self, task: Dict, stream: bool = DEFAULT_STREAM, echo: bool = True, upstream: Optional[Dict[str, str]] = None,
+                     on_chunk: Optional[Callable[[str], None]] = None, cache: Optional[TaskResultCache] = None) -> str:
+        """
+        执行子任务：支持流式输出（实时打印），返回完整结果
+        :param task: 子任务字典
+        :param stream: 是否开启流式输出
+        :param echo: 是否实时打印输出（并发执行时关闭，避免多个任务输出交错）
+        :param upstream: {依赖任务ID: 结果}，写入提示词并参与缓存键计算，上游结果变化时本任务缓存失效
+        :param on_chunk: 流式输出回调，每收到一个文本块调用一次（用于调度器跟踪执行进度）
+        :param cache: 子任务结果缓存（None 则不读写缓存；推测执行基于未完成的上游结果，不读写缓存）
+        :return: 子任务完整执行结果
+        """
+        final_prompt = self.build_prompt(task, upstream)
+
+        # 命中缓存则直接复用结果
+        cache_key = None
+        if cache:
+            cache_key = self.cache_key(task, upstream)
+            cached = cache.get(cache_key, task["task_id"])
+            if cached is not None:
+                if echo:
+                    print(f"♻️ 命中缓存，子任务输出：{cached[:60]}...")
+                return cached
+
         messages = [{"role": "user", "content": final_prompt}]
         
         # 调用大模型（流式/非流式）
-        result_gen = self.llm.chat(messages, temperature=0.6, stream=stream)
+        result_gen = self.llm.chat(messages, temperature=self.temperature, stream=stream, model_type=self.model_type)
         
         # 处理流式输出：实时打印 + 收集完整结果
         full_result = ""
-        if stream:
+        if not echo and stream and on_chunk:
+            for chunk in result_gen:
+                on_chunk(chunk)
+                full_result += chunk
+        elif not echo:
+            full_result = "".join(result_gen) if stream else result_gen
+        elif stream:
             print("子任务输出：", end="", flush=True)
             for chunk in result_gen:
                 print(chunk, end="", flush=True)
@@ -179,14 +422,1289 @@ class SubAgent:
             full_result = result_gen
             print(f"子任务输出：{full_result[:60]}...")
         
-        return full_result.strip()
+        full_result = full_result.strip()
+        if cache_key and not is_failed_result(full_result):
+            cache.put(cache_key, full_result, task["task_id"])
+        return full_result
+
+# ===================== 子Agent分配：标签倒排索引 =====================
+class AgentIndex:
+    """
+    子Agent倒排索引：标签 → 子Agent，分配时只访问任务标签对应的倒排列表
+    - 加权匹配：每个命中标签按逆文档频率加权（越少子Agent具备的标签越能说明专长），角色一致额外加分
+    - 负载均衡：得分相同时优先选择进行中任务最少的子Agent，再按注册顺序
+    - 无标签命中时回退到具备"通用"标签的子Agent
+    :param role_weight: 角色一致时的加分
+    """
+    def __init__(self, role_weight: float = AGENT_ROLE_WEIGHT):
+        self.role_weight = role_weight
+        self.agents: Dict[str, SubAgent] = {}
+        self.tag_index: Dict[str, set] = {}  # {标签: {agent_id}}
+        self.load: Dict[str, int] = {}  # {agent_id: 进行中的任务数}
+        self._order: Dict[str, int] = {}  # {agent_id: 注册序号}
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def add(self, agent: SubAgent):
+        """注册子Agent（同ID重复注册时先移除旧索引）"""
+        with self._lock:
+            self._remove(agent.agent_id)
+            self._seq += 1
+            self.agents[agent.agent_id] = agent
+            self._order[agent.agent_id] = self._seq
+            self.load.setdefault(agent.agent_id, 0)
+            for tag in set(agent.ability_tags):
+                self.tag_index.setdefault(tag, set()).add(agent.agent_id)
+
+    def remove(self, agent_id: str):
+        """移除子Agent"""
+        with self._lock:
+            self._remove(agent_id)
+
+    def _remove(self, agent_id: str):
+        agent = self.agents.pop(agent_id, None)
+        if not agent:
+            return
+        self._order.pop(agent_id, None)
+        self.load.pop(agent_id, None)
+        for tag in set(agent.ability_tags):
+            postings = self.tag_index.get(tag)
+            if postings:
+                postings.discard(agent_id)
+                if not postings:
+                    del self.tag_index[tag]
+
+    def _tag_weight(self, tag: str) -> float:
+        """标签权重：1 + ln(子Agent总数 / 具备该标签的子Agent数)"""
+        return 1.0 + math.log(len(self.agents) / len(self.tag_index[tag]))
+
+    def scores(self, task: Dict) -> Dict[str, float]:
+        """
+        计算候选子Agent的匹配得分
+        :param task: 子任务字典
+        :return: {agent_id: 得分}，仅包含至少命中一个标签（或回退到"通用"）的子Agent
+        """
+        with self._lock:
+            scores: Dict[str, float] = {}
+            for tag in set(task["tags"]):
+                if tag not in self.tag_index:
+                    continue
+                weight = self._tag_weight(tag)
+                for agent_id in self.tag_index[tag]:
+                    scores[agent_id] = scores.get(agent_id, 0.0) + weight
+            if not scores:
+                scores = {agent_id: 0.0 for agent_id in self.tag_index.get("通用", ())}
+            for agent_id in scores:
+                if self.agents[agent_id].role == task.get("role"):
+                    scores[agent_id] += self.role_weight
+            return scores
+
+    def best_match(self, task: Dict) -> Optional[SubAgent]:
+        """
+        为子任务选择得分最高的子Agent，同分时选负载最低者
+        :param task: 子任务字典
+        :return: 子Agent，无候选返回 None
+        """
+        scores = self.scores(task)
+        if not scores:
+            return None
+        with self._lock:
+            best = min(scores, key=lambda a: (-round(scores[a], 6), self.load.get(a, 0), self._order.get(a, 0)))
+            return self.agents.get(best)
+
+    def acquire(self, agent_id: str):
+        """子任务开始执行：记录负载"""
+        with self._lock:
+            if agent_id in self.load:
+                self.load[agent_id] += 1
+
+    def release(self, agent_id: str):
+        """子任务执行结束：释放负载"""
+        with self._lock:
+            if self.load.get(agent_id, 0) > 0:
+                self.load[agent_id] -= 1
+
+# ===================== 子Agent池：跨运行复用 =====================
+class SubAgentPool:
+    """
+    进程级子Agent池：按 (角色, 标签, 模型提供方, 技能源) 复用已构建的子Agent（含定制化模板与技能提示词），
+    长期运行的服务中重复角色的子Agent无需重新生成模板、匹配技能
+    :param max_size: 池中子Agent上限，超出后淘汰最久未使用者
+    :param idle_sec: 空闲超过该时长（秒）的子Agent被淘汰，None 表示不按空闲淘汰
+    """
+    def __init__(self, max_size: int = SUB_AGENT_POOL_MAX_SIZE, idle_sec: Optional[float] = SUB_AGENT_POOL_IDLE_SEC):
+        self.max_size = max_size
+        self.idle_sec = idle_sec
+        self._agents: "OrderedDict[tuple, SubAgent]" = OrderedDict()  # 按最近使用排序
+        self._last_used: Dict[tuple, float] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._agents)
+
+    def next_agent_id(self, role: str) -> str:
+        """生成池内唯一的子Agent ID"""
+        with self._lock:
+            self._seq += 1
+            return f"A_{role[:2].upper()}_{self._seq:03d}"
+
+    def evict_idle(self):
+        """淘汰空闲超时的子Agent"""
+        if self.idle_sec is None:
+            return
+        deadline = time.time() - self.idle_sec
+        with self._lock:
+            while self._agents:
+                key = next(iter(self._agents))
+                if self._last_used[key] > deadline:
+                    break
+                self._pop(key)
+
+    def _pop(self, key: tuple):
+        self._agents.pop(key, None)
+        self._last_used.pop(key, None)
+        self.evictions += 1
+
+    def get_or_create(self, key: tuple, factory: Callable[[], SubAgent]) -> tuple:
+        """
+        获取子Agent，不存在时调用 factory 构建并放入池中
+        :param key: 池键
+        :param factory: 子Agent构建函数
+        :return: (子Agent, 是否新建)
+        """
+        self.evict_idle()
+        with self._lock:
+            agent = self._agents.get(key)
+            if agent:
+                self._agents.move_to_end(key)
+                self._last_used[key] = time.time()
+                self.hits += 1
+                return agent, False
+        # 构建在锁外进行（可能匹配大量技能），并发构建同一键时以先写入者为准
+        agent = factory()
+        with self._lock:
+            existing = self._agents.get(key)
+            if existing:
+                self.hits += 1
+                return existing, False
+            self._agents[key] = agent
+            self._last_used[key] = time.time()
+            self.misses += 1
+            while len(self._agents) > self.max_size:
+                self._pop(next(iter(self._agents)))
+            return agent, True
+
+    def clear(self):
+        """清空子Agent池"""
+        with self._lock:
+            self._agents.clear()
+            self._last_used.clear()
+
+
+SUB_AGENT_POOL = SubAgentPool()  # 进程内共享的子Agent池
+
+# ===================== 调度器：DAG 并发执行子任务 =====================
+class DAGExecutor:
+    """
+    DAG执行器：依赖就绪的子任务立即并发派发到有界线程池，某任务完成后立刻启动其已就绪的下游任务
+    :param max_workers: 全局最大并发子任务数
+    :param provider_limits: 各模型提供方的最大并发数，如 {"deepseek": 4, "ollama": 1}
+    :param speculate: 是否推测执行：上游任务流式输出达到预期进度时，用空闲名额基于部分结果提前启动下游任务
+    :param speculate_start_ratio: 上游输出达到预期输出 token 数的该比例时允许推测
+    :param speculate_threshold: 上游最终结果与推测时快照的相似度不低于该值时采用推测结果，否则作废并重新执行
+    :param cache: 子任务结果缓存（None 则不缓存），每次执行时传给子Agent
+    """
+    def __init__(self, max_workers: int = MAX_WORKERS, provider_limits: Optional[Dict[str, int]] = None,
+                 speculate: bool = False, speculate_start_ratio: float = SPECULATE_START_RATIO,
+                 speculate_threshold: float = SPECULATE_SIMILARITY_THRESHOLD, cache: Optional[TaskResultCache] = None):
+        self.max_workers = max(1, max_workers)
+        self.cache = cache
+        self.provider_limits = dict(PROVIDER_MAX_CONCURRENCY if provider_limits is None else provider_limits)
+        self.speculate = speculate
+        self.speculate_start_ratio = speculate_start_ratio
+        self.speculate_threshold = speculate_threshold
+        self.speculation = SpeculationStats()
+        self.tasks: List[Dict] = []  # 本次 run 实际收到的子任务（按到达顺序）
+        self.skipped: List[str] = []  # 复用已有结果、未重新执行的任务
+        self.timings: Dict[str, tuple] = {}  # {task_id: (开始时间, 结束时间)}，相对本次 run 开始
+        self.makespan = 0.0
+        self._print_lock = threading.Lock()
+
+    def _log(self, message: str):
+        """并发场景下串行化打印，避免多线程输出交错"""
+        with self._print_lock:
+            print(message, flush=True)
+
+    def _provider_has_slot(self, model_type: str, running_per_provider: Dict[str, int]) -> bool:
+        """判断提供方是否还有空闲并发名额"""
+        limit = self.provider_limits.get(model_type)
+        return limit is None or running_per_provider.get(model_type, 0) < limit
+
+    def _execute(self, task: Dict, agent: Optional[SubAgent], stream: bool, echo: bool, upstream: Dict[str, str],
+                 on_chunk: Optional[Callable[[str], None]] = None, cache: Optional[TaskResultCache] = None) -> str:
+        """工作线程内执行单个子任务，异常转为结果文本，保证下游任务仍可继续"""
+        if not agent:
+            return "无可用子Agent"
+        try:
+            return agent.execute_task(task, stream=stream, echo=echo, upstream=upstream, on_chunk=on_chunk, cache=cache)
+        except Exception as e:
+            return f"子任务执行失败：{str(e)}"
+
+    def _feed_tasks(self, tasks: Iterable[Dict], events: "queue.Queue"):
+        """在独立线程中消费任务来源（如流式拆解生成器），逐个投递到事件队列；结束事件标明来源是否完整读完"""
+        complete = False
+        try:
+            for task in tasks:
+                events.put(("task", task))
+            complete = True
+        except Exception as e:
+            self._log(f"警告：读取子任务失败：{str(e)}")
+        finally:
+            events.put(("end", complete))
+
+    def run(self, tasks: Iterable[Dict], assign_agent: Callable[[Dict], Optional[SubAgent]], stream: bool = DEFAULT_STREAM,
+            priorities: Optional[Dict[str, float]] = None,
+            on_task_added: Optional[Callable[[Dict], None]] = None,
+            on_task_done: Optional[Callable[[Dict, Optional[SubAgent], float, str], None]] = None,
+            on_task_started: Optional[Callable[[Dict, Optional[SubAgent]], None]] = None,
+            on_plan_complete: Optional[Callable[[List[Dict]], None]] = None,
+            lookup_completed: Optional[Callable[[Dict], Optional[str]]] = None,
+            expected_output_tokens: Optional[Callable[[Dict], float]] = None) -> Dict[str, str]:
+        """
+        按依赖关系并发执行所有子任务
+        :param tasks: 子任务列表，或逐个产出子任务的生成器（边拆解边执行）
+        :param assign_agent: 为子任务分配子Agent的函数
+        :param stream: 是否使用流式调用
+        :param priorities: {task_id: 优先级}，数值大的就绪任务先获得执行名额（None 则按到达顺序）；执行期间可被更新
+        :param on_task_added: 新任务到达回调，在调度线程中调用（可在此生成子Agent、更新优先级）
+        :param on_task_done: 任务完成回调 (task, agent, 耗时, 结果)
+        :param on_task_started: 任务派发回调 (task, agent)，在取得执行名额后调用（可在此记录子Agent负载）
+        :param on_plan_complete: 任务来源完整读完回调 (全部任务)，在所有任务的 on_task_added 之后、下一批任务派发之前调用
+        :param lookup_completed: 已有结果查询函数，返回非 None 的任务直接复用该结果、不再执行（用于恢复中断的运行）
+        :param expected_output_tokens: 子任务预期输出 token 数（推测执行据此判断上游进度，默认 DEFAULT_OUTPUT_TOKENS）
+        :return: {task_id: 执行结果}
+        """
+        events: queue.Queue = queue.Queue()
+        if isinstance(tasks, list):
+            for task in tasks:
+                events.put(("task", task))
+            events.put(("end", True))
+        else:
+            threading.Thread(target=self._feed_tasks, args=(tasks, events), daemon=True).start()
+
+        self.tasks = []
+        self.skipped = []
+        task_map: Dict[str, Dict] = {}
+        dependents: Dict[str, List[str]] = {}
+        waiting_deps: Dict[str, set] = {}
+        # 单线程时保留实时流式打印，多线程时改为任务完成后整体输出
+        echo = self.max_workers == 1
+        ready: List[str] = []
+        running: Dict[Future, tuple] = {}
+        running_per_provider: Dict[str, int] = {}
+        results: Dict[str, str] = {}
+        source_done = False
+        self.timings = {}
+        self.speculation = SpeculationStats()
+        run_started_at = time.time()
+        # 推测执行状态：上游部分输出、达到推测进度的上游、进行中的推测（按任务ID / 按 Future）
+        speculating = self.speculate and stream and not echo
+        partial: Dict[str, List[str]] = {}
+        progressed: set = set()
+        speculative: Dict[str, Dict] = {}
+        spec_running: Dict[Future, Dict] = {}
+        speculated: set = set()  # 每个任务只推测一次，作废后走正常流程
+
+        def track_progress(task: Dict) -> Callable[[str], None]:
+            """生成流式进度回调：输出达到预期进度时投递 progress 事件，触发下游推测"""
+            task_id = task["task_id"]
+            expected = expected_output_tokens(task) if expected_output_tokens else DEFAULT_OUTPUT_TOKENS
+            threshold = max(1.0, self.speculate_start_ratio * expected)
+            parts = partial.setdefault(task_id, [])
+            state = {"chars": 0, "next_check": threshold}
+
+            def on_chunk(chunk: str):
+                parts.append(chunk)
+                state["chars"] += len(chunk)
+                # token 数不超过字符数，字符数达到阈值后才估算 token
+                if task_id in progressed or state["chars"] < state["next_check"]:
+                    return
+                if estimate_tokens("".join(parts)) >= threshold:
+                    progressed.add(task_id)
+                    events.put(("progress", task_id))
+                else:
+                    state["next_check"] = state["chars"] * 1.25
+            return on_chunk
+
+        def finish(task_id: str, agent: Optional[SubAgent], started_at: float, finished_at: float, message: str):
+            """记录任务结果：耗时统计、完成回调、输出，并解锁下游任务"""
+            self.timings[task_id] = (started_at - run_started_at, finished_at - run_started_at)
+            if on_task_done:
+                on_task_done(task_map[task_id], agent, finished_at - started_at, results[task_id])
+            if not echo:
+                self._log(f"{message}：{task_id}（耗时 {finished_at - started_at:.1f}s）\n子任务输出：{results[task_id][:60]}...")
+            unlock(task_id)
+
+        def commit(task_id: str):
+            """上游均已完成且与推测快照足够相似：采用推测结果"""
+            spec = speculative.pop(task_id)
+            task = task_map[task_id]
+            results[task_id] = spec["result"]
+            saved = max(0.0, min(spec["validated_at"], spec["finished_at"]) - spec["started_at"])
+            self.speculation.commit(saved)
+            agent = spec["agent"]
+            if agent and self.cache and not is_failed_result(spec["result"]):
+                upstream = {dep: results[dep] for dep in task["dependencies"] if dep in results}
+                self.cache.put(agent.cache_key(task, upstream), spec["result"], task_id)
+            finish(task_id, agent, spec["started_at"], spec["finished_at"], f"✅ 采用推测结果（提前 {saved:.1f}s）")
+
+        def discard(task_id: str, reason: str):
+            """上游最终结果与推测快照差异过大：作废推测结果，任务按正常流程重新执行"""
+            spec = speculative.pop(task_id)
+            spec["discarded"] = True
+            if "result" in spec:
+                self.speculation.discard(spec["prompt"], spec["result"])
+            self._log(f"🔁 推测结果作废：{task_id}（{reason}）")
+
+        def unlock(done_id: str):
+            """任务有结果后，解锁依赖已全部满足的下游任务（有推测结果时等待或直接采用）"""
+            for child_id in dependents.get(done_id, []):
+                waiting_deps[child_id].discard(done_id)
+                if waiting_deps[child_id] or child_id in results:
+                    continue
+                spec = speculative.get(child_id)
+                if not spec:
+                    ready.append(child_id)
+                    continue
+                spec["validated_at"] = time.time()
+                if "result" in spec:
+                    commit(child_id)
+
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="SubAgentWorker") as pool:
+            while not source_done or running or spec_running:
+                # 取出所有已到达的事件后再统一派发，保证同批就绪任务按优先级排序
+                pending = [events.get()]
+                while not events.empty():
+                    pending.append(events.get_nowait())
+                for kind, payload in pending:
+                    if kind == "end":
+                        source_done = True
+                        if payload and on_plan_complete:
+                            on_plan_complete(self.tasks)
+                    elif kind == "progress":
+                        # 上游达到推测进度，在下方派发阶段尝试推测执行其下游
+                        continue
+                    elif kind == "done" and payload in spec_running:
+                        # 推测任务完成：已校验则采用，已作废则计入浪费，否则等待上游完成
+                        spec = spec_running.pop(payload)
+                        running_per_provider[spec["model_type"]] -= 1
+                        spec["result"] = payload.result()
+                        spec["finished_at"] = time.time()
+                        if spec.get("discarded"):
+                            self.speculation.discard(spec["prompt"], spec["result"])
+                        elif "validated_at" in spec:
+                            commit(spec["task_id"])
+                    elif kind == "task":
+                        # 1. 新任务到达：登记依赖，依赖已全部完成则直接就绪
+                        task_id = payload["task_id"]
+                        if task_id in task_map:
+                            self._log(f"警告：重复的任务ID {task_id}，已忽略")
+                            continue
+                        task_map[task_id] = payload
+                        self.tasks.append(payload)
+                        waiting_deps[task_id] = set(payload["dependencies"]) - set(results)
+                        for dep in waiting_deps[task_id]:
+                            dependents.setdefault(dep, []).append(task_id)
+                        if on_task_added:
+                            on_task_added(payload)
+                        previous = lookup_completed(payload) if lookup_completed else None
+                        if previous is not None:
+                            self._log(f"⏭️ 跳过已完成任务：{task_id} - {payload['name']}")
+                            results[task_id] = previous
+                            self.skipped.append(task_id)
+                            unlock(task_id)
+                        elif not waiting_deps[task_id]:
+                            ready.append(task_id)
+                    else:
+                        # 2. 任务完成：释放名额，并解锁其下游任务
+                        task_id, agent, model_type, started_at = running.pop(payload)
+                        finished_at = time.time()
+                        running_per_provider[model_type] -= 1
+                        results[task_id] = payload.result()
+                        progressed.discard(task_id)
+                        partial.pop(task_id, None)
+                        # 校验基于本任务部分结果启动的推测：差异过大则作废
+                        for child_id in dependents.get(task_id, []):
+                            spec = speculative.get(child_id)
+                            if spec and task_id in spec["snapshot"]:
+                                similarity = text_similarity(spec["snapshot"][task_id], results[task_id])
+                                if similarity < self.speculate_threshold:
+                                    discard(child_id, f"上游 {task_id} 相似度 {similarity:.2f}")
+                        finish(task_id, agent, started_at, finished_at, "✅ 完成任务")
+
+                # 3. 在全局与提供方并发上限内派发所有就绪任务（有优先级时高优先级先派发）
+                if priorities:
+                    ready.sort(key=lambda tid: -priorities.get(tid, 0.0))
+                for task_id in list(ready):
+                    if len(running) + len(spec_running) >= self.max_workers:
+                        break
+                    task = task_map[task_id]
+                    agent = assign_agent(task)
+                    model_type = agent.model_type if agent else MODEL_TYPE
+                    if not self._provider_has_slot(model_type, running_per_provider):
+                        continue
+                    ready.remove(task_id)
+                    running_per_provider[model_type] = running_per_provider.get(model_type, 0) + 1
+                    if on_task_started:
+                        on_task_started(task, agent)
+                    agent_info = f"🤖 {agent.agent_id} - {agent.role}" if agent else "⚠️ 无可用子Agent"
+                    self._log(f"\n📌 执行任务：{task_id} - {task['name']}（{agent_info}）")
+                    upstream = {dep: results[dep] for dep in task["dependencies"] if dep in results}
+                    on_chunk = track_progress(task) if speculating else None
+                    future = pool.submit(self._execute, task, agent, stream, echo, upstream, on_chunk, self.cache)
+                    running[future] = (task_id, agent, model_type, time.time())
+                    future.add_done_callback(lambda f: events.put(("done", f)))
+
+                # 4. 推测执行：仅使用剩余名额，未完成的上游均已达到推测进度时，基于其部分结果提前启动下游任务
+                if speculating and progressed:
+                    for task_id, deps in list(waiting_deps.items()):
+                        if len(running) + len(spec_running) >= self.max_workers:
+                            break
+                        if not deps or task_id in results or task_id in speculated or not deps <= progressed:
+                            continue
+                        task = task_map[task_id]
+                        agent = assign_agent(task)
+                        model_type = agent.model_type if agent else MODEL_TYPE
+                        if not agent or not self._provider_has_slot(model_type, running_per_provider):
+                            continue
+                        running_per_provider[model_type] = running_per_provider.get(model_type, 0) + 1
+                        snapshot = {dep: results[dep] if dep in results else "".join(partial.get(dep, [])) for dep in task["dependencies"]}
+                        speculated.add(task_id)
+                        spec = {"task_id": task_id, "agent": agent, "model_type": model_type, "snapshot": snapshot,
+                                "prompt": agent.build_prompt(task, snapshot), "started_at": time.time()}
+                        speculative[task_id] = spec
+                        self.speculation.launched += 1
+                        self._log(f"\n🔮 推测执行：{task_id} - {task['name']}（🤖 {agent.agent_id}，上游 {sorted(deps)} 仍在输出）")
+                        future = pool.submit(self._execute, task, agent, stream, False, snapshot)
+                        spec_running[future] = spec
+                        future.add_done_callback(lambda f: events.put(("done", f)))
+
+        self.makespan = time.time() - run_started_at
+        unfinished = [t["task_id"] for t in self.tasks if t["task_id"] not in results]
+        if unfinished:
+            print(f"警告：存在循环依赖或未知依赖，以下任务未执行：{unfinished}")
+        return results
+
+# ===================== 调度器：推测执行 =====================
+def text_similarity(a: str, b: str) -> float:
+    """文本相似度：字符 bigram 集合的 Jaccard 相似度"""
+    grams_a = {a[i:i + 2] for i in range(len(a) - 1)} or ({a} if a else set())
+    grams_b = {b[i:i + 2] for i in range(len(b) - 1)} or ({b} if b else set())
+    if not grams_a and not grams_b:
+        return 1.0
+    return len(grams_a & grams_b) / len(grams_a | grams_b)
+
+
+class SpeculationStats:
+    """推测执行统计：启动/采用/作废次数、作废浪费的 token 数、采用节省的时间"""
+    def __init__(self):
+        self.launched = 0
+        self.committed = 0
+        self.discarded = 0
+        self.wasted_tokens = 0
+        self.latency_saved = 0.0
+
+    def commit(self, saved: float):
+        """记录一次采用：saved 为推测启动至上游完成（或推测完成）之间提前的时长"""
+        self.committed += 1
+        self.latency_saved += saved
+
+    def discard(self, prompt: str, output: str):
+        """记录一次作废：提示词与输出的 token 均视为浪费"""
+        self.discarded += 1
+        self.wasted_tokens += estimate_tokens(prompt) + estimate_tokens(output)
+
+    def to_dict(self) -> Dict:
+        return {
+            "launched": self.launched,
+            "committed": self.committed,
+            "discarded": self.discarded,
+            "wasted_tokens": self.wasted_tokens,
+            "latency_saved_sec": round(self.latency_saved, 2),
+        }
+
+    def print_report(self):
+        print(f"\n===== 推测执行：启动 {self.launched}，采用 {self.committed}，作废 {self.discarded}；"
+              f"浪费约 {self.wasted_tokens} tokens，节省约 {self.latency_saved:.1f}s =====")
+
+
+# ===================== 调度器：关键路径优先级 =====================
+def estimate_tokens(text: str) -> int:
+    """粗略估算 token 数：中日韩字符约 1 字 1 token，其余字符约 4 字符 1 token"""
+    cjk = sum(1 for ch in text if "一" <= ch <= "鿿" or "぀" <= ch <= "ヿ" or "가" <= ch <= "힯")
+    return cjk + (len(text) - cjk) // 4 + 1
+
+
+class TaskCostModel:
+    """
+    子任务耗时估算模型：按提示词长度、预期输出 token 数估算耗时，并用各角色/标签的历史耗时持续校正
+    :param stats_path: 历史统计持久化路径（None 则仅保存在内存）
+    :param alpha: 历史统计的指数滑动平均系数
+    """
+    def __init__(self, stats_path: Optional[str] = COST_STATS_PATH, alpha: float = 0.3):
+        self.stats_path = stats_path
+        self.alpha = alpha
+        self.stats: Dict[str, Dict[str, float]] = {}  # {"role:xxx"/"tag:xxx": {"ratio", "output_tokens", "count"}}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """加载历史统计"""
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, "r", encoding="utf-8") as f:
+                self.stats = json.load(f)
+        except Exception as e:
+            print(f"警告：加载耗时统计失败：{str(e)}")
+
+    def save(self):
+        """持久化历史统计"""
+        if not self.stats_path:
+            return
+        os.makedirs(os.path.dirname(self.stats_path) or ".", exist_ok=True)
+        with self._lock:
+            with open(self.stats_path, "w", encoding="utf-8") as f:
+                json.dump(self.stats, f, ensure_ascii=False, indent=2)
+
+    @staticmethod
+    def _keys(task: Dict) -> List[str]:
+        """统计键：角色优先，其次各标签"""
+        return [f"role:{task.get('role', '')}"] + [f"tag:{tag}" for tag in task.get("tags", [])]
+
+    def _lookup(self, task: Dict, field: str) -> Optional[float]:
+        """按角色→标签均值的顺序查找历史统计"""
+        role_stat = self.stats.get(self._keys(task)[0])
+        if role_stat:
+            return role_stat[field]
+        tag_values = [self.stats[k][field] for k in self._keys(task)[1:] if k in self.stats]
+        return sum(tag_values) / len(tag_values) if tag_values else None
+
+    @staticmethod
+    def _formula_cost(prompt_tokens: int, output_tokens: float) -> float:
+        """冷启动估算：首字延迟 + 预填充耗时 + 逐 token 解码耗时"""
+        return BASE_LATENCY_SEC + prompt_tokens * PREFILL_SEC_PER_TOKEN + output_tokens * DECODE_SEC_PER_TOKEN
+
+    def expected_output_tokens(self, task: Dict) -> float:
+        """按历史统计获取子任务预期输出 token 数"""
+        return self._lookup(task, "output_tokens") or DEFAULT_OUTPUT_TOKENS
+
+    def estimate(self, task: Dict, prompt: str) -> float:
+        """
+        估算子任务耗时（秒）
+        :param task: 子任务字典
+        :param prompt: 子任务最终提示词
+        :return: 预估耗时
+        """
+        output_tokens = self.expected_output_tokens(task)
+        ratio = self._lookup(task, "ratio") or 1.0
+        return self._formula_cost(estimate_tokens(prompt), output_tokens) * ratio
+
+    def record(self, task: Dict, prompt: str, latency: float, output: str):
+        """
+        记录一次实际执行，更新角色及各标签的校正系数与输出长度
+        :param task: 子任务字典
+        :param prompt: 子任务最终提示词
+        :param latency: 实际耗时（秒）
+        :param output: 实际输出
+        """
+        output_tokens = estimate_tokens(output)
+        ratio = latency / max(self._formula_cost(estimate_tokens(prompt), output_tokens), 1e-6)
+        with self._lock:
+            for key in self._keys(task):
+                stat = self.stats.get(key)
+                if not stat:
+                    self.stats[key] = {"ratio": ratio, "output_tokens": output_tokens, "count": 1}
+                    continue
+                stat["ratio"] += self.alpha * (ratio - stat["ratio"])
+                stat["output_tokens"] += self.alpha * (output_tokens - stat["output_tokens"])
+                stat["count"] += 1
+
+
+def compute_upward_ranks(tasks: List[Dict], costs: Dict[str, float]) -> Dict[str, float]:
+    """
+    计算每个任务的向上秩：自身耗时 + 下游最长链耗时，即该任务之后还压着多少关键路径工作量
+    :param tasks: 子任务列表
+    :param costs: {task_id: 预估耗时}
+    :return: {task_id: 向上秩}
+    """
+    dependents: Dict[str, List[str]] = {t["task_id"]: [] for t in tasks}
+    for t in tasks:
+        for dep in t["dependencies"]:
+            if dep in dependents:
+                dependents[dep].append(t["task_id"])
+
+    ranks: Dict[str, float] = {}
+
+    def rank(task_id: str, visiting: set) -> float:
+        if task_id in ranks:
+            return ranks[task_id]
+        if task_id in visiting:  # 循环依赖：截断，避免无限递归
+            return 0.0
+        visiting.add(task_id)
+        downstream = max((rank(child, visiting) for child in dependents[task_id]), default=0.0)
+        visiting.discard(task_id)
+        ranks[task_id] = costs.get(task_id, 0.0) + downstream
+        return ranks[task_id]
+
+    for t in tasks:
+        rank(t["task_id"], set())
+    return ranks
+
+
+def critical_path(tasks: List[Dict], ranks: Dict[str, float]) -> List[str]:
+    """沿向上秩最大的方向从入口任务走到出口任务，得到关键路径"""
+    dependents: Dict[str, List[str]] = {t["task_id"]: [] for t in tasks}
+    for t in tasks:
+        for dep in t["dependencies"]:
+            if dep in dependents:
+                dependents[dep].append(t["task_id"])
+    entries = [t["task_id"] for t in tasks if not t["dependencies"]]
+    if not entries:
+        return []
+    path = [max(entries, key=lambda tid: ranks.get(tid, 0.0))]
+    while dependents[path[-1]]:
+        next_id = max(dependents[path[-1]], key=lambda tid: ranks.get(tid, 0.0))
+        if next_id in path:
+            break
+        path.append(next_id)
+    return path
+
+
+def simulate_makespan(tasks: List[Dict], costs: Dict[str, float], priorities: Dict[str, float], max_workers: int) -> float:
+    """按与 DAGExecutor 相同的就绪即派发 + 优先级规则模拟执行，得到预测完工时间（不考虑提供方并发上限）"""
+    waiting = {t["task_id"]: set(d for d in t["dependencies"]) for t in tasks}
+    known = set(waiting)
+    finished_at: Dict[str, float] = {}
+    running: List[tuple] = []  # (结束时间, task_id)
+    now = 0.0
+    while True:
+        ready = [tid for tid, deps in waiting.items() if deps <= set(finished_at) and deps <= known]
+        ready.sort(key=lambda tid: -priorities.get(tid, 0.0))
+        for tid in ready[:max(0, max_workers - len(running))]:
+            running.append((now + costs.get(tid, 0.0), tid))
+            del waiting[tid]
+        if not running:
+            break
+        running.sort()
+        now, tid = running.pop(0)
+        finished_at[tid] = now
+    return now
+
+
+class ScheduleReport:
+    """调度报告：对比预测与实际的完工时间及各任务耗时，用于调优耗时估算模型"""
+    def __init__(self, predicted: Dict[str, float], path: List[str], predicted_makespan: float,
+                 timings: Dict[str, tuple], actual_makespan: float):
+        self.predicted = predicted
+        self.critical_path = path
+        self.predicted_makespan = predicted_makespan
+        self.timings = timings
+        self.actual_makespan = actual_makespan
+
+    def to_dict(self) -> Dict:
+        """导出为字典"""
+        return {
+            "predicted_makespan": round(self.predicted_makespan, 3),
+            "actual_makespan": round(self.actual_makespan, 3),
+            "critical_path": self.critical_path,
+            "tasks": {
+                tid: {
+                    "predicted": round(self.predicted.get(tid, 0.0), 3),
+                    "actual": round(end - start, 3),
+                }
+                for tid, (start, end) in self.timings.items()
+            },
+        }
+
+    def print_report(self):
+        """打印报告"""
+        error = (self.actual_makespan - self.predicted_makespan) / self.predicted_makespan * 100 if self.predicted_makespan else 0.0
+        print("\n===== 调度报告（关键路径优先） =====")
+        print(f"预测完工时间：{self.predicted_makespan:.1f}s，实际：{self.actual_makespan:.1f}s（偏差 {error:+.1f}%）")
+        print(f"关键路径：{' → '.join(self.critical_path)}")
+        for tid, (start, end) in self.timings.items():
+            marker = "★" if tid in self.critical_path else " "
+            print(f"{marker} {tid}：预测 {self.predicted.get(tid, 0.0):.1f}s，实际 {end - start:.1f}s")
+
+# ===================== 拆解结果解析：增量 JSON 数组 =====================
+def repair_json_object(fragment: str) -> Optional[Dict]:
+    """
+    对单个格式有误的 JSON 对象做本地修复：中文引号、尾随逗号、单引号、Python 字面量
+    :param fragment: JSON 对象文本
+    :return: 修复后的字典，无法修复返回 None
+    """
+    candidates = [fragment]
+    fixed = fragment.replace("“", '"').replace("”", '"')
+    fixed = re.sub(r",\s*([}\]])", r"\1", fixed)
+    candidates.append(fixed)
+    if '"' not in fixed:
+        candidates.append(fixed.replace("'", '"'))
+    candidates.append(re.sub(r"\bTrue\b", "true", re.sub(r"\bFalse\b", "false", re.sub(r"\bNone\b", "null", fixed))))
+    for candidate in candidates:
+        try:
+            obj = json.loads(candidate)
+            if isinstance(obj, dict):
+                return obj
+        except (json.JSONDecodeError, ValueError):
+            continue
+    return None
+
+
+class IncrementalJSONArrayParser:
+    """
+    增量 JSON 数组解析器：逐块喂入模型输出，每当数组中的一个顶层对象闭合即解析并返回
+    忽略数组前后的说明文字和 Markdown 代码块标记，解析失败的对象片段记录在 errors 中
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.pos = 0
+        self.started = False
+        self.finished = False
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+        self.obj_start = -1
+        self.errors: List[str] = []  # 本地修复也失败的对象片段
+
+    def feed(self, chunk: str) -> List[Dict]:
+        """
+        喂入一段输出
+        :param chunk: 模型输出的文本块
+        :return: 本次新闭合并解析成功的对象列表
+        """
+        self.buffer += chunk
+        objects = []
+        while self.pos < len(self.buffer) and not self.finished:
+            ch = self.buffer[self.pos]
+            if not self.started:
+                self.started = ch == "["
+            elif self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                if self.depth == 0:
+                    self.obj_start = self.pos
+                self.depth += 1
+            elif ch == "}" and self.depth > 0:
+                self.depth -= 1
+                if self.depth == 0:
+                    fragment = self.buffer[self.obj_start:self.pos + 1]
+                    obj = repair_json_object(fragment)
+                    if obj is None:
+                        self.errors.append(fragment)
+                    else:
+                        objects.append(obj)
+            elif ch == "]" and self.depth == 0:
+                self.finished = True
+            self.pos += 1
+
+        # 丢弃已消费的文本，长输出下缓冲区保持有界
+        keep_from = self.obj_start if self.depth > 0 else self.pos
+        self.buffer = self.buffer[keep_from:]
+        self.pos -= keep_from
+        self.obj_start -= keep_from
+        return objects
+
+    def incomplete_fragment(self) -> str:
+        """输出结束时仍未闭合的对象片段（输出被截断时非空）"""
+        return self.buffer[self.obj_start:] if self.depth > 0 else ""
+
+# ===================== 计划缓存：需求相似度检索 =====================
+def normalize_requirement(requirement: str) -> str:
+    """需求归一化：去除空白与标点、统一小写，用于精确匹配及相似度计算"""
+    return re.sub(r"[\s\W_]+", "", requirement.lower())
+
+
+def validate_plan(tasks: List[Dict]) -> bool:
+    """
+    校验计划是否为合法 DAG：非空、任务ID唯一、依赖均在计划内且无环
+    :param tasks: 子任务列表
+    :return: 是否合法
+    """
+    task_ids = [t["task_id"] for t in tasks]
+    if not tasks or len(set(task_ids)) != len(task_ids) or "T000" in task_ids:
+        return False
+    indegree = {t["task_id"]: len(t["dependencies"]) for t in tasks}
+    children: Dict[str, List[str]] = {tid: [] for tid in task_ids}
+    for t in tasks:
+        for dep in t["dependencies"]:
+            if dep not in children:
+                return False
+            children[dep].append(t["task_id"])
+    ready = [tid for tid, degree in indegree.items() if degree == 0]
+    visited = 0
+    while ready:
+        tid = ready.pop()
+        visited += 1
+        for child in children[tid]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                ready.append(child)
+    return visited == len(tasks)
+
+
+class MinHasher:
+    """
+    MinHash 签名：对需求的字符 n-gram 集合计算签名，签名相同位置的比例即 Jaccard 相似度估计
+    使用 md5 + 固定系数的哈希族，签名可跨进程持久化复用
+    :param num_perm: 签名长度
+    :param ngram: 字符 n-gram 长度（中文需求按字切分效果较好）
+    """
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, num_perm: int = MINHASH_NUM_PERM, ngram: int = 2):
+        self.num_perm = num_perm
+        self.ngram = ngram
+        self._coeffs = []
+        for i in range(num_perm):
+            digest = hashlib.md5(f"minhash-{i}".encode("utf-8")).digest()
+            a = int.from_bytes(digest[:8], "big") % (self._PRIME - 1) + 1
+            b = int.from_bytes(digest[8:], "big") % self._PRIME
+            self._coeffs.append((a, b))
+
+    def shingles(self, text: str) -> set:
+        """归一化文本的字符 n-gram 集合"""
+        text = normalize_requirement(text)
+        if len(text) <= self.ngram:
+            return {text} if text else set()
+        return {text[i:i + self.ngram] for i in range(len(text) - self.ngram + 1)}
+
+    def signature(self, text: str) -> List[int]:
+        """计算 MinHash 签名"""
+        hashes = [int.from_bytes(hashlib.md5(s.encode("utf-8")).digest()[:8], "big") for s in self.shingles(text)]
+        if not hashes:
+            return [self._PRIME] * self.num_perm
+        return [min((a * h + b) % self._PRIME for h in hashes) for a, b in self._coeffs]
+
+    @staticmethod
+    def similarity(sig_a: List[int], sig_b: List[int]) -> float:
+        """由签名估计 Jaccard 相似度"""
+        if not sig_a or len(sig_a) != len(sig_b):
+            return 0.0
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+
+class PlanCache:
+    """
+    拆解计划缓存：保存校验通过的子任务 DAG
+    - 精确匹配（归一化后需求相同）：直接复用计划，跳过拆解调用
+    - 近似匹配：通过 MinHash + LSH 分桶检索相似需求，将其计划作为模板交给模型修改
+    :param path: JSON 持久化路径（None 则仅保存在内存）
+    :param max_entries: 最大条目数，超出后淘汰最久未使用的计划
+    :param threshold: 近似匹配的最低相似度
+    :param bands: LSH 分桶数（需整除签名长度），分桶越多召回越高
+    """
+    def __init__(self, path: Optional[str] = PLAN_CACHE_PATH, max_entries: int = PLAN_CACHE_MAX_ENTRIES,
+                 threshold: float = PLAN_SIMILARITY_THRESHOLD, bands: int = PLAN_LSH_BANDS):
+        self.path = path
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hasher = MinHasher()
+        self.bands = bands
+        self.rows = self.hasher.num_perm // bands
+        self.entries: Dict[str, Dict] = {}  # {归一化需求: {"requirement", "plan", "signature", "created_at", "used_at", "hits"}}
+        self._buckets: Dict[tuple, set] = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        """加载已缓存的计划并重建 LSH 索引"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except Exception as e:
+            print(f"警告：加载计划缓存失败：{str(e)}")
+            return
+        for key, entry in self.entries.items():
+            self._index(key, entry["signature"])
+
+    def save(self):
+        """持久化计划缓存"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._lock:
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False, indent=2)
+
+    def _band_keys(self, signature: List[int]) -> List[tuple]:
+        """签名按 bands 分段，每段作为一个 LSH 桶键"""
+        return [(i, tuple(signature[i * self.rows:(i + 1) * self.rows])) for i in range(self.bands)]
+
+    def _index(self, key: str, signature: List[int]):
+        for band_key in self._band_keys(signature):
+            self._buckets.setdefault(band_key, set()).add(key)
+
+    def _unindex(self, key: str, signature: List[int]):
+        for band_key in self._band_keys(signature):
+            bucket = self._buckets.get(band_key)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band_key]
+
+    def match(self, requirement: str) -> Optional[List[Dict]]:
+        """
+        精确匹配
+        :param requirement: 用户需求
+        :return: 缓存的计划（副本），未命中返回 None
+        """
+        with self._lock:
+            entry = self.entries.get(normalize_requirement(requirement))
+            if not entry:
+                return None
+            entry["used_at"] = time.time()
+            entry["hits"] += 1
+            return json.loads(json.dumps(entry["plan"]))
+
+    def similar(self, requirement: str) -> Optional[tuple]:
+        """
+        近似匹配：只对 LSH 同桶的候选计算相似度
+        :param requirement: 用户需求
+        :return: (相似需求, 计划副本, 相似度)，无达到阈值的候选返回 None
+        """
+        signature = self.hasher.signature(requirement)
+        with self._lock:
+            candidates = set()
+            for band_key in self._band_keys(signature):
+                candidates |= self._buckets.get(band_key, set())
+            scored = [(MinHasher.similarity(signature, self.entries[key]["signature"]), key) for key in candidates]
+            scored = [item for item in scored if item[0] >= self.threshold]
+            if not scored:
+                return None
+            score, key = max(scored)
+            entry = self.entries[key]
+            entry["used_at"] = time.time()
+            return entry["requirement"], json.loads(json.dumps(entry["plan"])), score
+
+    def put(self, requirement: str, tasks: List[Dict]) -> bool:
+        """
+        缓存校验通过的计划并持久化
+        :param requirement: 用户需求
+        :param tasks: 子任务列表
+        :return: 是否写入（计划不是合法 DAG 时不缓存）
+        """
+        if not validate_plan(tasks):
+            return False
+        key = normalize_requirement(requirement)
+        now = time.time()
+        with self._lock:
+            old = self.entries.pop(key, None)
+            if old:
+                self._unindex(key, old["signature"])
+            signature = self.hasher.signature(requirement)
+            self.entries[key] = {"requirement": requirement, "plan": tasks, "signature": signature,
+                                 "created_at": now, "used_at": now, "hits": old["hits"] if old else 0}
+            self._index(key, signature)
+            while len(self.entries) > self.max_entries:
+                stale = min(self.entries, key=lambda k: self.entries[k]["used_at"])
+                self._unindex(stale, self.entries.pop(stale)["signature"])
+        self.save()
+        return True
+
+
+# ===================== 结果整合：分层 Map-Reduce =====================
+class ResultIntegrator:
+    """
+    分层结果整合：子任务结果总量超出最终整合预算时，先按依赖子树或标签分组并行摘要，再逐层合并摘要（树形归约），
+    直到可放入一次最终整合调用；总量未超出预算、或分组本身足够小时原样透传
+    :param llm: 大模型调用封装
+    :param max_workers: 并行摘要的最大并发数
+    :param final_budget: 最终整合调用中子任务结果的 token 上限
+    :param group_budget: 每次摘要调用的输入 token 上限
+    :param level_budgets: 第 1/2/3... 层每份摘要的目标 token 数，层数超出时沿用最后一项
+    :param group_by: 首层分组方式，"subtree"（依赖子树）或 "tag"（首个标签）
+    """
+    def __init__(self, llm: LLMClient, max_workers: int = MAX_WORKERS, final_budget: int = INTEGRATE_FINAL_BUDGET,
+                 group_budget: int = INTEGRATE_GROUP_BUDGET, level_budgets: Optional[List[int]] = None,
+                 group_by: str = INTEGRATE_GROUP_BY):
+        self.llm = llm
+        self.max_workers = max(1, max_workers)
+        self.final_budget = final_budget
+        self.group_budget = group_budget
+        self.level_budgets = level_budgets or INTEGRATE_LEVEL_BUDGETS
+        self.group_by = group_by
+        self.llm_calls = 0
+
+    @staticmethod
+    def _split_text(text: str, budget: int) -> List[str]:
+        """按 token 预算把超长文本切成多段（按字符比例近似切分）"""
+        tokens = estimate_tokens(text)
+        if tokens <= budget:
+            return [text]
+        parts = -(-tokens // budget)
+        size = -(-len(text) // parts)
+        return [text[i:i + size] for i in range(0, len(text), size)]
+
+    def _group_tasks(self, tasks: List[Dict]) -> List[List[Dict]]:
+        """首层分组：按依赖关系的连通子树，或按首个标签，组内保持拆解顺序"""
+        if self.group_by == "tag":
+            groups: Dict[str, List[Dict]] = {}
+            for t in tasks:
+                groups.setdefault((t.get("tags") or ["通用"])[0], []).append(t)
+            return list(groups.values())
+
+        parent = {t["task_id"]: t["task_id"] for t in tasks}
+
+        def find(tid: str) -> str:
+            while parent[tid] != tid:
+                parent[tid] = parent[parent[tid]]
+                tid = parent[tid]
+            return tid
+
+        for t in tasks:
+            for dep in t["dependencies"]:
+                if dep in parent:
+                    parent[find(dep)] = find(t["task_id"])
+        groups = {}
+        for t in tasks:
+            groups.setdefault(find(t["task_id"]), []).append(t)
+        return list(groups.values())
+
+    def _pack(self, items: List[str]) -> List[List[str]]:
+        """把若干段文本按输入预算顺序装箱，每箱对应一次摘要调用"""
+        batches: List[List[str]] = []
+        current: List[str] = []
+        current_tokens = 0
+        for item in items:
+            for part in self._split_text(item, self.group_budget):
+                part_tokens = estimate_tokens(part)
+                if current and current_tokens + part_tokens > self.group_budget:
+                    batches.append(current)
+                    current, current_tokens = [], 0
+                current.append(part)
+                current_tokens += part_tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def _summarize(self, requirement: str, parts: List[str], budget: int) -> str:
+        """对一组结果做一次摘要调用；组内总量未超出本层预算时原样透传"""
+        text = "\n\n".join(parts)
+        if estimate_tokens(text) <= budget:
+            return text
+        summarize_prompt = f"""
+        你是结果摘要专家，围绕原始需求压缩以下子任务结果，保留关键结论、数据、交付物要点和任务编号，删除重复与过程性描述。
+        摘要长度控制在约{budget}个token（中文约{budget}字）以内，直接输出摘要，无额外解释。
+        原始需求：{requirement}
+        子任务结果：{text}
+        """
+        messages = [{"role": "user", "content": summarize_prompt}]
+        self.llm_calls += 1
+        return self.llm.chat(messages, temperature=0.3, stream=False).strip()
+
+    def _summarize_all(self, requirement: str, batches: List[List[str]], budget: int) -> List[str]:
+        """并行摘要一层中的所有分组，结果保持分组顺序"""
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="Integrator") as pool:
+            return list(pool.map(lambda parts: self._summarize(requirement, parts, budget), batches))
+
+    def condense(self, requirement: str, tasks: List[Dict], results: Dict[str, str],
+                 on_level: Optional[Callable[[int, List[str]], None]] = None,
+                 resume_from: Optional[tuple] = None) -> str:
+        """
+        把子任务结果压缩到最终整合预算以内
+        :param requirement: 原始需求
+        :param tasks: 子任务列表
+        :param results: {task_id: 执行结果}
+        :param on_level: 每层摘要完成回调 (层号, 摘要列表)，用于写入运行日志
+        :param resume_from: (层号, 摘要列表)，从已记录的中间层继续归约（恢复运行时使用）
+        :return: 供最终整合使用的子任务结果文本
+        """
+        if resume_from:
+            level, summaries = resume_from
+            print(f"从第 {level} 层摘要继续整合（{len(summaries)} 份）")
+        else:
+            details = [f"任务{t['task_id']}：{t['name']}\n结果：{results.get(t['task_id'], '未执行')}" for t in tasks]
+            total = estimate_tokens("\n".join(details))
+            if total <= self.final_budget:
+                return "\n".join(details)
+
+            print(f"子任务结果约 {total} token，超出最终整合预算 {self.final_budget}，分层摘要合并")
+            # 首层（map）：每个依赖子树/标签分组内装箱后并行摘要
+            detail_by_id = dict(zip([t["task_id"] for t in tasks], details))
+            batches = [batch for group in self._group_tasks(tasks) for batch in self._pack([detail_by_id[t["task_id"]] for t in group])]
+            level = 1
+            summaries = self._summarize_all(requirement, batches, self.level_budgets[0])
+            print(f"第 {level} 层：{len(batches)} 组 → {len(summaries)} 份摘要，约 {estimate_tokens(chr(10).join(summaries))} token")
+            if on_level:
+                on_level(level, summaries)
+
+        # 逐层归约（reduce）：相邻摘要按输入预算装箱再摘要，直到放得进最终整合
+        while estimate_tokens("\n".join(summaries)) > self.final_budget:
+            level += 1
+            budget = self.level_budgets[min(level - 1, len(self.level_budgets) - 1)]
+            previous_tokens = estimate_tokens("\n".join(summaries))
+            batches = self._pack(summaries)
+            summaries = self._summarize_all(requirement, batches, budget)
+            current_tokens = estimate_tokens("\n".join(summaries))
+            print(f"第 {level} 层：{len(batches)} 组 → {len(summaries)} 份摘要，约 {current_tokens} token")
+            if on_level:
+                on_level(level, summaries)
+            if current_tokens >= previous_tokens:
+                # 摘要不再缩小（如模型未遵守长度要求）：按预算截断，避免无限归约
+                print("警告：摘要未能继续缩小，按最终整合预算截断")
+                return self._split_text("\n".join(summaries), self.final_budget)[0]
+        return "\n".join(summaries)
+
+# ===================== 运行日志：检查点与恢复 =====================
+def is_failed_result(result: str) -> bool:
+    """判断子任务结果是否为失败信息（LLMClient 以错误文本而非异常返回失败）"""
+    return result.startswith(FAILED_RESULT_PREFIXES)
+
+
+class RunJournal:
+    """
+    运行日志：以 append-only JSONL 记录一次运行的需求、计划、子任务结果与整合阶段，每条记录落盘后才继续，
+    崩溃或 Ctrl-C 后可据此恢复，已完成的 LLM 调用不再重复
+    :param run_id: 运行ID（None 则新建）
+    :param journal_dir: 日志目录
+    """
+    def __init__(self, run_id: Optional[str] = None, journal_dir: str = RUN_JOURNAL_DIR):
+        self.run_id = run_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self.path = os.path.join(journal_dir, f"{self.run_id}.jsonl")
+        self._lock = threading.Lock()
+        os.makedirs(journal_dir, exist_ok=True)
+
+    def append(self, event: str, **data):
+        """
+        追加一条记录并立即落盘
+        :param event: 事件类型（run_started/plan_started/task/plan_complete/task_done/integration_level/run_finished）
+        :param data: 事件数据
+        """
+        record = {"event": event, "ts": time.time(), **data}
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load(self) -> Dict:
+        """
+        回放日志，得到运行状态
+        :return: {"requirement", "tasks": {task_id: task}, "results": {task_id: 成功结果},
+                  "failed": set, "plan_complete", "integration_levels": {level: 摘要列表}, "final_result"}
+        """
+        state = {"requirement": None, "tasks": {}, "results": {}, "failed": set(),
+                 "plan_complete": False, "integration_levels": {}, "final_result": None}
+        if not os.path.exists(self.path):
+            raise FileNotFoundError(f"运行日志不存在：{self.path}")
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # 崩溃时写了一半的最后一行
+                event = record["event"]
+                if event == "run_started":
+                    state["requirement"] = record["requirement"]
+                elif event == "plan_started":
+                    # 重新拆解时以新计划为准，已有结果仍按任务ID与名称匹配复用
+                    state["tasks"] = {}
+                    state["plan_complete"] = False
+                elif event == "task":
+                    state["tasks"][record["task"]["task_id"]] = record["task"]
+                elif event == "plan_complete":
+                    state["plan_complete"] = True
+                elif event == "task_done":
+                    if record["status"] == "success":
+                        state["results"][record["task_id"]] = record["result"]
+                        state["failed"].discard(record["task_id"])
+                    else:
+                        state["results"].pop(record["task_id"], None)
+                        state["failed"].add(record["task_id"])
+                elif event == "integration_level":
+                    state["integration_levels"][record["level"]] = record["summaries"]
+                elif event == "run_finished":
+                    state["final_result"] = record["result"]
+        return state
+
+    @staticmethod
+    def reusable_results(state: Dict) -> Dict[str, str]:
+        """
+        可复用的子任务结果：自身成功且所有上游也可复用（上游需重跑时，下游基于旧上游的结果一并作废）
+        :param state: load() 得到的运行状态
+        :return: {task_id: 结果}
+        """
+        reusable: Dict[str, bool] = {}
+
+        def check(task_id: str, visiting: set) -> bool:
+            if task_id in reusable:
+                return reusable[task_id]
+            task = state["tasks"].get(task_id)
+            if not task or task_id not in state["results"] or task_id in visiting:
+                return False
+            visiting.add(task_id)
+            reusable[task_id] = all(check(dep, visiting) for dep in task["dependencies"])
+            return reusable[task_id]
+
+        return {tid: state["results"][tid] for tid in state["tasks"] if check(tid, set())}
 
 # ===================== 总控Agent类（适配流式输出） =====================
 class MasterAgent:
-    """总控Agent：通用需求拆解、动态生成子Agent、任务调度、结果整合（支持流式）"""
-    def __init__(self, skills_sources: Optional[List[str]] = None):
+    """
+    总控Agent：通用需求拆解、动态生成子Agent、任务调度、结果整合（支持流式）
+    :param skills_sources: 技能源目录列表
+    :param max_workers: 子任务最大并发数
+    :param provider_limits: 各模型提供方的最大并发数（默认使用 PROVIDER_MAX_CONCURRENCY）
+    :param schedule_mode: 就绪任务的调度顺序，"fifo" 或 "critical_path"
+    :param cost_model: critical_path 模式使用的耗时估算模型（默认按 COST_STATS_PATH 加载历史统计）
+    :param stream_decompose: 是否流式拆解需求（边拆解边执行）
+    :param integrator: 结果整合器（默认按 INTEGRATE_* 配置分层摘要合并）
+    :param journal_dir: 运行日志目录（每次运行一个 JSONL 文件，用于 resume）
+    :param task_cache: 子任务结果缓存（默认 TASK_CACHE_ENABLED 时按 TASK_CACHE_PATH 创建）
+    :param plan_cache: 拆解计划缓存（默认 PLAN_CACHE_ENABLED 时按 PLAN_CACHE_PATH 创建）
+    :param agent_pool: 子Agent池（默认 SUB_AGENT_POOL_ENABLED 时使用进程共享的 SUB_AGENT_POOL）
+    :param speculate: 是否推测执行（上游流式输出达到预期进度时提前启动下游任务）
+    """
+    def __init__(self, skills_sources: Optional[List[str]] = None, max_workers: int = MAX_WORKERS, provider_limits: Optional[Dict[str, int]] = None,
+                 schedule_mode: str = SCHEDULE_MODE, cost_model: Optional[TaskCostModel] = None, stream_decompose: bool = DECOMPOSE_STREAM,
+                 integrator: Optional[ResultIntegrator] = None, journal_dir: str = RUN_JOURNAL_DIR,
+                 task_cache: Optional[TaskResultCache] = None, plan_cache: Optional[PlanCache] = None,
+                 agent_pool: Optional[SubAgentPool] = None, speculate: bool = SPECULATE_ENABLED):
         self.llm = LLMClient()
+        self.max_workers = max_workers
+        self.provider_limits = provider_limits
+        self.schedule_mode = schedule_mode
+        self.cost_model = cost_model or (TaskCostModel() if schedule_mode == "critical_path" else None)
+        self.last_schedule_report: Optional[ScheduleReport] = None
+        self.speculate = speculate
+        self.last_speculation_stats: Optional[SpeculationStats] = None
+        self.stream_decompose = stream_decompose
+        self.integrator = integrator or ResultIntegrator(self.llm, max_workers=max_workers)
+        self.current_plan: List[Dict] = []
+        self.reused_task_ids: List[str] = []
+        self.journal_dir = journal_dir
+        self.journal: Optional[RunJournal] = None
+        self.task_cache = task_cache or (TaskResultCache() if TASK_CACHE_ENABLED else None)
+        self.plan_cache = plan_cache or (PlanCache() if PLAN_CACHE_ENABLED else None)
         self.sub_agents: Dict[str, SubAgent] = {}
+        self.agent_index = AgentIndex()
+        # 空池的 len 为 0，需按 None 判断，避免传入的空池被替换为共享池
+        self.agent_pool = agent_pool if agent_pool is not None else (SUB_AGENT_POOL if SUB_AGENT_POOL_ENABLED else SubAgentPool())
+        self._agent_keys: Dict[tuple, str] = {}  # {(角色, 标签): agent_id}，同类任务复用子Agent
         self.task_results: Dict[str, str] = {}
         self.skills_sources = skills_sources or []
         self.all_skills: Dict[str, SkillMetadata] = {}
@@ -195,9 +1713,15 @@ class MasterAgent:
         if self.skills_sources:
             self._load_skills()
 
+    def _journal(self, event: str, **data):
+        """写入当前运行日志（未处于 run/resume 中时忽略）"""
+        if self.journal:
+            self.journal.append(event, **data)
+
     def register_sub_agent(self, sub_agent: SubAgent):
         """注册子Agent（动态生成后自动调用）"""
         self.sub_agents[sub_agent.agent_id] = sub_agent
+        self.agent_index.add(sub_agent)
 
     def _load_skills(self):
         """加载所有技能"""
@@ -207,8 +1731,13 @@ class MasterAgent:
         for skill_name, skill in self.all_skills.items():
             print(f"  - {skill_name}: {skill['description']}")
 
-    def _parse_requirement(self, requirement: str) -> List[Dict]:
-        """增强需求拆解：返回子任务+角色+能力+核心要求"""
+    def _build_parse_prompt(self, requirement: str, template: Optional[tuple] = None) -> str:
+        """
+        生成需求拆解提示词
+        :param requirement: 用户需求
+        :param template: 计划缓存近似匹配结果 (相似需求, 计划, 相似度)，作为参考计划供模型修改
+        :return: 拆解提示词
+        """
         parse_prompt = f"""
         你是专业需求拆解师，将用户需求拆解为【可执行、带依赖】的子任务，仅返回JSON数组，无其他文字。
         子任务字段要求：
@@ -236,105 +1765,256 @@ class MasterAgent:
         
         用户需求：{requirement}
         """
-        messages = [{"role": "user", "content": parse_prompt}]
-        parse_result = self.llm.chat(messages, temperature=0.3, stream=False)  # 拆解需求固定非流式，保证结构化
-        try:
-            return json.loads(parse_result)
-        except:
-            return [{
-                "task_id":"T000",
-                "name":"拆解失败",
-                "goal":"无",
-                "input":"无",
-                "output":"无",
-                "dependencies":[],
-                "tags":["通用"],
-                "role":"通用执行专家",
-                "core_requirements":"按要求完成基础任务，输出简洁准确"
-            }]
+        if template:
+            similar_requirement, plan, _ = template
+            parse_prompt += f"""
+        参考计划（相似需求「{similar_requirement}」的已验证拆解结果）：
+        {json.dumps(plan, ensure_ascii=False)}
+        若参考计划适用，请在其基础上修改（如时间、对象、范围等差异），增删不适用的子任务并保持依赖关系正确；若不适用则重新拆解。
+        """
+        return parse_prompt
+
+    @staticmethod
+    def _normalize_task(obj: Dict, seq: int) -> Optional[Dict]:
+        """
+        校验并补全子任务字段，缺少任务名和目标的对象视为无效
+        :param obj: 解析出的对象
+        :param seq: 子任务序号（用于补全缺失的 task_id）
+        :return: 补全后的子任务，无效返回 None
+        """
+        if not obj.get("name") and not obj.get("goal"):
+            return None
+        dependencies = obj.get("dependencies") or []
+        tags = obj.get("tags") or ["通用"]
+        return {
+            "task_id": str(obj.get("task_id") or f"T{seq:03d}"),
+            "name": obj.get("name") or obj["goal"],
+            "goal": obj.get("goal") or obj["name"],
+            "input": obj.get("input") or "无",
+            "output": obj.get("output") or "无",
+            "dependencies": [str(d) for d in (dependencies if isinstance(dependencies, list) else [dependencies])],
+            "tags": tags if isinstance(tags, list) else [tags],
+            "role": obj.get("role") or "通用执行专家",
+            "core_requirements": obj.get("core_requirements") or "按要求完成任务，输出简洁准确",
+        }
+
+    def _repair_fragment(self, fragment: str) -> Optional[Dict]:
+        """针对单个格式有误或被截断的子任务对象重新提问，只修复该对象而非重新拆解全部需求"""
+        repair_prompt = f"""
+        以下是一个格式有误或不完整的子任务JSON对象，请修正为合法JSON对象（字段：task_id、name、goal、input、output、dependencies、tags、role、core_requirements），仅返回该JSON对象，无其他文字。
+        {fragment}
+        """
+        messages = [{"role": "user", "content": repair_prompt}]
+        repaired = self.llm.chat(messages, temperature=0.0, stream=False)
+        start, end = repaired.find("{"), repaired.rfind("}")
+        return repair_json_object(repaired[start:end + 1]) if start != -1 and end > start else None
+
+    def _collect_tasks(self, parser: IncrementalJSONArrayParser, chunks: Iterable[str]) -> Iterator[Dict]:
+        """
+        从模型输出中增量解析子任务，输出结束后对格式有误或被截断的对象做定向修复
+        :param parser: 增量解析器
+        :param chunks: 模型输出文本块
+        :return: 逐个产出补全后的子任务
+        """
+        seq = 0
+        for chunk in chunks:
+            for obj in parser.feed(chunk):
+                seq += 1
+                task = self._normalize_task(obj, seq)
+                if task:
+                    yield task
+
+        broken = parser.errors + ([parser.incomplete_fragment()] if parser.incomplete_fragment() else [])
+        for fragment in broken:
+            print(f"⚠️ 子任务格式有误，尝试定向修复：{fragment[:60]}...")
+            obj = self._repair_fragment(fragment)
+            seq += 1
+            task = self._normalize_task(obj, seq) if obj else None
+            if task:
+                yield task
+            else:
+                print("⚠️ 定向修复失败，已跳过该子任务")
+
+    def _parse_requirement(self, requirement: str, template: Optional[tuple] = None) -> List[Dict]:
+        """增强需求拆解：返回子任务+角色+能力+核心要求（无法解析时定向修复，仍失败则重新提问；template 为参考计划）"""
+        messages = [{"role": "user", "content": self._build_parse_prompt(requirement, template)}]
+        for attempt in range(PARSE_MAX_RETRIES + 1):
+            parse_result = self.llm.chat(messages, temperature=0.3, stream=False)
+            tasks = list(self._collect_tasks(IncrementalJSONArrayParser(), [parse_result]))
+            if tasks:
+                return tasks
+            if attempt < PARSE_MAX_RETRIES:
+                print(f"⚠️ 拆解结果无法解析为JSON数组，重新提问（{attempt + 1}/{PARSE_MAX_RETRIES}）")
+                messages = messages[:1] + [
+                    {"role": "assistant", "content": parse_result},
+                    {"role": "user", "content": "上面的输出无法解析为JSON数组，请严格按字段要求重新输出，仅返回JSON数组，无其他文字。"},
+                ]
+        return [{
+            "task_id":"T000",
+            "name":"拆解失败",
+            "goal":"无",
+            "input":"无",
+            "output":"无",
+            "dependencies":[],
+            "tags":["通用"],
+            "role":"通用执行专家",
+            "core_requirements":"按要求完成基础任务，输出简洁准确"
+        }]
+
+    def _parse_requirement_stream(self, requirement: str, template: Optional[tuple] = None) -> Iterator[Dict]:
+        """
+        流式需求拆解：模型每输出完一个子任务对象即产出，调度器可在剩余计划生成期间先执行无依赖任务
+        :param requirement: 用户需求
+        :param template: 计划缓存近似匹配结果，作为参考计划供模型修改
+        :return: 逐个产出子任务；流式输出完全无法解析时回退到非流式拆解并重新提问
+        """
+        messages = [{"role": "user", "content": self._build_parse_prompt(requirement, template)}]
+        produced = 0
+        for task in self._collect_tasks(IncrementalJSONArrayParser(), self.llm.chat(messages, temperature=0.3, stream=True)):
+            produced += 1
+            print(f"🧩 拆解出子任务：{task['task_id']} - {task['name']}（角色：{task['role']}，依赖：{task['dependencies']}）")
+            yield task
+        if produced:
+            return
+
+        print("⚠️ 流式拆解结果无法解析，改为非流式重新拆解")
+        tasks = self._parse_requirement(requirement, template)
+        if tasks[0]["task_id"] != "T000":
+            yield from tasks
 
     def _generate_dynamic_agent_prompt(self, task: Dict) -> str:
-        """自动为子任务生成专属Prompt模板"""
+        """自动为子任务生成专属Prompt模板（只含池键中的角色与标签，核心执行要求在执行时按任务填入）"""
         prompt_template = f"""
         你是{task['role']}，专业能力：{', '.join(task['tags'])}。
-        核心执行要求：{task['core_requirements']}。
+        核心执行要求：{{task_core_requirements}}。
   请执行子任务：{{task_name}}，任务目标：{{task_goal}}。
   输入信息：{{task_input}}，输出要求：{{task_output}}。
   要求：严格遵循核心执行要求，输出精准、符合规范，无冗余内容。
         """
         return prompt_template.strip()
 
-    def _generate_dynamic_agents(self, tasks: List[Dict]):
-        """动态创建子Agent并自动注册（同类任务复用）"""
-        print("\n===== 动态生成子Agent =====")
-        generated_agent_keys = set()
-        
-        for task in tasks:
-            agent_key = f"{task['role']}_{'_'.join(task['tags'])}"
-            if agent_key in generated_agent_keys:
-                continue
-            
-            dynamic_prompt = self._generate_dynamic_agent_prompt(task)
-            agent_id = f"A_{task['role'][:2].upper()}_{len(generated_agent_keys)+1:03d}"
-            
+    def _generate_dynamic_agent(self, task: Dict) -> SubAgent:
+        """为子任务获取子Agent：同角色同标签的任务复用已有子Agent，优先从子Agent池取出，池中没有时创建"""
+        agent_key = (task["role"], tuple(sorted(set(task["tags"]))))
+        if agent_key in self._agent_keys:
+            return self.sub_agents[self._agent_keys[agent_key]]
+
+        def build() -> SubAgent:
             # 根据任务标签匹配 skills
             matched_skills = match_skills_by_tags(task["tags"], self.all_skills)
-            
-            dynamic_agent = SubAgent(
-                agent_id=agent_id,
+            return SubAgent(
+                agent_id=self.agent_pool.next_agent_id(task["role"]),
                 role=task['role'],
                 ability_tags=task['tags'],
-                prompt_template=dynamic_prompt,
+                prompt_template=self._generate_dynamic_agent_prompt(task),
                 skills=matched_skills
             )
-            self.register_sub_agent(dynamic_agent)
-            generated_agent_keys.add(agent_key)
-            
-            skills_info = f"，包含 {len(matched_skills)} 个技能" if matched_skills else ""
-            print(f"✅ 生成子Agent：{agent_id} - {task['role']}（标签：{task['tags']}{skills_info}）")
+
+        pool_key = agent_key + (MODEL_TYPE, tuple(self.skills_sources))
+        dynamic_agent, created = self.agent_pool.get_or_create(pool_key, build)
+        self.register_sub_agent(dynamic_agent)
+        self._agent_keys[agent_key] = dynamic_agent.agent_id
+        
+        skills_info = f"，包含 {len(dynamic_agent.skills)} 个技能" if dynamic_agent.skills else ""
+        action = "生成" if created else "复用"
+        print(f"✅ {action}子Agent：{dynamic_agent.agent_id} - {task['role']}（标签：{task['tags']}{skills_info}）")
+        return dynamic_agent
+
+    def _generate_dynamic_agents(self, tasks: List[Dict]):
+        """动态创建子Agent并自动注册（同类任务复用）"""
+        print("\n===== 动态生成子Agent =====")
+        for task in tasks:
+            self._generate_dynamic_agent(task)
 
     def _assign_agent_for_task(self, task: Dict) -> Optional[SubAgent]:
-        """基于标签匹配子Agent"""
-        for agent in self.sub_agents.values():
-            if any(tag in agent.ability_tags for tag in task["tags"]):
-                return agent
-        for agent in self.sub_agents.values():
-            if "通用" in agent.ability_tags:
-                return agent
-        return None
-
-    def _schedule_tasks(self, tasks: List[Dict], stream: bool = DEFAULT_STREAM) -> Dict[str, str]:
-        """按依赖顺序执行任务（支持流式输出）"""
-        remaining_tasks = tasks.copy()
-        executed_tasks = set()
-        results = {}
-
-        print("\n===== 按依赖顺序执行子任务 =====")
-        while remaining_tasks:
-            executable_tasks = [t for t in remaining_tasks if all(dep in executed_tasks for dep in t["dependencies"])]
-            if not executable_tasks:
-                print("警告：存在循环依赖，调度终止！")
-                break
-
-            for task in executable_tasks:
-                print(f"\n📌 执行任务：{task['task_id']} - {task['name']}")
-                agent = self._assign_agent_for_task(task)
-                if not agent:
-                    result = "无可用子Agent"
-                    print(f"子任务输出：{result}")
-                else:
-                    print(f"🤖 分配子Agent：{agent.agent_id} - {agent.role}")
-                    result = agent.execute_task(task, stream=stream)  # 流式执行子任务
-                results[task["task_id"]] = result
-                executed_tasks.add(task["task_id"])
-                time.sleep(0.5)  # 短延时，提升交互体验
+        """基于标签倒排索引匹配子Agent：加权得分最高者优先，同分时选负载最低者"""
+        return self.agent_index.best_match(task)
+
+    def _schedule_tasks(self, tasks: Iterable[Dict], stream: bool = DEFAULT_STREAM,
+                        lookup_completed: Optional[Callable[[Dict], Optional[str]]] = None) -> Dict[str, str]:
+        """
+        按依赖关系并发执行任务：依赖就绪即派发，受全局及各提供方并发上限约束
+        :param tasks: 子任务列表，或流式拆解产出子任务的生成器
+        :param stream: 是否流式调用
+        :param lookup_completed: 已有结果查询函数（恢复运行时跳过已完成任务）
+        :return: {task_id: 执行结果}；实际收到的子任务保存在 self.current_plan
+        """
+        print("\n===== 按依赖关系并发执行子任务 =====")
+        self._journal("plan_started")
+        if self.task_cache:
+            self.task_cache.reset_stats()
+        executor = DAGExecutor(max_workers=self.max_workers, provider_limits=self.provider_limits, speculate=self.speculate,
+                               cache=self.task_cache)
+        critical = self.schedule_mode == "critical_path"
+        prompts: Dict[str, str] = {}
+        costs: Dict[str, float] = {}
+        ranks: Dict[str, float] = {}
+
+        def add_task(task: Dict):
+            # 任务可能逐个到达（流式拆解）：即时记录计划、生成子Agent，并按已知计划刷新关键路径优先级
+            self._journal("task", task=task)
+            self._generate_dynamic_agent(task)
+            if not critical:
+                return
+            agent = self._assign_agent_for_task(task)
+            prompts[task["task_id"]] = agent.build_prompt(task) if agent else ""
+            costs[task["task_id"]] = self.cost_model.estimate(task, prompts[task["task_id"]])
+            ranks.update(compute_upward_ranks(executor.tasks, costs))
 
-            remaining_tasks = [t for t in remaining_tasks if t["task_id"] not in executed_tasks]
+        def plan_complete(plan: List[Dict]):
+            # 拆解一结束（执行开始前）即记录计划完整，执行中途崩溃后 resume 直接复用该计划而非重新拆解
+            if plan:
+                self._journal("plan_complete", task_count=len(plan))
+
+        def task_started(task: Dict, agent: Optional[SubAgent]):
+            if agent:
+                self.agent_index.acquire(agent.agent_id)
+
+        def task_done(task: Dict, agent: Optional[SubAgent], latency: float, result: str):
+            if agent:
+                self.agent_index.release(agent.agent_id)
+            # 每个结果先落盘再继续，中断后 resume 只需重跑失败或未完成的任务
+            status = "failed" if is_failed_result(result) else "success"
+            self._journal("task_done", task_id=task["task_id"], status=status, result=result, latency=latency)
+            # 命中缓存的耗时不代表模型调用耗时，不参与耗时统计校正
+            cached = self.task_cache and task["task_id"] in self.task_cache.hits
+            if critical and agent and not cached:
+                self.cost_model.record(task, prompts[task["task_id"]], latency, result)
+
+        results = executor.run(
+            tasks, self._assign_agent_for_task, stream=stream,
+            priorities=ranks if critical else None,
+            on_task_added=add_task,
+            on_task_done=task_done,
+            on_task_started=task_started,
+            on_plan_complete=plan_complete,
+            lookup_completed=lookup_completed,
+            expected_output_tokens=self.cost_model.expected_output_tokens if self.cost_model else None,
+        )
+        self.current_plan = executor.tasks
+        self.reused_task_ids = executor.skipped
+        if critical and executor.tasks:
+            # 关键路径优先：对比预测与实际完工时间，并保存校正后的耗时统计
+            path = critical_path(executor.tasks, ranks)
+            predicted_makespan = simulate_makespan(executor.tasks, costs, ranks, executor.max_workers)
+            self.cost_model.save()
+            self.last_schedule_report = ScheduleReport(costs, path, predicted_makespan, executor.timings, executor.makespan)
+            self.last_schedule_report.print_report()
+        if self.task_cache:
+            self.task_cache.print_report()
+        if self.speculate:
+            self.last_speculation_stats = executor.speculation
+            executor.speculation.print_report()
         return results
 
-    def _integrate_results(self, requirement: str, tasks: List[Dict], results: Dict[str, str], stream: bool = DEFAULT_STREAM) -> str:
-        """结果整合（支持流式输出最终结果）"""
-        task_details = "\n".join([f"任务{t['task_id']}：{t['name']}\n结果：{results[t['task_id']]}" for t in tasks])
+    def _integrate_results(self, requirement: str, tasks: List[Dict], results: Dict[str, str], stream: bool = DEFAULT_STREAM,
+                           resume_from: Optional[tuple] = None) -> str:
+        """结果整合（支持流式输出最终结果）；结果总量超出预算时先分层摘要合并，每层摘要写入运行日志"""
+        task_details = self.integrator.condense(
+            requirement, tasks, results,
+            on_level=lambda level, summaries: self._journal("integration_level", level=level, summaries=summaries),
+            resume_from=resume_from,
+        )
         integrate_prompt = f"""
         你是结果整合专家，根据原始需求和子任务结果，生成完整、连贯的最终输出，直接输出结果，无额外解释。
         原始需求：{requirement}
@@ -357,29 +2037,110 @@ class MasterAgent:
             full_final_result = result_gen
             print(f"最终结果：{full_final_result}")
         
+        self._journal("run_finished", result=full_final_result.strip())
         return full_final_result.strip()
 
-    def run(self, requirement: str, stream: bool = DEFAULT_STREAM) -> str:
-        """总控主流程（支持流式）"""
-        print(f"===== 总控接收需求：{requirement} =====")
-        # 1. 拆解需求
-        tasks = self._parse_requirement(requirement)
-        if tasks[0]["task_id"] == "T000":
-            return "需求拆解失败"
-        print(f"拆解完成，共{len(tasks)}个子任务：")
-        for t in tasks:
-            print(f"- {t['task_id']}：{t['name']}（角色：{t['role']}，依赖：{t['dependencies']}）")
+    def _execute_run(self, requirement: str, stream: bool, previous: Optional[Dict] = None) -> str:
+        """
+        拆解 → 生成子Agent → 调度 → 整合；previous 为恢复运行时回放的日志状态
+        :param requirement: 用户需求
+        :param stream: 是否流式输出
+        :param previous: RunJournal.load() 得到的状态，None 表示全新运行
+        :return: 最终结果
+        """
+        lookup_completed = None
+        if previous:
+            # 仅复用同一任务ID、同名且上游均可复用的成功结果
+            reusable = RunJournal.reusable_results(previous)
+            lookup_completed = lambda t: reusable.get(t["task_id"]) if previous["tasks"].get(t["task_id"], {}).get("name") == t["name"] else None
 
-        # 2. 动态生成子Agent
-        self._generate_dynamic_agents(tasks)
+        # 查询计划缓存：相同需求直接复用计划，相似需求的计划作为拆解模板
+        cached_plan, template = None, None
+        if self.plan_cache and not (previous and previous["plan_complete"]):
+            cached_plan = self.plan_cache.match(requirement)
+            template = None if cached_plan else self.plan_cache.similar(requirement)
+            if template:
+                print(f"📋 找到相似需求的计划（相似度 {template[2]:.2f}）：{template[0]}，作为拆解模板")
+
+        if previous and previous["plan_complete"]:
+            # 计划已完整记录：跳过拆解，直接按日志中的计划恢复
+            tasks = list(previous["tasks"].values())
+            print(f"从运行日志恢复计划，共{len(tasks)}个子任务，其中{len(RunJournal.reusable_results(previous))}个已完成")
+            self._generate_dynamic_agents(tasks)
+            self.task_results = self._schedule_tasks(tasks, stream=stream, lookup_completed=lookup_completed)
+        elif cached_plan:
+            # 命中计划缓存：跳过拆解调用
+            tasks = cached_plan
+            print(f"⚡ 命中计划缓存，共{len(tasks)}个子任务，跳过需求拆解")
+            self._generate_dynamic_agents(tasks)
+            self.task_results = self._schedule_tasks(tasks, stream=stream, lookup_completed=lookup_completed)
+        elif self.stream_decompose:
+            # 1-3. 流式拆解需求，边拆解边生成子Agent、调度执行
+            print("\n===== 流式拆解需求（边拆解边执行） =====")
+            self.task_results = self._schedule_tasks(self._parse_requirement_stream(requirement, template), stream=stream, lookup_completed=lookup_completed)
+            tasks = self.current_plan
+            if not tasks:
+                return "需求拆解失败"
+        else:
+            # 1. 拆解需求
+            tasks = self._parse_requirement(requirement, template)
+            if tasks[0]["task_id"] == "T000":
+                return "需求拆解失败"
+            print(f"拆解完成，共{len(tasks)}个子任务：")
+            for t in tasks:
+                print(f"- {t['task_id']}：{t['name']}（角色：{t['role']}，依赖：{t['dependencies']}）")
 
-        # 3. 调度执行子任务（流式）
-        self.task_results = self._schedule_tasks(tasks, stream=stream)
+            # 2. 动态生成子Agent
+            self._generate_dynamic_agents(tasks)
 
-        # 4. 整合结果（流式）
-        final_result = self._integrate_results(requirement, tasks, self.task_results, stream=stream)
+            # 3. 调度执行子任务（流式）
+            self.task_results = self._schedule_tasks(tasks, stream=stream, lookup_completed=lookup_completed)
+
+        # 新拆解的计划校验为合法 DAG 后写入计划缓存
+        if self.plan_cache and not cached_plan and self.plan_cache.put(requirement, tasks):
+            print("📋 拆解计划已写入计划缓存")
+
+        # 4. 整合结果（流式）；所有子任务均复用旧结果时，从已记录的最高层摘要继续
+        resume_from = None
+        if previous and previous["integration_levels"] and len(self.reused_task_ids) == len(tasks):
+            level = max(previous["integration_levels"])
+            resume_from = (level, previous["integration_levels"][level])
+        final_result = self._integrate_results(requirement, tasks, self.task_results, stream=stream, resume_from=resume_from)
         return final_result
 
+    def run(self, requirement: str, stream: bool = DEFAULT_STREAM, run_id: Optional[str] = None) -> str:
+        """总控主流程（支持流式）；计划、子任务结果与整合阶段逐条写入运行日志，中断后可 resume(run_id)"""
+        self.journal = RunJournal(run_id, self.journal_dir)
+        self.journal.append("run_started", requirement=requirement)
+        print(f"===== 总控接收需求：{requirement}（运行ID：{self.journal.run_id}） =====")
+        try:
+            return self._execute_run(requirement, stream)
+        except KeyboardInterrupt:
+            print(f"\n⏸️ 运行已中断，已完成的结果已保存，可调用 resume('{self.journal.run_id}') 继续")
+            raise
+
+    def resume(self, run_id: str, stream: bool = DEFAULT_STREAM) -> str:
+        """
+        恢复中断的运行：跳过已成功的子任务，只重跑失败或未完成的任务（及其下游）
+        :param run_id: 运行ID
+        :param stream: 是否流式输出
+        :return: 最终结果
+        """
+        self.journal = RunJournal(run_id, self.journal_dir)
+        previous = self.journal.load()
+        if previous["final_result"] is not None:
+            print(f"===== 运行 {run_id} 已完成，直接返回最终结果 =====")
+            return previous["final_result"]
+
+        requirement = previous["requirement"]
+        self.journal.append("run_resumed")
+        print(f"===== 恢复运行 {run_id}：{requirement} =====")
+        try:
+            return self._execute_run(requirement, stream, previous=previous)
+        except KeyboardInterrupt:
+            print(f"\n⏸️ 运行已中断，已完成的结果已保存，可调用 resume('{run_id}') 继续")
+            raise
+
 # ===================== 运行示例 =====================
 if __name__ == "__main__":
     # 配置 skills 源目录
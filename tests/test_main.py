@@ -0,0 +1,590 @@
+import importlib.util
+import io
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+
+# main.py lives at the repository root under a file name that is not importable
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+_spec = importlib.util.spec_from_file_location("master_main", os.path.join(ROOT, "main.py 00-11-37-159.py"))
+main = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(main)
+
+
+def make_task(task_id, dependencies=(), name=None, tags=("通用",), role="通用执行专家"):
+    """Build a normalized sub-task"""
+    return {
+        "task_id": task_id,
+        "name": name or f"task {task_id}",
+        "goal": f"goal {task_id}",
+        "input": "无",
+        "output": "无",
+        "dependencies": list(dependencies),
+        "tags": list(tags),
+        "role": role,
+        "core_requirements": "无",
+    }
+
+
+class FakeLLM:
+    """Stand-in for LLMClient.chat that records calls and answers per task name"""
+
+    def __init__(self, delay=0.0, answers=None):
+        self.delay = delay
+        self.answers = answers or {}
+        self.prompts = []
+        self.events = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def chat(self, messages, temperature=0.7, stream=False, model_type=None):
+        prompt = messages[-1]["content"]
+        match = re.search(r"执行子任务：(.+?)，", prompt)
+        name = match.group(1) if match else prompt
+        with self._lock:
+            self.prompts.append(prompt)
+            self.events.append(("start", name))
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self._lock:
+            self.active -= 1
+            self.events.append(("end", name))
+        answer = self.answers.get(name, "ok")
+        if isinstance(answer, Exception):
+            raise answer
+        return iter([answer]) if stream else answer
+
+    def started(self):
+        """Task names in the order their calls started"""
+        return [name for event, name in self.events if event == "start"]
+
+
+class TestDAGExecutor(unittest.TestCase):
+    """Test dependency ordering, parallelism and failure handling of DAGExecutor"""
+
+    def setUp(self):
+        self.agent = main.SubAgent("A_TE_001", "通用执行专家", ["通用"], "执行子任务：{task_name}，{task_goal}{task_input}{task_output}")
+
+    def _run(self, tasks, llm, **kwargs):
+        executor = main.DAGExecutor(max_workers=kwargs.pop("max_workers", 4), provider_limits={})
+        with patch.object(main.LLMClient, "chat", staticmethod(llm.chat)):
+            results = executor.run(tasks, lambda task: self.agent, stream=False, **kwargs)
+        return executor, results
+
+    def test_dependencies_finish_before_dependents_start(self):
+        """Test a task starts only after its upstream finished and independent tasks overlap"""
+        tasks = [make_task("T1"), make_task("T2"), make_task("T3", ["T1", "T2"]), make_task("T4", ["T3"])]
+        llm = FakeLLM(delay=0.1)
+        _, results = self._run(tasks, llm)
+
+        self.assertEqual(set(results), {"T1", "T2", "T3", "T4"})
+        position = {event: i for i, event in enumerate(llm.events)}
+        self.assertGreater(position[("start", "task T3")], max(position[("end", "task T1")], position[("end", "task T2")]))
+        self.assertGreater(position[("start", "task T4")], position[("end", "task T3")])
+        self.assertEqual(llm.max_active, 2)
+        # Upstream results are handed to the dependent task's prompt
+        self.assertIn("任务T3：\nok", next(p for p in llm.prompts if "执行子任务：task T4，" in p))
+
+    def test_failure_is_isolated_and_unknown_dependencies_never_run(self):
+        """Test a raising task yields a failure result, its dependents still run, unknown deps block"""
+        tasks = [make_task("T1", name="boom"), make_task("T2", ["T1"]), make_task("T3", ["T9"])]
+        llm = FakeLLM(answers={"boom": RuntimeError("model down")})
+        _, results = self._run(tasks, llm)
+
+        self.assertEqual(results["T1"], "子任务执行失败：model down")
+        self.assertEqual(results["T2"], "ok")
+        self.assertNotIn("T3", results)
+
+    def test_priorities_order_ready_tasks(self):
+        """Test higher priority ready tasks start first and timings are recorded per task"""
+        tasks = [make_task("T1"), make_task("T2"), make_task("T3"), make_task("T4", ["T1"])]
+        llm = FakeLLM(delay=0.01)
+        executor, _ = self._run(tasks, llm, max_workers=1, priorities={"T1": 1.0, "T2": 2.0, "T3": 3.0, "T4": 4.0})
+
+        self.assertEqual(llm.started(), ["task T3", "task T2", "task T1", "task T4"])
+        self.assertEqual(set(executor.timings), {"T1", "T2", "T3", "T4"})
+
+    def test_lookup_completed_skips_tasks(self):
+        """Test reused results are not executed and unblock their dependents"""
+        tasks = [make_task("T1"), make_task("T2", ["T1"]), make_task("T3", ["T9"])]
+        llm = FakeLLM()
+        executor, results = self._run(tasks, llm, lookup_completed=lambda task: "previous" if task["task_id"] == "T1" else None)
+
+        self.assertEqual(executor.skipped, ["T1"])
+        self.assertEqual(results, {"T1": "previous", "T2": "ok"})
+        self.assertEqual(llm.started(), ["task T2"])
+        self.assertTrue(main.is_failed_result("子任务执行失败：model down"))
+        self.assertFalse(main.is_failed_result("previous"))
+
+    def test_per_run_cache_is_used_by_shared_agent(self):
+        """Test two runs sharing one agent record hits in their own cache"""
+        temp_dir = tempfile.mkdtemp()
+        try:
+            caches = [main.TaskResultCache(os.path.join(temp_dir, f"c{i}.sqlite")) for i in range(2)]
+            llm = FakeLLM()
+            with patch.object(main.LLMClient, "chat", staticmethod(llm.chat)):
+                for cache in (caches[0], caches[0], caches[1]):
+                    main.DAGExecutor(max_workers=2, provider_limits={}, cache=cache).run(
+                        [make_task("T1")], lambda task: self.agent, stream=False
+                    )
+            self.assertEqual(len(llm.prompts), 2)
+            self.assertEqual((caches[0].report()["hits"], caches[0].report()["misses"]), (1, 1))
+            self.assertEqual((caches[1].report()["hits"], caches[1].report()["misses"]), (0, 1))
+        finally:
+            shutil.rmtree(temp_dir)
+
+
+class TestCriticalPath(unittest.TestCase):
+    """Test upward ranks, critical path extraction and makespan simulation"""
+
+    def setUp(self):
+        # T1 → T2 → T4 and T1 → T3 → T4, with the T3 branch heavier
+        self.tasks = [make_task("T1"), make_task("T2", ["T1"]), make_task("T3", ["T1"]), make_task("T4", ["T2", "T3"]), make_task("T5")]
+        self.costs = {"T1": 1.0, "T2": 2.0, "T3": 5.0, "T4": 1.0, "T5": 3.0}
+
+    def test_upward_ranks_and_critical_path(self):
+        """Test each rank is its cost plus the longest downstream chain"""
+        ranks = main.compute_upward_ranks(self.tasks, self.costs)
+        self.assertEqual(ranks, {"T1": 7.0, "T2": 3.0, "T3": 6.0, "T4": 1.0, "T5": 3.0})
+        self.assertEqual(main.critical_path(self.tasks, ranks), ["T1", "T3", "T4"])
+
+    def test_cycles_do_not_recurse_forever(self):
+        """Test a cyclic plan still gets finite ranks"""
+        tasks = [make_task("T1", ["T2"]), make_task("T2", ["T1"])]
+        ranks = main.compute_upward_ranks(tasks, {"T1": 1.0, "T2": 1.0})
+        self.assertEqual(set(ranks), {"T1", "T2"})
+
+    def test_rank_priority_shortens_simulated_makespan(self):
+        """Test starting the critical path first beats the reverse order with one worker busy"""
+        ranks = main.compute_upward_ranks(self.tasks, self.costs)
+        by_rank = main.simulate_makespan(self.tasks, self.costs, ranks, max_workers=2)
+        reverse = main.simulate_makespan(self.tasks, self.costs, {tid: -r for tid, r in ranks.items()}, max_workers=2)
+        self.assertEqual(by_rank, 7.0)
+        self.assertGreater(reverse, by_rank)
+
+
+class TestIncrementalJSONArrayParser(unittest.TestCase):
+    """Test streaming parsing of the decomposition output"""
+
+    def test_objects_are_emitted_as_they_close(self):
+        """Test objects come out one chunk at a time, ignoring prose and code fences"""
+        text = '好的，计划如下：\n```json\n[{"task_id": "T1", "name": "a {b}"}, {"task_id": "T2", "name": "say \\"hi\\""}]\n```\n完毕'
+        parser = main.IncrementalJSONArrayParser()
+        emitted = []
+        for i, ch in enumerate(text):
+            for obj in parser.feed(ch):
+                emitted.append((obj["task_id"], i))
+
+        self.assertEqual([task_id for task_id, _ in emitted], ["T1", "T2"])
+        self.assertEqual(emitted[0][1], text.index("}, {"))
+        self.assertTrue(parser.finished)
+        self.assertEqual(parser.errors, [])
+
+    def test_broken_and_truncated_objects(self):
+        """Test local repair, unrecoverable fragments and a truncated tail"""
+        parser = main.IncrementalJSONArrayParser()
+        objects = parser.feed('[{"task_id": "T1", "tags": ["a",],}, {"task_id": T2}, {"task_id": "T3", "na')
+        self.assertEqual(objects, [{"task_id": "T1", "tags": ["a"]}])
+        self.assertEqual(parser.errors, ['{"task_id": T2}'])
+        self.assertEqual(parser.incomplete_fragment(), '{"task_id": "T3", "na')
+
+    def test_repair_json_object(self):
+        """Test the local repairs for common model mistakes"""
+        self.assertEqual(main.repair_json_object("{“a”: 1}"), {"a": 1})
+        self.assertEqual(main.repair_json_object("{'a': 'b'}"), {"a": "b"})
+        self.assertEqual(main.repair_json_object('{"a": True, "b": None}'), {"a": True, "b": None})
+        self.assertIsNone(main.repair_json_object("[1, 2]"))
+
+
+class TestParseRequirement(unittest.TestCase):
+    """Test re-asking the model when the decomposition cannot be parsed"""
+
+    def test_retries_stop_after_the_last_attempt(self):
+        """Test each retry sends the rebuilt prompt and no notice follows the last attempt"""
+        temp_dir = tempfile.mkdtemp()
+        calls = []
+
+        def chat(messages, temperature=0.7, stream=False, model_type=None):
+            calls.append(messages)
+            return "无法解析"
+
+        try:
+            master = main.MasterAgent(journal_dir=temp_dir, task_cache=main.TaskResultCache(os.path.join(temp_dir, "cache.sqlite")),
+                                      plan_cache=main.PlanCache(path=None), agent_pool=main.SubAgentPool())
+            output = io.StringIO()
+            with patch.object(main.LLMClient, "chat", staticmethod(chat)), redirect_stdout(output):
+                tasks = master._parse_requirement("需求")
+        finally:
+            shutil.rmtree(temp_dir)
+
+        self.assertEqual(tasks[0]["task_id"], "T000")
+        self.assertEqual(len(calls), main.PARSE_MAX_RETRIES + 1)
+        self.assertEqual([len(messages) for messages in calls], [1] + [3] * main.PARSE_MAX_RETRIES)
+        self.assertEqual(output.getvalue().count("重新提问"), main.PARSE_MAX_RETRIES)
+
+
+class TestResultIntegrator(unittest.TestCase):
+    """Test grouping and the level-by-level reduction of large result sets"""
+
+    def setUp(self):
+        # Two dependency chains and a lone task, each result about 100 tokens
+        self.tasks = [
+            make_task("T1", tags=["数据"]), make_task("T2", ["T1"], tags=["图表"]), make_task("T3", ["T2"], tags=["数据"]),
+            make_task("T4", tags=["图表"]), make_task("T5", ["T4"], tags=["数据"]), make_task("T6", tags=["文案"]),
+        ]
+        self.results = {t["task_id"]: "结" * 100 for t in self.tasks}
+        self.prompts = []
+
+    def _integrator(self, answer=None, **kwargs):
+        def chat(messages, temperature=0.7, stream=False, model_type=None):
+            prompt = messages[-1]["content"]
+            self.prompts.append(prompt)
+            return answer(prompt) if answer else "摘" * 40
+
+        llm = main.LLMClient()
+        llm.chat = chat
+        options = dict(max_workers=2, final_budget=150, group_budget=250, level_budgets=[60, 30])
+        options.update(kwargs)
+        return main.ResultIntegrator(llm, **options)
+
+    def test_small_results_pass_through(self):
+        """Test results within the final budget are joined without any summary call"""
+        integrator = self._integrator(final_budget=10000)
+        text = integrator.condense("需求", self.tasks, self.results)
+        self.assertEqual(text.count("结" * 100), 6)
+        self.assertEqual(integrator.llm_calls, 0)
+
+    def test_groups_by_subtree_or_tag(self):
+        """Test first-level groups follow dependency chains or the first tag, in plan order"""
+        by_subtree = self._integrator()._group_tasks(self.tasks)
+        by_tag = self._integrator(group_by="tag")._group_tasks(self.tasks)
+        self.assertEqual([[t["task_id"] for t in group] for group in by_subtree], [["T1", "T2", "T3"], ["T4", "T5"], ["T6"]])
+        self.assertEqual([[t["task_id"] for t in group] for group in by_tag], [["T1", "T3", "T5"], ["T2", "T4"], ["T6"]])
+
+    def test_levels_reduce_until_the_final_budget(self):
+        """Test packed groups are summarized in parallel, then merged level by level"""
+        integrator = self._integrator()
+        levels = []
+        text = integrator.condense("需求", self.tasks, self.results, on_level=lambda level, summaries: levels.append((level, len(summaries))))
+
+        self.assertEqual(levels, [(1, 4), (2, 1)])
+        self.assertEqual(integrator.llm_calls, 5)
+        self.assertEqual(text, "摘" * 40)
+        self.assertIn("约30个token", self.prompts[-1])
+
+    def test_resume_continues_from_a_recorded_level(self):
+        """Test a recorded level is not summarized again"""
+        integrator = self._integrator()
+        levels = []
+        text = integrator.condense("需求", self.tasks, self.results, on_level=lambda level, summaries: levels.append(level),
+                                   resume_from=(1, ["摘" * 40] * 4))
+        self.assertEqual((levels, integrator.llm_calls, text), ([2], 1, "摘" * 40))
+
+    def test_summaries_that_do_not_shrink_are_truncated(self):
+        """Test a model ignoring the length limit cannot make the reduction loop forever"""
+        integrator = self._integrator(answer=lambda prompt: prompt.split("子任务结果：", 1)[1])
+        text = integrator.condense("需求", self.tasks, self.results)
+        self.assertLessEqual(main.estimate_tokens(text), integrator.final_budget + 1)
+
+
+class TestRunJournal(unittest.TestCase):
+    """Test journal replay used by MasterAgent.resume"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_load_replays_events_and_ignores_torn_last_line(self):
+        """Test the replayed state, retries overriding failures and a half-written record"""
+        journal = main.RunJournal("r1", self.temp_dir)
+        journal.append("run_started", requirement="需求")
+        journal.append("plan_started")
+        for task in (make_task("T1"), make_task("T2", ["T1"]), make_task("T3", ["T2"])):
+            journal.append("task", task=task)
+        journal.append("plan_complete", task_count=3)
+        journal.append("task_done", task_id="T1", status="success", result="r1")
+        journal.append("task_done", task_id="T2", status="failed", result="子任务执行失败：x")
+        journal.append("integration_level", level=1, summaries=["s"])
+        with open(journal.path, "a", encoding="utf-8") as f:
+            f.write('{"event": "task_done", "task_id": "T3", "sta')
+
+        state = main.RunJournal("r1", self.temp_dir).load()
+        self.assertEqual(state["requirement"], "需求")
+        self.assertTrue(state["plan_complete"])
+        self.assertEqual(list(state["tasks"]), ["T1", "T2", "T3"])
+        self.assertEqual(state["results"], {"T1": "r1"})
+        self.assertEqual(state["failed"], {"T2"})
+        self.assertEqual(state["integration_levels"], {1: ["s"]})
+        self.assertIsNone(state["final_result"])
+
+    def test_reusable_results_drop_dependents_of_rerun_tasks(self):
+        """Test a successful task is not reused when an upstream must run again"""
+        state = {
+            "tasks": {t["task_id"]: t for t in (make_task("T1"), make_task("T2", ["T1"]), make_task("T3", ["T2"]), make_task("T4"))},
+            "results": {"T1": "a", "T3": "c", "T4": "d"},
+        }
+        self.assertEqual(main.RunJournal.reusable_results(state), {"T1": "a", "T4": "d"})
+
+    def test_missing_journal(self):
+        """Test resuming an unknown run fails loudly"""
+        with self.assertRaises(FileNotFoundError):
+            main.RunJournal("missing", self.temp_dir).load()
+
+
+class TestResume(unittest.TestCase):
+    """Test MasterAgent.resume after a run crashed mid-execution"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.plan = json.dumps([make_task("T1"), make_task("T2", ["T1"]), make_task("T3", ["T2"]), make_task("T4", ["T3"])], ensure_ascii=False)
+        self.decompositions = 0
+        self.executed = []
+        self.crash = {"task T3"}
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def chat(self, messages, temperature=0.7, stream=False, model_type=None):
+        prompt = messages[-1]["content"]
+        if "需求拆解师" in prompt:
+            self.decompositions += 1
+            answer = self.plan
+        elif "结果整合专家" in prompt:
+            answer = "final"
+        else:
+            name = re.search(r"执行子任务：(.+?)，", prompt).group(1)
+            self.executed.append(name)
+            time.sleep(0.05)
+            if name in self.crash:
+                raise KeyboardInterrupt
+            answer = f"{name} done"
+        return iter([answer[i:i + 16] for i in range(0, len(answer), 16)]) if stream else answer
+
+    def _master(self):
+        return main.MasterAgent(max_workers=1, journal_dir=self.temp_dir, stream_decompose=True,
+                                task_cache=main.TaskResultCache(os.path.join(self.temp_dir, "cache.sqlite")),
+                                plan_cache=main.PlanCache(path=None), agent_pool=main.SubAgentPool())
+
+    def test_resume_reuses_the_plan_and_finished_tasks(self):
+        """Test the journaled plan is reused without decomposing again and only unfinished tasks run"""
+        with patch.object(main.LLMClient, "chat", staticmethod(self.chat)), redirect_stdout(io.StringIO()):
+            with self.assertRaises(KeyboardInterrupt):
+                self._master().run("需求", stream=False, run_id="crashed")
+            self.assertEqual(self.executed, ["task T1", "task T2", "task T3"])
+
+            self.crash = set()
+            self.executed = []
+            result = self._master().resume("crashed", stream=False)
+
+        self.assertEqual(result, "final")
+        self.assertEqual(self.decompositions, 1)
+        self.assertEqual(self.executed, ["task T3", "task T4"])
+
+
+class TestTaskResultCache(unittest.TestCase):
+    """Test content-addressed keys, expiry and eviction of the sub-task cache"""
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.cache = main.TaskResultCache(os.path.join(self.temp_dir, "cache.sqlite"), max_entries=2, ttl=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def test_key_changes_only_with_its_inputs(self):
+        """Test upstream results invalidate a task while dependency order does not"""
+        key = main.TaskResultCache.make_key("m", 0.6, "p", "s", {"T1": "a", "T2": "b"})
+        self.assertEqual(key, main.TaskResultCache.make_key("m", 0.6, "p", "s", {"T2": "b", "T1": "a"}))
+        for changed in (
+            ("m2", 0.6, "p", "s", {"T1": "a", "T2": "b"}),
+            ("m", 0.7, "p", "s", {"T1": "a", "T2": "b"}),
+            ("m", 0.6, "p2", "s", {"T1": "a", "T2": "b"}),
+            ("m", 0.6, "p", "s2", {"T1": "a", "T2": "b"}),
+            ("m", 0.6, "p", "s", {"T1": "a", "T2": "changed"}),
+        ):
+            self.assertNotEqual(key, main.TaskResultCache.make_key(*changed))
+
+    def test_ttl_and_lru_eviction(self):
+        """Test expired entries miss and the least recently used entry is evicted"""
+        self.cache.put("k1", "v1", "T1")
+        self.cache.put("k2", "v2", "T2")
+        self.assertEqual(self.cache.get("k1", "T1"), "v1")
+        time.sleep(0.01)
+        self.cache.put("k3", "v3", "T3")
+        self.assertIsNone(self.cache.get("k2", "T2"))
+        self.assertEqual(self.cache.get("k3", "T3"), "v3")
+
+        with patch.object(main.time, "time", return_value=time.time() + 120):
+            self.assertIsNone(self.cache.get("k1", "T1"))
+        self.assertEqual(self.cache.report()["hit_tasks"], ["T1", "T3"])
+
+
+class TestPlanCache(unittest.TestCase):
+    """Test exact and MinHash/LSH plan lookups"""
+
+    REQUIREMENT = "整理2026年1月销售数据，生成含可视化图表的分析报告，包含业绩总结、问题分析、下月优化建议"
+
+    def setUp(self):
+        self.cache = main.PlanCache(path=None)
+        self.plan = [make_task("T1"), make_task("T2", ["T1"])]
+
+    def test_exact_and_similar_lookup(self):
+        """Test normalized exact hits, near-duplicate hits and unrelated misses"""
+        self.assertTrue(self.cache.put(self.REQUIREMENT, self.plan))
+        self.assertEqual(self.cache.match(" 整理2026年1月销售数据 生成含可视化图表的分析报告！包含业绩总结、问题分析、下月优化建议 "), self.plan)
+
+        similar = self.cache.similar(self.REQUIREMENT.replace("1月", "2月"))
+        self.assertIsNotNone(similar)
+        requirement, plan, score = similar
+        self.assertEqual((requirement, plan), (self.REQUIREMENT, self.plan))
+        self.assertGreaterEqual(score, self.cache.threshold)
+        self.assertIsNone(self.cache.similar("写一篇AI Agent应用的科普文章，适合大众阅读"))
+
+    def test_invalid_plans_are_not_cached(self):
+        """Test cyclic plans and plans with unknown dependencies are rejected"""
+        self.assertFalse(self.cache.put("a", [make_task("T1", ["T2"]), make_task("T2", ["T1"])]))
+        self.assertFalse(self.cache.put("b", [make_task("T1", ["T9"])]))
+        self.assertIsNone(self.cache.match("a"))
+
+    def test_minhash_similarity_estimates_jaccard(self):
+        """Test signatures of identical text agree and unrelated text mostly differ"""
+        hasher = main.MinHasher()
+        signature = hasher.signature(self.REQUIREMENT)
+        self.assertEqual(main.MinHasher.similarity(signature, hasher.signature(self.REQUIREMENT)), 1.0)
+        self.assertLess(main.MinHasher.similarity(signature, hasher.signature("完全无关的另一件事情")), 0.2)
+
+
+class TestAgentIndex(unittest.TestCase):
+    """Test weighted tag matching and load balancing"""
+
+    def test_rare_tags_role_and_load(self):
+        """Test IDF weighting, the role bonus, the least-loaded tie-break and the generic fallback"""
+        index = main.AgentIndex()
+        agents = [
+            main.SubAgent("A1", "分析师", ["数据处理", "可视化"], ""),
+            main.SubAgent("A2", "分析师", ["数据处理"], ""),
+            main.SubAgent("A3", "写手", ["数据处理", "通用"], ""),
+        ]
+        for agent in agents:
+            index.add(agent)
+
+        self.assertEqual(index.best_match(make_task("T1", tags=["数据处理", "可视化"], role="写手")).agent_id, "A1")
+        self.assertEqual(index.best_match(make_task("T2", tags=["数据处理"], role="写手")).agent_id, "A3")
+        index.acquire("A1")
+        self.assertEqual(index.best_match(make_task("T3", tags=["数据处理"], role="分析师")).agent_id, "A2")
+        self.assertEqual(index.best_match(make_task("T4", tags=["未知"])).agent_id, "A3")
+
+
+class TestSubAgentPool(unittest.TestCase):
+    """Test sub-agent reuse across runs and pool eviction"""
+
+    def test_agents_are_shared_across_runs_with_per_task_requirements(self):
+        """Test a later run reuses the agent but renders its own task's core requirements"""
+        temp_dir = tempfile.mkdtemp()
+        pool = main.SubAgentPool()
+        first, second = make_task("T1"), make_task("T1")
+        first["core_requirements"], second["core_requirements"] = "数据精准", "语言通俗"
+        try:
+            agents = []
+            for task in (first, second):
+                master = main.MasterAgent(journal_dir=temp_dir, task_cache=main.TaskResultCache(os.path.join(temp_dir, "cache.sqlite")),
+                                          plan_cache=main.PlanCache(path=None), agent_pool=pool)
+                with redirect_stdout(io.StringIO()):
+                    agents.append(master._generate_dynamic_agent(task))
+        finally:
+            shutil.rmtree(temp_dir)
+
+        self.assertIs(agents[0], agents[1])
+        self.assertEqual((pool.hits, pool.misses, len(pool)), (1, 1, 1))
+        prompt = agents[1].build_prompt(second)
+        self.assertIn("核心执行要求：语言通俗", prompt)
+        self.assertNotIn("数据精准", prompt)
+        self.assertNotEqual(agents[1].cache_key(first), agents[1].cache_key(second))
+
+    def test_least_recently_used_and_idle_agents_are_evicted(self):
+        """Test the size cap drops the least recently used agent and idle agents expire"""
+        pool = main.SubAgentPool(max_size=2, idle_sec=60)
+        build = lambda: main.SubAgent(pool.next_agent_id("写手"), "写手", ["通用"], "")
+        a, _ = pool.get_or_create(("a",), build)
+        pool.get_or_create(("b",), build)
+        self.assertEqual(pool.get_or_create(("a",), build), (a, False))
+        pool.get_or_create(("c",), build)
+
+        self.assertEqual((len(pool), pool.evictions), (2, 1))
+        self.assertFalse(pool.get_or_create(("a",), build)[1])
+        with patch.object(main.time, "time", return_value=time.time() + 120):
+            pool.evict_idle()
+        self.assertEqual((len(pool), pool.evictions), (0, 3))
+
+
+class TestSpeculation(unittest.TestCase):
+    """Test speculative starts of downstream tasks from partial upstream output"""
+
+    def setUp(self):
+        self.agent = main.SubAgent("A_TE_001", "通用执行专家", ["通用"], "执行子任务：{task_name}，{task_goal}{task_input}{task_output}")
+        self.tasks = [make_task("T1"), make_task("T2", ["T1"])]
+        self.calls = []
+
+    def _run(self, upstream_chunks):
+        outputs = {"task T1": upstream_chunks, "task T2": ["下游结果"]}
+
+        def chat(messages, temperature=0.7, stream=False, model_type=None):
+            prompt = messages[-1]["content"]
+            name = re.search(r"执行子任务：(.+?)，", prompt).group(1)
+            self.calls.append((name, prompt))
+
+            def generate():
+                for chunk in outputs[name]:
+                    time.sleep(0.02)
+                    yield chunk
+            return generate() if stream else "".join(outputs[name])
+
+        executor = main.DAGExecutor(max_workers=2, provider_limits={}, speculate=True)
+        with patch.object(main.LLMClient, "chat", staticmethod(chat)), redirect_stdout(io.StringIO()):
+            results = executor.run(self.tasks, lambda task: self.agent, stream=True, expected_output_tokens=lambda task: 10)
+        return executor.speculation, results
+
+    def test_similar_upstream_commits_the_speculative_result(self):
+        """Test a downstream task started from a matching partial upstream runs only once"""
+        stats, results = self._run(["好好好好"] * 10)
+
+        self.assertEqual((stats.launched, stats.committed, stats.discarded), (1, 1, 0))
+        self.assertEqual(results, {"T1": "好" * 40, "T2": "下游结果"})
+        self.assertEqual([name for name, _ in self.calls].count("task T2"), 1)
+        self.assertGreater(stats.latency_saved, 0)
+
+    def test_diverging_upstream_discards_and_reruns(self):
+        """Test a downstream task is run again with the final upstream when the snapshot diverged"""
+        tail = "".join(chr(0x4E00 + i) for i in range(200))
+        stats, results = self._run(["好好好好"] * 10 + [tail])
+
+        self.assertEqual((stats.launched, stats.committed, stats.discarded), (1, 0, 1))
+        self.assertGreater(stats.wasted_tokens, 0)
+        downstream = [prompt for name, prompt in self.calls if name == "task T2"]
+        self.assertEqual(len(downstream), 2)
+        self.assertNotIn(tail, downstream[0])
+        self.assertIn(tail, downstream[1])
+        self.assertEqual(results["T2"], "下游结果")
+
+    def test_text_similarity(self):
+        """Test the bigram Jaccard similarity used to validate a snapshot"""
+        self.assertEqual(main.text_similarity("", ""), 1.0)
+        self.assertEqual(main.text_similarity("abab", "ababab"), 1.0)
+        self.assertEqual(main.text_similarity("abc", "xyz"), 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()